@@ -0,0 +1,72 @@
+"""
+Caché de artefactos descargados
+
+Una descarga repetida del mismo video (mismo tipo y calidad) devuelve el
+file_id existente sin pasar por Cobalt ni yt-dlp. Las entradas viven en la
+metadata persistente (file_store, SQLite compartida entre workers): un
+archivo es reutilizable si tiene video_id y quality, y se busca por el
+índice de video_id.
+
+La caché no borra nada: el espacio lo administra disk_janitor (cuota, edad
+y pins), que al expulsar un archivo borra también su fila y con ella la
+entrada de la caché.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+from file_store import file_store
+
+
+class ArtifactCache:
+    def __init__(self, enabled: bool = True):
+        """
+        Args:
+            enabled: Si es False, get() siempre falla y put() no hace nada
+        """
+        self.enabled = enabled
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # Filas cuyo archivo ya no estaba en disco
+
+    def get(self, video_id: str, kind: str, quality: str) -> Optional[Dict]:
+        """Metadata del archivo descargado más reciente para (video_id, tipo, calidad) o None"""
+        if not self.enabled:
+            return None
+
+        for entry in file_store.by_video_id(video_id):
+            if entry.get("type") != kind or entry.get("quality") != quality or not entry.get("path"):
+                continue
+            if not Path(entry["path"]).exists():
+                # Borrado por fuera del janitor: la fila ya no sirve
+                file_store.delete([entry["file_id"]])
+                self.stale += 1
+                continue
+            self.hits += 1
+            file_store.touch(entry["file_id"])
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, file_id: str, quality: str):
+        """Marca un archivo recién descargado (con su metadata ya en file_store) como reutilizable"""
+        if self.enabled:
+            file_store.put(file_id, quality=quality)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stale": self.stale,
+        }
+
+
+# Instancia global
+artifact_cache = ArtifactCache(enabled=config.ARTIFACT_CACHE_ENABLED)
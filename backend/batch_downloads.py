@@ -0,0 +1,207 @@
+"""
+Descargas por lotes (lista de URLs o playlist)
+
+Cada elemento del lote es un job normal de job_manager (con su progreso
+por SSE), pero un lote nunca tiene más de BATCH_CONCURRENCY elementos en
+la cola a la vez: un lote de 50 videos no deja sin workers a las
+descargas individuales de otros usuarios. Cada elemento consume una
+descarga del rate limiter; los que ya no entran en el cupo quedan como
+"rate_limited" y no se descargan.
+
+Los resultados se pueden seguir en /api/batch/{id} y descargar como un
+ZIP que se va enviando a medida que cada elemento termina.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import config
+from jobs import JOB_COMPLETED, Job, job_manager
+
+ITEM_QUEUED = "queued"
+ITEM_RUNNING = "running"
+ITEM_COMPLETED = "completed"
+ITEM_FAILED = "failed"
+ITEM_RATE_LIMITED = "rate_limited"
+
+ITEM_FINAL_STATUSES = (ITEM_COMPLETED, ITEM_FAILED, ITEM_RATE_LIMITED)
+
+
+class BatchItem:
+    __slots__ = ("index", "url", "status", "job_id", "result", "error")
+
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.url = url
+        self.status = ITEM_QUEUED
+        self.job_id: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "index": self.index,
+            "url": self.url,
+            "status": self.status,
+            "job_id": self.job_id,
+            "file_id": self.result["file_id"] if self.result else None,
+            "filename": self.result["filename"] if self.result else None,
+            "error": self.error,
+        }
+
+
+class Batch:
+    def __init__(self, kind: str, urls: List[str]):
+        self.id = str(uuid.uuid4())
+        self.kind = kind  # audio / video
+        self.items = [BatchItem(i, url) for i, url in enumerate(urls)]
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return all(item.status in ITEM_FINAL_STATUSES for item in self.items)
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def completed_items(self) -> AsyncIterator[BatchItem]:
+        """Elementos descargados, en el orden en que van terminando"""
+        sent = set()
+        while True:
+            for item in self.items:
+                if item.status == ITEM_COMPLETED and item.index not in sent:
+                    sent.add(item.index)
+                    yield item
+            if self.done:
+                return
+            changed = self._changed
+            if not self.done:
+                await changed.wait()
+
+    def to_dict(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for item in self.items:
+            counts[item.status] = counts.get(item.status, 0) + 1
+        return {
+            "batch_id": self.id,
+            "type": self.kind,
+            "done": self.done,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "counts": counts,
+            "items": [item.to_dict() for item in self.items],
+        }
+
+
+class BatchManager:
+    def __init__(self, concurrency: int = 3, max_items: int = 50, history_limit: int = 100):
+        """
+        Args:
+            concurrency: Elementos de un mismo lote descargándose (o en cola) a la vez
+            max_items: Máximo de elementos por lote
+            history_limit: Lotes que se conservan para consulta
+        """
+        self.concurrency = concurrency
+        self.max_items = max_items
+        self.history_limit = history_limit
+        self.batches: "OrderedDict[str, Batch]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+        # Estadísticas
+        self.created = 0
+        self.items_completed = 0
+        self.items_failed = 0
+        self.items_rate_limited = 0
+
+    async def create(self, kind: str, urls: List[str], charge: Callable[[], Awaitable[bool]]) -> Batch:
+        """
+        Crea el lote (sin URLs repetidas, hasta max_items). charge() consume
+        una descarga del rate limiter por elemento y devuelve False si ya no
+        queda cupo.
+        """
+        unique = list(dict.fromkeys(urls))[:self.max_items]
+        batch = Batch(kind, unique)
+        for item in batch.items:
+            if not await charge():
+                item.status = ITEM_RATE_LIMITED
+                self.items_rate_limited += 1
+
+        self.batches[batch.id] = batch
+        self.created += 1
+        self._prune()
+        return batch
+
+    def get(self, batch_id: str) -> Optional[Batch]:
+        return self.batches.get(batch_id)
+
+    def _prune(self):
+        while len(self.batches) > self.history_limit:
+            oldest_id, oldest = next(iter(self.batches.items()))
+            if not oldest.done:
+                break
+            del self.batches[oldest_id]
+
+    def start(self, batch: Batch, runner: Callable[[Job], Awaitable[Dict]]):
+        """Descarga los elementos del lote como jobs (runner es el de /api/jobs)"""
+        task = asyncio.create_task(self._run(batch, runner))
+        self._tasks[batch.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(batch.id, None))
+
+    async def _run(self, batch: Batch, runner: Callable[[Job], Awaitable[Dict]]):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_item(item: BatchItem):
+            async with semaphore:
+                job = job_manager.submit(batch.kind, runner, {"url": item.url})
+                item.job_id = job.id
+                item.status = ITEM_RUNNING
+                batch._notify()
+                await job.wait()
+
+            if job.status == JOB_COMPLETED:
+                item.status = ITEM_COMPLETED
+                item.result = job.result
+                self.items_completed += 1
+            else:
+                item.status = ITEM_FAILED
+                item.error = job.error
+                self.items_failed += 1
+            batch._notify()
+
+        await asyncio.gather(*(
+            run_item(item) for item in batch.items if item.status == ITEM_QUEUED
+        ))
+        batch.finished_at = time.time()
+        batch._notify()
+        counts = batch.to_dict()["counts"]
+        print(f"📦 Batch {batch.id} finished: {counts}")
+
+    def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+
+    def stats(self) -> Dict:
+        return {
+            "batches": len(self.batches),
+            "running": len(self._tasks),
+            "created": self.created,
+            "concurrency": self.concurrency,
+            "items_completed": self.items_completed,
+            "items_failed": self.items_failed,
+            "items_rate_limited": self.items_rate_limited,
+        }
+
+
+# Instancia global
+batch_manager = BatchManager(
+    concurrency=config.BATCH_CONCURRENCY,
+    max_items=config.BATCH_MAX_ITEMS,
+    history_limit=config.BATCH_HISTORY_LIMIT
+)
@@ -0,0 +1,137 @@
+"""
+Benchmark: /api/batch vs llamadas secuenciales a /api/download
+
+Mide el tiempo total (wall-clock) de descargar N elementos:
+
+- secuencial: POST /api/download + GET /api/download-file por elemento,
+  uno detrás de otro (lo que hacen hoy los scripts de los usuarios)
+- batch: un POST /api/batch y el ZIP de /api/batch/{id}/archive.zip
+
+Por defecto corre en el mismo proceso con una descarga simulada (espera
+--latency segundos y escribe --size-mb de datos) para aislar el efecto del
+paralelismo acotado. Con --base-url mide contra un servidor real usando
+las URLs que se pasen con --urls (cuentan para el rate limit del servidor).
+
+Uso (desde backend/):
+    python benchmarks/bench_batch.py --items 12 --latency 1.5
+    python benchmarks/bench_batch.py --base-url http://localhost:8000 --urls URL1 URL2 ...
+"""
+
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+
+async def run_sequential(client: httpx.AsyncClient, urls, kind: str) -> float:
+    endpoint = "/api/download" if kind == "audio" else "/api/download-video"
+    file_endpoint = "/api/download-file" if kind == "audio" else "/api/download-video-file"
+    start = time.monotonic()
+    for url in urls:
+        response = await client.post(endpoint, json={"url": url})
+        response.raise_for_status()
+        file_id = response.json()["file_id"]
+        (await client.get(f"{file_endpoint}/{file_id}")).raise_for_status()
+    return time.monotonic() - start
+
+
+async def run_batch(client: httpx.AsyncClient, urls, kind: str) -> float:
+    start = time.monotonic()
+    response = await client.post("/api/batch", json={"urls": urls, "type": kind})
+    response.raise_for_status()
+    archive = await client.get(response.json()["archive_url"])
+    archive.raise_for_status()
+    elapsed = time.monotonic() - start
+
+    members = zipfile.ZipFile(io.BytesIO(archive.content)).infolist()
+    status = (await client.get(response.json()["status_url"])).json()
+    print(f"  batch: {len(members)} archivos en el ZIP, estados {status['counts']}")
+    return elapsed
+
+
+def simulated_app(latency: float, size_mb: float):
+    """App real con download_media reemplazada por una descarga simulada"""
+    tmp = Path(tempfile.mkdtemp(prefix="bench_batch_"))
+    os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+    os.environ.setdefault("METADATA_DB", str(tmp / "metadata.db"))
+
+    import main
+    from file_store import file_store
+    from rate_limiter import rate_limiter
+
+    rate_limiter.max_downloads = 10 ** 6
+    payload = os.urandom(int(size_mb * 1024 * 1024))
+
+    async def fake_download_media(job, video_url, stream_key=None, file_id=None):
+        await asyncio.sleep(latency)
+        file_id = file_id or str(uuid.uuid4())
+        ext = "mp3" if job.kind == "audio" else "mp4"
+        path = main.DOWNLOADS_DIR / f"{file_id}.{ext}"
+        path.write_bytes(payload)
+        title = f"bench {video_url[-11:]}"
+        file_store.put(file_id, title=title, filename=f"{title}.{ext}", type=job.kind,
+                       size=len(payload), path=str(path))
+        return {"file_id": file_id, "filename": f"{title}.{ext}", "type": job.kind}
+
+    main.download_media = fake_download_media
+    return main, tmp
+
+
+def fake_urls(n: int):
+    return [f"https://www.youtube.com/watch?v={uuid.uuid4().hex[:11]}" for _ in range(n)]
+
+
+async def main_async(args):
+    if args.base_url:
+        if not args.urls:
+            sys.exit("--base-url requiere --urls")
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=None) as client:
+            sequential = await run_sequential(client, args.urls, args.type)
+            batch = await run_batch(client, args.urls, args.type)
+        n = len(args.urls)
+    else:
+        backend, tmp = simulated_app(args.latency, args.size_mb)
+        await backend.start_keep_alive()
+        n = args.items
+        created = set(backend.DOWNLOADS_DIR.iterdir())
+        try:
+            transport = httpx.ASGITransport(app=backend.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                sequential = await run_sequential(client, fake_urls(n), args.type)
+                batch = await run_batch(client, fake_urls(n), args.type)
+        finally:
+            await backend.stop_keep_alive()
+            for path in set(backend.DOWNLOADS_DIR.iterdir()) - created:
+                path.unlink(missing_ok=True)
+            for path in tmp.iterdir():
+                path.unlink()
+            tmp.rmdir()
+
+    print(f"secuencial: {sequential:.2f}s ({sequential / n:.2f}s por elemento)")
+    print(f"batch:      {batch:.2f}s ({batch / n:.2f}s por elemento), {sequential / batch:.1f}x más rápido")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=12, help="Elementos en modo simulado")
+    parser.add_argument("--latency", type=float, default=1.5, help="Segundos por descarga simulada")
+    parser.add_argument("--size-mb", type=float, default=4.0, help="Tamaño de cada archivo simulado")
+    parser.add_argument("--type", default="audio", choices=["audio", "video"])
+    parser.add_argument("--base-url", help="Servidor real (si no, modo simulado en proceso)")
+    parser.add_argument("--urls", nargs="*", default=[])
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark: tiempo de importación de main (arranque en frío)
+
+Corre `python -X importtime -c "import main"` en intérpretes nuevos y
+reporta la mediana del tiempo acumulado de main y los módulos de primer
+nivel que más pesan. Falla (exit 1) si:
+
+- el tiempo de importación supera --budget-ms
+- se importa al cargar main algún módulo de --forbid (yt_dlp, torch...:
+  se cargan en el primer uso o en segundo plano después del arranque)
+- con --serve, /health tarda más de --health-budget-ms en responder desde
+  que arranca uvicorn
+
+Uso (desde backend/):
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --budget-ms 1200 --runs 7 --serve
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_FORBIDDEN = ["yt_dlp", "torch", "demucs", "requests"]
+
+
+def import_profile() -> Tuple[int, Dict[str, int], List[str]]:
+    """
+    Importa main en un intérprete nuevo.
+
+    Returns:
+        (µs acumulados de main, µs acumulados por módulo de primer nivel, módulos importados)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    total = 0
+    top_level: Dict[str, int] = {}
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # Encabezado
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        module = name.strip()
+        modules.append(module)
+        if module == "main":
+            total = int(cumulative)
+        elif depth == 1:
+            top_level[module] = int(cumulative)
+    return total, top_level, modules
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_health(timeout: float = 60.0) -> float:
+    """Segundos desde que se lanza uvicorn hasta que /health responde 200"""
+    port = free_port()
+    env = {**os.environ, "RATE_LIMIT_BACKEND": "memory"}
+    start = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.monotonic() - start < timeout:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                    return time.monotonic() - start
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None:
+                sys.exit("uvicorn terminó antes de responder /health")
+            time.sleep(0.02)
+        sys.exit(f"/health no respondió en {timeout:.0f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Intérpretes nuevos a medir (se usa la mediana)")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="Máximo para importar main")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN,
+                        help="Módulos que no deben importarse al cargar main")
+    parser.add_argument("--top", type=int, default=8, help="Módulos de primer nivel a mostrar")
+    parser.add_argument("--serve", action="store_true", help="Medir también el tiempo hasta que /health responde")
+    parser.add_argument("--health-budget-ms", type=float, default=3000, help="Máximo hasta /health (con --serve)")
+    args = parser.parse_args()
+
+    import_profile()  # Calienta los .pyc para no medir la compilación
+    totals = []
+    per_module: Dict[str, List[int]] = {}
+    modules: List[str] = []
+    for _ in range(args.runs):
+        total, top_level, modules = import_profile()
+        totals.append(total)
+        for module, micros in top_level.items():
+            per_module.setdefault(module, []).append(micros)
+
+    import_ms = statistics.median(totals) / 1000
+    print(f"import main: {import_ms:.0f} ms (mediana de {args.runs}, presupuesto {args.budget_ms:.0f} ms)")
+    heaviest = sorted(per_module.items(), key=lambda kv: statistics.median(kv[1]), reverse=True)
+    for module, samples in heaviest[:args.top]:
+        print(f"  {statistics.median(samples) / 1000:8.1f} ms  {module}")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"import main tarda {import_ms:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    imported = {module.split(".")[0] for module in modules}
+    for module in args.forbid:
+        if module in imported:
+            failures.append(f"{module} se importa al cargar main")
+
+    if args.serve:
+        health_ms = time_to_health() * 1000
+        print(f"/health: {health_ms:.0f} ms desde el arranque (presupuesto {args.health_budget_ms:.0f} ms)")
+        if health_ms > args.health_budget_ms:
+            failures.append(f"/health tarda {health_ms:.0f} ms (presupuesto {args.health_budget_ms:.0f} ms)")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        sys.exit(1)
+    print("✅ Dentro del presupuesto")
+
+
+if __name__ == "__main__":
+    main()
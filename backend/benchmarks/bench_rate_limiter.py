@@ -0,0 +1,158 @@
+"""
+Microbenchmark del RateLimiter
+
+Registra y consulta N IPs distintas en rate_limiter y stems_rate_limiter,
+con el backend en memoria y con SQLite, mide throughput, memoria
+(tracemalloc, solo memoria) y el tiempo del barrido de registros vencidos.
+Además lanza varios procesos contra la misma base SQLite para comprobar que
+el cupo se respeta entre workers.
+
+Uso (desde backend/):
+    python benchmarks/bench_rate_limiter.py --ips 1000000 --sqlite-ips 100000 --workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rate_limit_store import MemoryRateLimitStore, SQLiteRateLimitStore  # noqa: E402
+from rate_limiter import RateLimiter, rate_limiter, stems_rate_limiter  # noqa: E402
+
+NOW = 1_700_000_000.0
+
+
+def make_limiter(template: RateLimiter, store) -> RateLimiter:
+    limiter = RateLimiter(
+        max_downloads=template.max_downloads,
+        window_hours=template.window_hours,
+        buckets=template.buckets,
+        name=template.name,
+        store=store
+    )
+    now = [NOW]
+    limiter.clock = lambda: now[0]
+    limiter.now = now  # Para adelantar el reloj en el benchmark
+    return limiter
+
+
+def make_keys(ips: int):
+    return [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}-{i >> 24}" for i in range(ips)]
+
+
+def bench(name: str, template: RateLimiter, store_factory, ips: int, measure_memory: bool):
+    limiter = make_limiter(template, store_factory())
+    keys = make_keys(ips)
+
+    async def acquire_all():
+        for ip in keys:
+            await limiter.acquire_key(ip)
+
+    start = time.perf_counter()
+    asyncio.run(acquire_all())
+    acquire = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for ip in keys:
+        limiter.check_key(ip)
+    check = time.perf_counter() - start
+
+    # Vencer la ventana y barrer
+    limiter.now[0] += limiter.window_seconds + limiter.bucket_seconds
+    start = time.perf_counter()
+    removed = asyncio.run(limiter.sweep())
+    sweep = time.perf_counter() - start
+
+    print(f"{name} [{limiter.store.backend}] (max={limiter.max_downloads}, window={limiter.window_hours}h, {ips:,} IPs)")
+    print(f"  acquire (check+record) : {ips / acquire:>12,.0f} ops/s ({acquire / ips * 1e6:.1f} µs/op)")
+    print(f"  check                  : {ips / check:>12,.0f} ops/s ({check / ips * 1e6:.1f} µs/op)")
+    print(f"  barrido                : {sweep:>12.2f} s ({removed:,} registros eliminados)")
+
+    if measure_memory:
+        # Pasada aparte: tracemalloc distorsiona el throughput
+        probe = make_limiter(template, store_factory())
+
+        async def record_all():
+            for ip in keys:
+                await probe.record_key(ip)
+
+        tracemalloc.start()
+        base = tracemalloc.get_traced_memory()[0]
+        asyncio.run(record_all())
+        used = tracemalloc.get_traced_memory()[0] - base
+        tracemalloc.stop()
+        print(f"  memoria                : {used / (1024 * 1024):>12.1f} MB ({used / ips:.0f} B/IP, sin contar los strings de las claves)")
+
+
+def _worker(db_path: str, max_downloads: int, keys, attempts: int, results):
+    store = SQLiteRateLimitStore(Path(db_path), "downloads", 24)
+    limiter = RateLimiter(max_downloads=max_downloads, store=store)
+    limiter.clock = lambda: NOW
+
+    async def run() -> int:
+        allowed = 0
+        for _ in range(attempts):
+            for ip in keys:
+                if (await limiter.acquire_key(ip))["allowed"]:
+                    allowed += 1
+        return allowed
+
+    results.put(asyncio.run(run()))
+
+
+def check_workers(workers: int, db_path: Path):
+    """N procesos compiten por las mismas IPs: el total permitido debe ser exactamente el cupo"""
+    max_downloads = rate_limiter.max_downloads
+    keys = make_keys(200)
+    attempts = max_downloads  # Cada worker intenta gastar el cupo completo de cada IP
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=_worker, args=(str(db_path), max_downloads, keys, attempts, results))
+        for _ in range(workers)
+    ]
+    start = time.perf_counter()
+    for p in processes:
+        p.start()
+    allowed = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    elapsed = time.perf_counter() - start
+
+    expected = max_downloads * len(keys)
+    total_ops = workers * attempts * len(keys)
+    status = "OK" if sum(allowed) == expected else "FALLO"
+    print(f"{workers} workers sobre SQLite: {sum(allowed):,} permitidas de {total_ops:,} intentos "
+          f"(esperado {expected:,}) -> {status}, {total_ops / elapsed:,.0f} ops/s en total")
+    return status == "OK"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ips", type=int, default=1_000_000, help="IPs distintas (backend memoria)")
+    parser.add_argument("--sqlite-ips", type=int, default=100_000, help="IPs distintas (backend SQLite)")
+    parser.add_argument("--workers", type=int, default=4, help="Procesos para la prueba entre workers")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for limiter in (rate_limiter, stems_rate_limiter):
+            bench(limiter.name, limiter, lambda: MemoryRateLimitStore(limiter.buckets), args.ips, True)
+            db_path = Path(tmp) / f"bench-{limiter.name}.db"
+            bench(
+                limiter.name, limiter,
+                lambda: SQLiteRateLimitStore(db_path, limiter.name, limiter.buckets),
+                args.sqlite_ips, False
+            )
+
+        ok = check_workers(args.workers, Path(tmp) / "workers.db")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Proxies falsos locales para probar el pool de proxy_manager
+
+Levanta varios proxies HTTP en localhost con comportamientos distintos
+(rápidos, lentos, que cortan la conexión, que responden 403, puertos
+cerrados) y una fuente con la lista "ip:puerto", como las APIs públicas.
+Los proxies no reenvían nada: responden directamente a la validación.
+
+El driver corre una ronda de validación y comprueba que:
+- solo los proxies sanos entran al pool, ordenados por latencia
+- la ronda tarda lo que el candidato más lento, no la suma (validación en paralelo)
+- cada job recibe siempre el mismo proxy y los jobs se reparten
+- un proxy que falla varias veces sale del pool y sus jobs se reasignan
+
+Uso (desde backend/):
+    python benchmarks/fake_proxies.py --good 4 --slow 2 --broken 2
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from http_clients import http_clients  # noqa: E402
+from proxy_manager import ProxyManager  # noqa: E402
+
+TEST_URL = "http://validation.test/generate_204"
+
+handlers = set()
+
+
+async def start_proxy(behavior: str, latency: float) -> asyncio.AbstractServer:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        handlers.add(asyncio.current_task())
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            if behavior == "broken":
+                return
+            await asyncio.sleep(latency)
+            status = b"403 Forbidden" if behavior == "blocked" else b"204 No Content"
+            writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            handlers.discard(asyncio.current_task())
+            writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+async def start_source(entries) -> asyncio.AbstractServer:
+    body = "\n".join(entries).encode()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: "
+            + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, "127.0.0.1", 0)
+
+
+def closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def address(server: asyncio.AbstractServer) -> str:
+    host, port = server.sockets[0].getsockname()[:2]
+    return f"{host}:{port}"
+
+
+async def main_async(args):
+    servers = []
+    expected_good = {}
+    entries = []
+    for i in range(args.good):
+        latency = 0.02 * (i + 1)
+        server = await start_proxy("good", latency)
+        servers.append(server)
+        expected_good[f"http://{address(server)}"] = latency
+        entries.append(address(server))
+    for _ in range(args.slow):
+        server = await start_proxy("good", args.timeout * 3)
+        servers.append(server)
+        entries.append(address(server))
+    for i in range(args.broken):
+        server = await start_proxy("broken" if i % 2 == 0 else "blocked", 0)
+        servers.append(server)
+        entries.append(address(server))
+    entries += [f"127.0.0.1:{closed_port()}" for _ in range(args.closed)]
+    source = await start_source(entries[1:])
+    servers.append(source)
+
+    manager = ProxyManager(
+        static_proxies=entries[:1],
+        sources=[f"http://{address(source)}/list"],
+        test_url=TEST_URL,
+        validate_timeout=args.timeout,
+        pool_size=args.good,
+    )
+    try:
+        start = time.monotonic()
+        await manager.refresh()
+        elapsed = time.monotonic() - start
+        print(f"ronda de validación: {elapsed:.2f}s para {manager.candidates} candidatos "
+              f"(secuencial serían ~{args.slow * args.timeout + sum(expected_good.values()):.1f}s)")
+
+        pool = manager.pool
+        print("pool:", [(url, manager.health[url].to_dict()["latency_ms"]) for url in pool])
+        assert set(pool) == set(expected_good), "el pool debe tener solo los proxies sanos"
+        assert pool == sorted(pool, key=expected_good.get), "el pool debe estar ordenado por latencia"
+        assert elapsed < args.timeout * 2, "la validación debe ser concurrente"
+
+        jobs = [f"job-{i}" for i in range(args.good * 2)]
+        assigned = {job: manager.acquire(job) for job in jobs}
+        assert all(manager.acquire(job) == assigned[job] for job in jobs), "asignación sticky"
+        print(f"jobs por proxy: {dict(manager.assigned)}")
+        assert len(set(assigned.values())) > 1, "los jobs deben repartirse"
+
+        victim = assigned["job-0"]
+        for _ in range(manager.failure_threshold):
+            try:
+                with manager.track(victim):
+                    raise OSError("Unable to connect to proxy: Connection refused")
+            except OSError:
+                pass
+        assert victim not in manager.pool, "el proxy que falla debe salir del pool"
+        reassigned = manager.acquire("job-0")
+        assert reassigned not in (victim, None), "el job debe recibir otro proxy"
+        print(f"expulsado {victim}; job-0 -> {reassigned}")
+        print("✅ ok")
+    finally:
+        for server in servers:
+            server.close()
+        # Los proxies lentos siguen esperando: cancelarlos antes de cerrar el loop
+        for task in list(handlers):
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+        await http_clients.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--good", type=int, default=4, help="Proxies sanos (latencias de 20 ms en adelante)")
+    parser.add_argument("--slow", type=int, default=2, help="Proxies más lentos que el timeout")
+    parser.add_argument("--broken", type=int, default=2, help="Proxies que cortan la conexión o responden 403")
+    parser.add_argument("--closed", type=int, default=2, help="Puertos sin nada escuchando")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Timeout de validación")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Servidor falso de Replicate para probar la espera de predicciones
+
+Simula POST /predictions y GET /predictions/{id} con una duración
+configurable y, si la predicción trae webhook, lo llama al terminar (firmado
+si se pasa --secret). También simula la API de archivos (POST /files).
+
+El driver corre N separaciones contra el servidor con polling adaptativo y
+con webhook, y compara llamadas salientes y el retraso entre que la
+predicción termina y el backend se entera. Después sube un audio de prueba
+varias veces y comprueba que solo la primera subida llega al servidor.
+
+Uso (desde backend/):
+    python benchmarks/fake_replicate.py --runs 5 --runtime 6
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from starlette.applications import Starlette  # noqa: E402
+from starlette.requests import Request  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+from starlette.routing import Route  # noqa: E402
+
+FAKE_PORT = 8790
+APP_PORT = 8791
+
+
+class FakeReplicate:
+    def __init__(
+        self,
+        runtime: float,
+        jitter: float,
+        secret: str = None,
+        webhook_transport=None,
+        upload_ttl: float = 24 * 3600,
+    ):
+        """
+        Args:
+            webhook_transport: Transporte httpx para entregar los webhooks (None = red;
+                los tests pasan un ASGITransport hacia la app)
+            upload_ttl: Segundos hasta el expires_at de cada archivo subido
+        """
+        self.runtime = runtime
+        self.jitter = jitter
+        self.secret = secret
+        self.webhook_transport = webhook_transport
+        self.upload_ttl = upload_ttl
+        self.predictions = {}
+        self.gets = 0
+        self.deliveries = []  # Status HTTP de cada webhook entregado
+        self.files = {}  # {file_id: bytes recibidos}
+        self.app = Starlette(routes=[
+            Route("/v1/predictions", self.create, methods=["POST"]),
+            Route("/v1/predictions/{prediction_id}", self.get, methods=["GET"]),
+            Route("/v1/files", self.upload, methods=["POST"]),
+        ])
+
+    def _view(self, prediction: dict) -> dict:
+        done = time.monotonic() >= prediction["done_at"]
+        return {
+            "id": prediction["id"],
+            "status": "succeeded" if done else "processing",
+            "output": {"vocals": "http://example.invalid/vocals.mp3"} if done else None,
+        }
+
+    async def create(self, request: Request):
+        body = await request.json()
+        prediction_id = uuid.uuid4().hex
+        runtime = self.runtime + random.uniform(-self.jitter, self.jitter)
+        prediction = {"id": prediction_id, "done_at": time.monotonic() + runtime}
+        self.predictions[prediction_id] = prediction
+        if body.get("webhook"):
+            asyncio.create_task(self._deliver(body["webhook"], prediction, runtime))
+        return JSONResponse({"id": prediction_id, "status": "starting"}, status_code=201)
+
+    async def get(self, request: Request):
+        self.gets += 1
+        return JSONResponse(self._view(self.predictions[request.path_params["prediction_id"]]))
+
+    async def upload(self, request: Request):
+        form = await request.form()
+        content = await form["content"].read()
+        file_id = uuid.uuid4().hex
+        self.files[file_id] = len(content)
+        return JSONResponse({
+            "id": file_id,
+            "name": form["content"].filename,
+            "size": len(content),
+            "checksums": {"sha256": hashlib.sha256(content).hexdigest()},
+            "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + self.upload_ttl)),
+            "urls": {"get": f"http://127.0.0.1:{FAKE_PORT}/v1/files/{file_id}"},
+        }, status_code=201)
+
+    async def _deliver(self, url: str, prediction: dict, runtime: float):
+        await asyncio.sleep(runtime)
+        body = json.dumps(self._view(prediction)).encode()
+        headers = {"Content-Type": "application/json"}
+        if self.secret:
+            webhook_id, timestamp = f"msg_{uuid.uuid4().hex}", str(int(time.time()))
+            key = base64.b64decode(self.secret.split("_", 1)[-1])
+            signature = base64.b64encode(
+                hmac.new(key, f"{webhook_id}.{timestamp}.".encode() + body, hashlib.sha256).digest()
+            ).decode()
+            headers.update({
+                "webhook-id": webhook_id,
+                "webhook-timestamp": timestamp,
+                "webhook-signature": f"v1,{signature}",
+            })
+        async with httpx.AsyncClient(transport=self.webhook_transport) as client:
+            response = await client.post(url, content=body, headers=headers)
+        self.deliveries.append(response.status_code)
+
+
+async def run_mode(service, fake: FakeReplicate, runs: int, webhook: bool):
+    service.webhook_url = f"http://127.0.0.1:{APP_PORT}/api/replicate/webhook" if webhook else None
+    for samples in service.runtimes.values():
+        samples.clear()
+    polls_before, gets_before = service.polls, fake.gets
+    lags = []
+    for _ in range(runs):
+        start = time.monotonic()
+        await service.separate_stems("http://example.invalid/audio.mp3", two_stems=True)
+        prediction = max(fake.predictions.values(), key=lambda p: p["done_at"])
+        lags.append(time.monotonic() - prediction["done_at"])
+        print(f"  run: {time.monotonic() - start:.1f}s, reaction lag {lags[-1]:.2f}s")
+
+    name = "webhook" if webhook else "polling"
+    print(f"{name}: {fake.gets - gets_before} GETs ({(service.polls - polls_before) / runs:.1f}/run), "
+          f"lag medio {sum(lags) / len(lags):.2f}s, máximo {max(lags):.2f}s")
+
+
+async def run_uploads(service, fake: FakeReplicate, runs: int, size_mb: float):
+    from stems_cache import hash_file
+
+    path = Path(tempfile.gettempdir()) / "fake_replicate_upload.mp3"
+    path.write_bytes(os.urandom(int(size_mb * 1024 * 1024)))
+    try:
+        content_hash = hash_file(path)
+        for i in range(runs):
+            start = time.monotonic()
+            url = await service.upload_file(path, content_hash)
+            print(f"  upload {i + 1}: {time.monotonic() - start:.3f}s -> {url}")
+        print(f"uploads: {len(fake.files)} recibidas en el servidor para {runs} separaciones "
+              f"({sum(fake.files.values()) / (1024 * 1024):.1f} MB)")
+    finally:
+        path.unlink(missing_ok=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--runtime", type=float, default=6.0, help="Duración simulada de cada predicción")
+    parser.add_argument("--jitter", type=float, default=1.0)
+    parser.add_argument("--upload-mb", type=float, default=8.0, help="Tamaño del audio de prueba para subidas")
+    parser.add_argument("--secret", default="whsec_" + base64.b64encode(b"fake-replicate-secret").decode(),
+                        help='Secreto de firma; "" para webhooks sin firma (solo despiertan la espera)')
+    args = parser.parse_args()
+
+    os.environ.setdefault("REPLICATE_API_TOKEN", "fake-token")
+    os.environ["REPLICATE_BASE_URL"] = f"http://127.0.0.1:{FAKE_PORT}/v1"
+    os.environ["REPLICATE_WEBHOOK_SECRET"] = args.secret
+
+    import config
+    config.REPLICATE_DEFAULT_RUNTIME = args.runtime  # Como si ya hubiera muestras
+    import main as backend
+    from replicate_service import replicate_service
+    replicate_service.base_url = os.environ["REPLICATE_BASE_URL"]
+    replicate_service.webhook_secret = args.secret
+
+    fake = FakeReplicate(args.runtime, args.jitter, args.secret)
+    servers = [
+        uvicorn.Server(uvicorn.Config(fake.app, port=FAKE_PORT, log_level="warning")),
+        uvicorn.Server(uvicorn.Config(backend.app, port=APP_PORT, log_level="warning")),
+    ]
+    tasks = [asyncio.create_task(server.serve()) for server in servers]
+    while not all(server.started for server in servers):
+        await asyncio.sleep(0.05)
+
+    try:
+        await run_mode(replicate_service, fake, args.runs, webhook=False)
+        await run_mode(replicate_service, fake, args.runs, webhook=True)
+        await run_uploads(replicate_service, fake, args.runs, args.upload_mb)
+    finally:
+        for server in servers:
+            server.should_exit = True
+        await asyncio.gather(*tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+Executor acotado para trabajo bloqueante (yt-dlp, ffmpeg)
+
+yt-dlp y ffmpeg son síncronos; si se llaman directamente dentro de un
+handler `async def` congelan todo el event loop (incluido /health).
+Este módulo los ejecuta en un pool de threads o procesos con un número
+máximo de workers y lleva estadísticas de cola y tiempos de espera.
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import config
+
+
+class BlockingExecutor:
+    def __init__(
+        self,
+        kind: str = "thread",
+        max_workers: int = 4,
+        initializer: Optional[Callable] = None,
+        initargs: Tuple = (),
+        start_method: Optional[str] = None,
+    ):
+        """
+        Args:
+            kind: "thread" o "process"
+            max_workers: Máximo de tareas ejecutándose a la vez
+            initializer / initargs: Se ejecuta una vez en cada worker al arrancar
+                (p. ej. cargar un modelo que queda en memoria entre tareas)
+            start_method: Método de multiprocessing para kind="process" ("spawn", "fork"...)
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de executor no soportado: {kind}")
+
+        self.kind = kind
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+
+        # Estadísticas
+        self.queued = 0  # Tareas esperando un worker
+        self.running = 0  # Tareas ejecutándose
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    @property
+    def supports_callbacks(self) -> bool:
+        """Los procesos no pueden recibir callbacks (progress hooks) no serializables"""
+        return self.kind == "thread"
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method) if self.start_method else None,
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="blocking",
+                    initializer=self.initializer,
+                    initargs=self.initargs
+                )
+        return self._executor
+
+    async def run(self, func: Callable, *args, on_abandoned: Optional[Callable[[], None]] = None, **kwargs) -> Any:
+        """
+        Ejecuta func(*args, **kwargs) fuera del event loop y espera el resultado.
+
+        Cancelar la espera no detiene un worker que ya arrancó (en un proceso
+        no hay forma de interrumpirlo): on_abandoned se llama cuando ese
+        worker termina de verdad, desde el thread del executor, para limpiar
+        lo que haya escrito.
+        """
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        timing = {"started": None, "done": False}
+
+        def _mark_started(started: float):
+            if timing["done"]:
+                return
+            timing["started"] = started
+            self.queued -= 1
+            self.running += 1
+
+        self.queued += 1
+        if self.kind == "process":
+            # No podemos observar cuándo arranca en otro proceso:
+            # se cuenta como en ejecución desde que se envía.
+            call = functools.partial(func, *args, **kwargs)
+            _mark_started(submitted)
+        else:
+            def call():
+                loop.call_soon_threadsafe(_mark_started, time.monotonic())
+                return func(*args, **kwargs)
+
+        executor = self._get_executor()
+        future = executor.submit(call)
+        try:
+            result = await asyncio.wrap_future(future, loop=loop)
+            self.completed += 1
+            return result
+        except asyncio.CancelledError:
+            if on_abandoned is not None:
+                future.add_done_callback(lambda _: self._call_abandoned(on_abandoned))
+            raise
+        except BrokenProcessPool:
+            # Un worker murió (p. ej. sin memoria): el pool ya no sirve, se recrea en la próxima tarea
+            self.failed += 1
+            if self._executor is executor:
+                self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            finished = time.monotonic()
+            timing["done"] = True
+            started = timing["started"]
+            if started is None:
+                # Cancelado antes de arrancar (o el aviso aún no llegó al loop)
+                self.queued -= 1
+                started = finished
+            else:
+                self.running -= 1
+            wait = started - submitted
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.total_run += finished - started
+
+    @staticmethod
+    def _call_abandoned(on_abandoned: Callable[[], None]):
+        try:
+            on_abandoned()
+        except Exception as e:
+            print(f"⚠️ Cleanup of abandoned task failed: {e}")
+
+    def stats(self) -> Dict:
+        """Estadísticas del executor"""
+        finished = self.completed + self.failed
+        return {
+            "kind": self.kind,
+            "max_workers": self.max_workers,
+            "queue_depth": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.total_wait / finished * 1000, 1) if finished else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+            "avg_run_ms": round(self.total_run / finished * 1000, 1) if finished else 0.0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia global para yt-dlp y ffmpeg
+ytdlp_executor = BlockingExecutor(
+    kind=config.BLOCKING_EXECUTOR_KIND,
+    max_workers=config.BLOCKING_EXECUTOR_WORKERS
+)
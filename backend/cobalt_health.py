@@ -0,0 +1,165 @@
+"""
+Salud de las instancias de Cobalt
+
+Lleva por instancia la tasa de éxito y la latencia (EWMA), abre un
+circuito tras varios fallos seguidos para dejar de enviarle peticiones,
+y la vuelve a probar en segundo plano (half-open) pasado un tiempo.
+Las instancias disponibles se ordenan por costo esperado.
+"""
+
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+import config
+from http_clients import http_clients
+
+CIRCUIT_CLOSED = "closed"  # Instancia sana, recibe tráfico
+CIRCUIT_OPEN = "open"  # Instancia caída, no recibe tráfico
+CIRCUIT_HALF_OPEN = "half_open"  # Sondeo exitoso, se permite tráfico de prueba
+
+
+class InstanceHealth:
+    def __init__(self, url: str):
+        self.url = url
+        self.state = CIRCUIT_CLOSED
+        self.latency_ewma: Optional[float] = None  # segundos
+        self.success_ewma = 1.0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def expected_cost(self) -> float:
+        """Latencia esperada penalizada por la probabilidad de fallo"""
+        latency = self.latency_ewma if self.latency_ewma is not None else config.COBALT_DEFAULT_LATENCY
+        return latency / max(self.success_ewma, 0.05)
+
+    def to_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "state": self.state,
+            "latency_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "success_rate": round(self.success_ewma, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "opened_at": self.opened_at,
+            "last_error": self.last_error,
+        }
+
+
+class CobaltHealth:
+    def __init__(
+        self,
+        instances: List[str],
+        failure_threshold: int = 3,
+        open_seconds: float = 120,
+        probe_interval: float = 30,
+        alpha: float = 0.3,
+    ):
+        """
+        Args:
+            instances: URLs de las instancias de Cobalt
+            failure_threshold: Fallos consecutivos para abrir el circuito
+            open_seconds: Tiempo mínimo con el circuito abierto antes de sondear
+            probe_interval: Cada cuánto corre el sondeo en segundo plano
+            alpha: Peso de la última muestra en los EWMA
+        """
+        self.instances = {url: InstanceHealth(url) for url in instances}
+        self.failure_threshold = failure_threshold
+        self.open_seconds = open_seconds
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def ordered_instances(self) -> List[str]:
+        """Instancias con circuito cerrado o half-open, de menor a mayor costo esperado"""
+        available = [h for h in self.instances.values() if h.state != CIRCUIT_OPEN]
+        available.sort(key=lambda h: h.expected_cost())
+        return [h.url for h in available]
+
+    def record_success(self, url: str, latency: float):
+        health = self.instances[url]
+        health.requests += 1
+        health.consecutive_failures = 0
+        health.success_ewma = self.alpha + (1 - self.alpha) * health.success_ewma
+        self._update_latency(health, latency)
+        if health.state != CIRCUIT_CLOSED:
+            print(f"✅ Cobalt circuit closed: {url}")
+            health.state = CIRCUIT_CLOSED
+            health.opened_at = None
+
+    def record_failure(self, url: str, error: str, latency: Optional[float] = None):
+        health = self.instances[url]
+        health.requests += 1
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error
+        health.success_ewma = (1 - self.alpha) * health.success_ewma
+        if latency is not None:
+            self._update_latency(health, latency)
+
+        if health.state == CIRCUIT_HALF_OPEN or health.consecutive_failures >= self.failure_threshold:
+            self._open(health)
+
+    def _update_latency(self, health: InstanceHealth, latency: float):
+        if health.latency_ewma is None:
+            health.latency_ewma = latency
+        else:
+            health.latency_ewma = self.alpha * latency + (1 - self.alpha) * health.latency_ewma
+
+    def _open(self, health: InstanceHealth):
+        if health.state != CIRCUIT_OPEN:
+            print(f"🔌 Cobalt circuit opened: {health.url} ({health.last_error})")
+        health.state = CIRCUIT_OPEN
+        health.opened_at = time.time()
+
+    async def probe(self, health: InstanceHealth):
+        """Sondea una instancia con el circuito abierto (GET / devuelve la info del servidor)"""
+        start = time.monotonic()
+        try:
+            response = await http_clients.get("cobalt").get(
+                health.url,
+                headers={"Accept": "application/json"},
+                timeout=config.COBALT_PROBE_TIMEOUT
+            )
+            ok = response.status_code == 200
+        except Exception as e:
+            ok = False
+            health.last_error = str(e)
+
+        if ok:
+            print(f"🩺 Cobalt probe ok, half-open: {health.url}")
+            health.state = CIRCUIT_HALF_OPEN
+            self._update_latency(health, time.monotonic() - start)
+        else:
+            health.opened_at = time.time()
+
+    async def _probe_loop(self):
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            now = time.time()
+            due = [
+                h for h in self.instances.values()
+                if h.state == CIRCUIT_OPEN and now - (h.opened_at or 0) >= self.open_seconds
+            ]
+            if due:
+                await asyncio.gather(*(self.probe(h) for h in due), return_exceptions=True)
+
+    def start(self):
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    def snapshot(self) -> List[Dict]:
+        """Estado de todas las instancias, en el orden en que se intentarían"""
+        order = {url: i for i, url in enumerate(self.ordered_instances())}
+        snapshot = [h.to_dict() for h in self.instances.values()]
+        snapshot.sort(key=lambda d: order.get(d["url"], len(order)))
+        return snapshot
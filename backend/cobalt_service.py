@@ -6,10 +6,16 @@ Nota: Cobalt API ahora requiere autenticación en la mayoría de instancias.
 Usamos instancias públicas disponibles con fallback a yt-dlp.
 """
 
-import httpx
 import os
+import time
 from typing import Optional, Dict, Any
 
+import httpx
+
+import config
+from cobalt_health import CobaltHealth
+from http_clients import http_clients
+
 # Instancias públicas de Cobalt que aún funcionan (actualizar si cambian)
 # Nota: La API oficial (api.cobalt.tools) ahora requiere API key
 COBALT_INSTANCES = [
@@ -19,18 +25,44 @@ COBALT_INSTANCES = [
     "https://dl.khyernet.xyz",
 ]
 
+def is_instance_failure(status_code: int) -> bool:
+    """Solo 5xx y 429 hablan de la salud de la instancia (los 4xx son del link pedido)"""
+    return status_code >= 500 or status_code == 429
+
+
+def content_error(response: httpx.Response) -> Optional[Dict[str, Any]]:
+    """
+    Error de Cobalt sobre el contenido (error.api.link.*, error.api.content.*...)
+    listo para devolver al llamador. None si es un error de la instancia
+    (p. ej. error.api.auth.*: esa instancia pide API key, otra puede servir).
+    """
+    try:
+        data = response.json()
+    except ValueError:
+        return None
+    error = data.get("error") if isinstance(data, dict) else None
+    if not isinstance(error, dict):
+        return None
+    code = error.get("code") or ""
+    if not code.startswith("error.api.") or code.startswith("error.api.auth"):
+        return None
+    return {
+        "status": "error",
+        "error": {**error, "message": error.get("message") or code},
+    }
+
+
 class CobaltService:
     def __init__(self):
-        self.current_instance = 0
         self.timeout = 60.0  # segundos
-    
-    def _get_instance(self) -> str:
-        """Obtiene la instancia actual de Cobalt"""
-        return COBALT_INSTANCES[self.current_instance % len(COBALT_INSTANCES)]
-    
-    def _rotate_instance(self):
-        """Rota a la siguiente instancia si hay error"""
-        self.current_instance += 1
+        # Las instancias caídas no se conectan más allá de este tiempo
+        self.request_timeout = httpx.Timeout(self.timeout, connect=config.COBALT_CONNECT_TIMEOUT)
+        self.health = CobaltHealth(
+            COBALT_INSTANCES,
+            failure_threshold=config.COBALT_FAILURE_THRESHOLD,
+            open_seconds=config.COBALT_OPEN_SECONDS,
+            probe_interval=config.COBALT_PROBE_INTERVAL
+        )
     
     async def get_download_url(
         self, 
@@ -70,34 +102,45 @@ class CobaltService:
         }
         
         last_error = None
+        instances = self.health.ordered_instances()
+        if not instances:
+            last_error = "todas las instancias están caídas (circuito abierto)"
         
-        # Intentar con cada instancia
-        for attempt in range(len(COBALT_INSTANCES)):
-            instance = self._get_instance()
+        # Intentar con cada instancia disponible, de la más rápida a la más lenta
+        for instance in instances:
+            start = time.monotonic()
             
             try:
                 print(f"🔄 Usando Cobalt: {instance}")
                 
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        instance,
-                        json=payload,
-                        headers=headers
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        print(f"✅ Cobalt response: {data.get('status')}")
-                        return data
-                    else:
-                        print(f"❌ Cobalt error {response.status_code}: {response.text}")
-                        last_error = f"HTTP {response.status_code}"
-                        self._rotate_instance()
-                        
+                client = http_clients.get("cobalt")
+                response = await client.post(
+                    instance,
+                    json=payload,
+                    headers=headers,
+                    timeout=self.request_timeout
+                )
+
+                if response.status_code == 200:
+                    data = response.json()
+                    print(f"✅ Cobalt response: {data.get('status')}")
+                    self.health.record_success(instance, time.monotonic() - start)
+                    return data
+
+                print(f"❌ Cobalt error {response.status_code}: {response.text}")
+                last_error = f"HTTP {response.status_code}"
+                if not is_instance_failure(response.status_code):
+                    # 4xx: la instancia respondió bien, el problema es el link o la petición
+                    error = content_error(response)
+                    if error is not None:
+                        return error
+                    continue
+                self.health.record_failure(instance, last_error, time.monotonic() - start)
+
             except Exception as e:
                 print(f"❌ Error con {instance}: {str(e)}")
                 last_error = str(e)
-                self._rotate_instance()
+                self.health.record_failure(instance, last_error)
         
         return {
             "status": "error",
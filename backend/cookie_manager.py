@@ -0,0 +1,349 @@
+"""
+Cookies de YouTube para yt-dlp (uno o varios juegos de credenciales)
+
+Cada juego de cookies se lee y valida una sola vez y se escribe en un
+archivo inmutable cuyo nombre es el hash del contenido; las fuentes se
+vuelven a revisar cada COOKIES_RELOAD_INTERVAL segundos (variable de entorno
+o mtime/tamaño del archivo) y solo se reescriben si cambiaron.
+
+Fuentes, en orden de prioridad:
+- YOUTUBE_COOKIES, YOUTUBE_COOKIES_2, YOUTUBE_COOKIES_3... (variables de entorno)
+- YOUTUBE_COOKIES_FILE / YOUTUBE_COOKIES_FILES (archivos), si no hay variables
+  ni YOUTUBE_COOKIES_BROWSER
+
+Las descargas rotan entre los juegos disponibles. Se lleva por juego la tasa
+de fallos y de "Sign in to confirm you're not a bot"; un juego con bot-check
+o con varios fallos seguidos sale de la rotación durante COOKIES_COOLDOWN.
+
+yt-dlp reescribe el cookiefile al cerrar: extract_info_sync le pasa una copia
+en memoria (readonly_cookiefile) para que el archivo compartido no cambie.
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import config
+
+COOKIES_DIR = Path(tempfile.gettempdir()) / "youtube_steams_cookies"
+
+NETSCAPE_HEADER = "# Netscape HTTP Cookie File"
+_HTTPONLY_PREFIX = "#HttpOnly_"
+
+# Errores que indican que YouTube rechazó la sesión (o la IP) y no el video
+BOT_CHECK_ERRORS = ("confirm you", "not a bot", "http error 429", "too many requests")
+# Errores del video en sí: no dicen nada de las cookies
+NEUTRAL_ERRORS = ("video unavailable", "private video", "is not available", "has been removed", "copyright")
+
+
+def parse_cookies(content: str) -> Tuple[str, int, int]:
+    """
+    Normaliza un archivo de cookies en formato Netscape.
+
+    Returns:
+        (contenido normalizado, cookies válidas, líneas descartadas)
+    """
+    lines = content.lstrip("\ufeff").replace("\r\n", "\n").split("\n")
+    kept = [NETSCAPE_HEADER]
+    valid = 0
+    dropped = 0
+    for line in lines:
+        stripped = line.strip()
+        if not stripped or (stripped.startswith("#") and not stripped.startswith(_HTTPONLY_PREFIX)):
+            continue
+        entry = stripped[len(_HTTPONLY_PREFIX):] if stripped.startswith(_HTTPONLY_PREFIX) else stripped
+        fields = entry.split("\t")
+        if len(fields) != 7 or (fields[4] and not re.fullmatch(r"[0-9]+(?:\.[0-9]+)?", fields[4])):
+            dropped += 1
+            continue
+        kept.append(line.rstrip("\r"))
+        valid += 1
+    return "\n".join(kept) + "\n", valid, dropped
+
+
+@lru_cache(maxsize=32)
+def _read_cookiefile(path: str) -> Optional[str]:
+    # El nombre es el hash del contenido: lo leído nunca queda desactualizado
+    try:
+        return Path(path).read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def readonly_cookiefile(cookiefile):
+    """
+    Copia en memoria de un archivo de cookies administrado: yt-dlp guarda las
+    cookies al cerrar y así no toca el archivo compartido. Funciona también
+    dentro de un executor de procesos (cada proceso cachea su lectura).
+    """
+    if not isinstance(cookiefile, str) or Path(cookiefile).parent != COOKIES_DIR:
+        return cookiefile
+    content = _read_cookiefile(cookiefile)
+    if content is None:
+        print(f"⚠️ Cookies file missing, running without cookies: {Path(cookiefile).name}")
+        return None
+    return io.StringIO(content)
+
+
+class CookieSet:
+    def __init__(self, name: str, source: str):
+        self.name = name
+        self.source = source  # "env" / "file"
+        self.path: Optional[str] = None
+        self.digest: Optional[str] = None
+        self.cookies = 0
+        self.dropped_lines = 0
+        self.loaded_at: Optional[float] = None
+        # Salud
+        self.uses = 0
+        self.failures = 0
+        self.bot_checks = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def reset_health(self):
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error = None
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def to_dict(self) -> Dict:
+        now = time.time()
+        return {
+            "name": self.name,
+            "source": self.source,
+            "cookies": self.cookies,
+            "dropped_lines": self.dropped_lines,
+            "digest": self.digest[:12] if self.digest else None,
+            "loaded_at": self.loaded_at,
+            "available": self.available(now),
+            "cooldown_remaining": max(0, round(self.cooldown_until - now)),
+            "uses": self.uses,
+            "failures": self.failures,
+            "bot_checks": self.bot_checks,
+            "failure_rate": round(self.failures / self.uses, 3) if self.uses else 0.0,
+            "bot_check_rate": round(self.bot_checks / self.uses, 3) if self.uses else 0.0,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+        }
+
+
+class CookieManager:
+    def __init__(
+        self,
+        env_prefix: str = "YOUTUBE_COOKIES",
+        files: Optional[List[str]] = None,
+        reload_interval: float = 5.0,
+        failure_threshold: int = 3,
+        cooldown: float = 900,
+        retired_grace: float = 3600,
+    ):
+        """
+        Args:
+            env_prefix: Variable de entorno con cookies (y sus variantes _2, _3...)
+            files: Archivos de cookies (solo se usan si no hay variables de entorno)
+            reload_interval: Segundos entre revisiones de las fuentes
+            failure_threshold: Fallos seguidos que sacan un juego de la rotación
+            cooldown: Segundos fuera de la rotación tras un bot-check o los fallos seguidos
+            retired_grace: Segundos que se conserva el archivo de unas credenciales
+                reemplazadas (una llamada en curso o en cola puede seguir usándolo)
+        """
+        self.env_pattern = re.compile(rf"{re.escape(env_prefix)}(?:_(\d+))?")
+        self.files = files or []
+        self.reload_interval = reload_interval
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.retired_grace = retired_grace
+        self.sets: Dict[str, CookieSet] = {}
+        self._retired: Dict[str, float] = {}  # {ruta: cuándo dejó de usarse}
+        self._fingerprints: Dict[str, object] = {}
+        self._next = 0
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.loads = 0
+        self.exhausted = 0  # Veces que todos los juegos estaban fuera de rotación
+
+    def _sources(self) -> List[Tuple[str, str, str]]:
+        """(nombre, tipo, variable o ruta) de cada fuente configurada"""
+        env_sources = []
+        for key in os.environ:
+            match = self.env_pattern.fullmatch(key)
+            if match and os.environ[key].strip():
+                env_sources.append((int(match.group(1) or 1), key))
+        if env_sources:
+            return [(key, "env", key) for _, key in sorted(env_sources)]
+        return [(path, "file", path) for path in self.files if Path(path).is_file()]
+
+    def _read_source(self, kind: str, locator: str) -> Tuple[object, Optional[str]]:
+        """(huella de la fuente, contenido si cambió respecto a la huella anterior)"""
+        if kind == "env":
+            content = os.environ.get(locator, "")
+            fingerprint = hashlib.sha256(content.encode("utf-8")).hexdigest()
+            changed = self._fingerprints.get(locator) != fingerprint
+            return fingerprint, content if changed else None
+        stat_result = os.stat(locator)
+        fingerprint = (stat_result.st_mtime_ns, stat_result.st_size)
+        if self._fingerprints.get(locator) == fingerprint:
+            return fingerprint, None
+        return fingerprint, Path(locator).read_text(encoding="utf-8", errors="replace")
+
+    def _write(self, content: str) -> Tuple[str, str]:
+        """Escribe (una sola vez) el archivo inmutable de un contenido"""
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        path = COOKIES_DIR / f"{digest[:16]}.txt"
+        if not path.exists():
+            COOKIES_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(content)
+            os.replace(tmp, path)
+        return str(path), digest
+
+    def _refresh(self):
+        """Relee las fuentes que cambiaron (llamar con el lock tomado)"""
+        sources = self._sources()
+        previous_paths = {s.path for s in self.sets.values()}
+        current = {}
+        for name, kind, locator in sources:
+            cookie_set = self.sets.get(name) or CookieSet(name, kind)
+            try:
+                fingerprint, content = self._read_source(kind, locator)
+            except OSError as e:
+                print(f"⚠️ Could not read cookies {name}: {e}")
+                if cookie_set.path:
+                    current[name] = cookie_set
+                continue
+            self._fingerprints[locator] = fingerprint
+            if content is not None:
+                normalized, valid, dropped = parse_cookies(content)
+                if not valid:
+                    print(f"⚠️ Cookies {name} ignored: no valid Netscape entries")
+                    continue
+                path, digest = self._write(normalized)
+                if digest != cookie_set.digest:
+                    # Credenciales nuevas: vuelven a la rotación
+                    cookie_set.reset_health()
+                    cookie_set.path, cookie_set.digest = path, digest
+                    cookie_set.cookies, cookie_set.dropped_lines = valid, dropped
+                    cookie_set.loaded_at = time.time()
+                    self.loads += 1
+                    print(f"🍪 Cookies {name} loaded: {valid} entries ({dropped} invalid lines dropped)")
+            if cookie_set.path:
+                current[name] = cookie_set
+
+        for name in self.sets:
+            if name not in current:
+                print(f"🍪 Cookies {name} removed")
+        self._prune_files({s.path for s in current.values()}, previous_paths)
+        self.sets = current
+
+    def _prune_files(self, keep: set, previous: set):
+        """
+        Retira los archivos de credenciales reemplazadas y borra los retirados
+        hace más de retired_grace: un worker que recibió la ruta antes del cambio
+        todavía puede leerla.
+        """
+        now = time.time()
+        for path in previous - keep:
+            if path:
+                self._retired.setdefault(path, now)
+        for path, retired_at in list(self._retired.items()):
+            if path in keep:
+                del self._retired[path]
+            elif now - retired_at >= self.retired_grace:
+                Path(path).unlink(missing_ok=True)
+                del self._retired[path]
+
+    def acquire(self) -> Optional[CookieSet]:
+        """
+        Siguiente juego de cookies en la rotación (None si no hay ninguno).
+        Si todos están fuera de rotación, el que antes termina su cooldown.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is None or now - self._checked_at >= self.reload_interval:
+                self._checked_at = now
+                self._refresh()
+            if not self.sets:
+                return None
+
+            sets = list(self.sets.values())
+            wall = time.time()
+            for offset in range(len(sets)):
+                candidate = sets[(self._next + offset) % len(sets)]
+                if candidate.available(wall):
+                    self._next = (self._next + offset + 1) % len(sets)
+                    return candidate
+
+            self.exhausted += 1
+            return min(sets, key=lambda s: s.cooldown_until)
+
+    def report(self, cookie_set: CookieSet, error: Optional[BaseException] = None):
+        """Resultado de una llamada a yt-dlp con cookie_set"""
+        message = str(error).lower() if error is not None else ""
+        if error is not None and any(pattern in message for pattern in NEUTRAL_ERRORS):
+            return
+
+        with self._lock:
+            cookie_set.uses += 1
+            if error is None:
+                cookie_set.consecutive_failures = 0
+                return
+
+            cookie_set.failures += 1
+            cookie_set.consecutive_failures += 1
+            cookie_set.last_error = str(error)[:200]
+            bot_check = any(pattern in message for pattern in BOT_CHECK_ERRORS)
+            if bot_check:
+                cookie_set.bot_checks += 1
+            if bot_check or cookie_set.consecutive_failures >= self.failure_threshold:
+                cookie_set.cooldown_until = time.time() + self.cooldown
+                reason = "bot check" if bot_check else f"{cookie_set.consecutive_failures} failures"
+                print(f"🚫 Cookies {cookie_set.name} out of rotation for {self.cooldown:.0f}s ({reason})")
+
+    @contextmanager
+    def track(self, cookie_set: Optional[CookieSet]):
+        """Reporta el resultado del bloque (las cancelaciones no cuentan)"""
+        try:
+            yield
+        except Exception as e:
+            if cookie_set is not None and "cancel" not in type(e).__name__.lower():
+                self.report(cookie_set, e)
+            raise
+        if cookie_set is not None:
+            self.report(cookie_set)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            sets = [s.to_dict() for s in self.sets.values()]
+        return {
+            "sets": sets,
+            "available": sum(1 for s in sets if s["available"]),
+            "loads": self.loads,
+            "exhausted": self.exhausted,
+            "retired_files": len(self._retired),
+        }
+
+
+# Instancia global
+cookie_manager = CookieManager(
+    files=[] if config.YOUTUBE_COOKIES_BROWSER else config.YOUTUBE_COOKIES_FILES,
+    reload_interval=config.COOKIES_RELOAD_INTERVAL,
+    failure_threshold=config.COOKIES_FAILURE_THRESHOLD,
+    cooldown=config.COOKIES_COOLDOWN,
+    retired_grace=config.COOKIES_RETIRED_GRACE
+)
@@ -0,0 +1,108 @@
+"""
+Código que corre dentro de los procesos del pool de Demucs local
+
+Se mantiene separado de main.py y de los servicios para que los workers
+(arrancados con "spawn") solo importen torch/demucs. Cada proceso carga los
+modelos una vez (en init_worker o en su primer uso) y los reutiliza en todas
+las separaciones siguientes.
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+# Modelos cargados en este proceso {nombre: modelo}
+_models: Dict = {}
+
+
+def init_worker(preload: Iterable[str], threads: int):
+    """Initializer del pool: limita los threads de torch y precarga modelos"""
+    import torch
+
+    if threads > 0:
+        torch.set_num_threads(threads)
+    for name in preload:
+        _get_model(name)
+
+
+def _get_model(name: str):
+    model = _models.get(name)
+    if model is None:
+        from demucs.pretrained import get_model
+
+        model = get_model(name)
+        model.cpu()
+        model.eval()
+        _models[name] = model
+    return model
+
+
+def ready() -> int:
+    """Tarea vacía para arrancar (y calentar) un worker"""
+    return os.getpid()
+
+
+def separate(
+    input_path: str,
+    output_dir: str,
+    model_name: str,
+    two_stems: bool,
+    segment: float,
+    jobs: int,
+    bitrate: int,
+) -> Dict:
+    """
+    Separa input_path en output_dir/{stem}.mp3
+
+    Con two_stems se guardan "vocals" y "no_vocals" (suma del resto), igual
+    que `demucs --two-stems vocals`.
+
+    Returns:
+        {"stems": [nombres], "seconds": duración, "pid": proceso}
+    """
+    import torch
+    from demucs.apply import apply_model
+    from demucs.audio import AudioFile, save_audio
+
+    start = time.monotonic()
+    model = _get_model(model_name)
+
+    wav = AudioFile(input_path).read(
+        streams=0,
+        samplerate=model.samplerate,
+        channels=model.audio_channels
+    )
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+
+    with torch.no_grad():
+        sources = apply_model(
+            model,
+            wav[None],
+            device="cpu",
+            shifts=1,
+            split=True,
+            overlap=0.25,
+            progress=False,
+            num_workers=jobs,
+            segment=segment
+        )[0]
+    sources = sources * ref.std() + ref.mean()
+
+    outputs = dict(zip(model.sources, sources))
+    if two_stems:
+        vocals = outputs.pop("vocals")
+        outputs = {"vocals": vocals, "no_vocals": sum(outputs.values())}
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stems: List[str] = []
+    for name, source in outputs.items():
+        # Escribir aparte y renombrar: nunca se sirve un mp3 a medio escribir
+        temp_path = output_dir / f".{name}.tmp.mp3"
+        save_audio(source, str(temp_path), samplerate=model.samplerate, bitrate=bitrate, clip="rescale")
+        os.replace(temp_path, output_dir / f"{name}.mp3")
+        stems.append(name)
+
+    return {"stems": stems, "seconds": time.monotonic() - start, "pid": os.getpid()}
@@ -0,0 +1,316 @@
+"""
+Limpieza automática de DOWNLOADS_DIR y STEMS_DIR
+
+Cada cierto tiempo recorre ambos directorios por lotes (cediendo el event
+loop entre uno y otro), agrupa el uso de disco por file_id (audio/video +
+sus stems) y expulsa:
+
+1. Lo que lleva más de CLEANUP_AFTER_HOURS sin usarse
+2. Lo menos usado (LRU por last_access) hasta quedar bajo la cuota
+3. Archivos de trabajo huérfanos (.part, -cobalt, -ytdlp) de descargas abandonadas
+
+La caché de stems (STEMS_DIR/.cache) tiene su propia cuota y se recorta en
+cada pasada. Los stems de un file_id enlazados desde la caché comparten los
+bytes con ella, así que no cuentan para la cuota de los file_id.
+
+Los file_id en uso (descargas en curso, con sus archivos de trabajo, y
+respuestas que todavía se están enviando) se fijan con pin() y nunca se
+borran.
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import config
+from file_store import file_store
+from stems_cache import stems_cache
+
+# {file_id}.mp3 / {file_id}.mp4 / {file_id}/ (los file_id son UUID)
+FILE_ID_RE = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})(.*)$")
+# Restos de backends: {file_id}-cobalt.*, {file_id}-ytdlp.*, .{nombre}.XXXX.part
+WORKING_SUFFIXES = ("-cobalt", "-ytdlp")
+# Archivo de cookies que versiones anteriores dejaban en DOWNLOADS_DIR
+LEGACY_STRAY_FILES = ("temp_cookies.txt",)
+# Directorios que se gestionan aparte (caché de stems)
+SKIP_DIRS = (".cache",)
+
+
+class _Usage:
+    __slots__ = ("file_id", "paths", "bytes", "mtime")
+
+    def __init__(self, file_id: str):
+        self.file_id = file_id
+        self.paths: List[Path] = []
+        self.bytes = 0
+        self.mtime = 0.0
+
+
+class DiskJanitor:
+    def __init__(
+        self,
+        dirs: List[Path],
+        max_bytes: int,
+        max_age_hours: float,
+        interval: float = 300,
+        grace_seconds: float = 3600,
+        batch_size: int = 500,
+        enabled: bool = True,
+    ):
+        """
+        Args:
+            dirs: Directorios a vigilar (descargas, stems)
+            max_bytes: Cuota total en bytes
+            max_age_hours: Horas sin uso tras las que se borra un archivo
+            interval: Segundos entre pasadas
+            grace_seconds: Antigüedad mínima de un archivo de trabajo huérfano para borrarlo
+            batch_size: Entradas de directorio procesadas antes de ceder el event loop
+            enabled: Si es False no se arranca la limpieza periódica
+        """
+        self.dirs = [Path(d) for d in dirs]
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_hours * 3600
+        self.interval = interval
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self._pins: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+        # Estadísticas
+        self.runs = 0
+        self.bytes_reclaimed = 0
+        self.evictions = Counter()  # {age, quota, stray}
+        self.usage_bytes = 0
+        self.tracked_files = 0
+        self.last_run: Optional[float] = None
+        self.last_run_seconds = 0.0
+
+    @contextmanager
+    def pin(self, file_id: str):
+        """Protege file_id de la limpieza mientras dure el bloque"""
+        self._pins[file_id] += 1
+        try:
+            yield
+        finally:
+            self._pins[file_id] -= 1
+            if self._pins[file_id] <= 0:
+                del self._pins[file_id]
+
+    def is_pinned(self, file_id: str) -> bool:
+        return self._pins.get(file_id, 0) > 0
+
+    # --- Escaneo incremental ---
+
+    async def _walk(self, root: Path):
+        """Recorre root (recursivo) devolviendo (path, stat) y cediendo el loop cada batch_size entradas"""
+        stack = [root]
+        seen = 0
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                seen += 1
+                if seen % self.batch_size == 0:
+                    await asyncio.sleep(0)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            stack.append(Path(entry.path))
+                    else:
+                        yield Path(entry.path), entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+
+    def _owner(self, root: Path, path: Path) -> Optional[str]:
+        """file_id al que pertenece path (primer componente con forma de UUID bajo root)"""
+        for part in path.relative_to(root).parts:
+            match = FILE_ID_RE.match(part)
+            if match:
+                return match.group(1)
+        return None
+
+    def _working_owner(self, path: Path) -> Optional[str]:
+        """file_id de un archivo de trabajo ({file_id}-cobalt.*, .{file_id}-cobalt.mp3.XXXX.part...)"""
+        match = FILE_ID_RE.match(path.name.lstrip("."))
+        return match.group(1) if match else None
+
+    def _is_working_file(self, path: Path) -> bool:
+        name = path.name
+        if name.endswith(".part") or name.endswith(".ytdl"):
+            return True
+        match = FILE_ID_RE.match(name.lstrip("."))
+        return bool(match and match.group(2).startswith(WORKING_SUFFIXES))
+
+    async def scan(self):
+        """Uso de disco agrupado por file_id, más los archivos de trabajo huérfanos"""
+        usage: Dict[str, _Usage] = {}
+        stray: List[Path] = []
+        now = time.time()
+
+        for root in self.dirs:
+            async for path, stat in self._walk(root):
+                if path.parent == root and path.name in LEGACY_STRAY_FILES:
+                    stray.append(path)
+                    continue
+                if self._is_working_file(path):
+                    if now - stat.st_mtime > self.grace_seconds:
+                        stray.append(path)
+                    continue
+                file_id = self._owner(root, path)
+                if file_id is None:
+                    continue
+                entry = usage.get(file_id)
+                if entry is None:
+                    entry = usage[file_id] = _Usage(file_id)
+                entry.paths.append(path)
+                if stat.st_nlink == 1:
+                    entry.bytes += stat.st_size
+                entry.mtime = max(entry.mtime, stat.st_mtime)
+
+        return usage, stray
+
+    # --- Limpieza ---
+
+    def _delete(self, paths: List[Path]) -> int:
+        reclaimed = 0
+        for path in paths:
+            try:
+                stat = path.stat()
+                path.unlink()
+                # Con más enlaces (caché de stems) el espacio no se libera
+                if stat.st_nlink == 1:
+                    reclaimed += stat.st_size
+            except FileNotFoundError:
+                continue
+            # Borrar directorios de stems que quedaron vacíos
+            parent = path.parent
+            while parent not in self.dirs and parent.exists():
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+        return reclaimed
+
+    async def run_once(self) -> Dict:
+        """Una pasada completa de limpieza"""
+        start = time.monotonic()
+        now = time.time()
+        usage, stray = await self.scan()
+
+        # last_access de la metadata persistente (o mtime si no hay metadata), leído
+        # por páginas del índice last_access en lugar de una consulta por file_id
+        after, after_id = 0.0, ""
+        while True:
+            rows = file_store.least_recently_used(limit=self.batch_size, after=after, after_id=after_id)
+            if not rows:
+                break
+            for row in rows:
+                entry = usage.get(row["file_id"])
+                if entry is not None:
+                    entry.mtime = max(entry.mtime, row["last_access"])
+            after, after_id = rows[-1]["last_access"], rows[-1]["file_id"]
+            await asyncio.sleep(0)
+
+        total = sum(entry.bytes for entry in usage.values())
+        candidates = sorted(
+            (e for e in usage.values() if not self.is_pinned(e.file_id)),
+            key=lambda e: e.mtime
+        )
+
+        evicted: List[str] = []
+        reclaimed = 0
+        for entry in candidates:
+            if self.is_pinned(entry.file_id):
+                continue  # Se fijó durante la pasada
+            if now - entry.mtime > self.max_age_seconds:
+                reason = "age"
+            elif total > self.max_bytes:
+                reason = "quota"
+            else:
+                # Ordenados por último uso: ninguno de los siguientes vence ni hace falta cuota
+                break
+            freed = self._delete(entry.paths)
+            total -= entry.bytes
+            reclaimed += freed
+            evicted.append(entry.file_id)
+            self.evictions[reason] += 1
+            print(f"🧹 Janitor ({reason}): {entry.file_id} ({freed / (1024 * 1024):.1f} MB)")
+            await asyncio.sleep(0)
+
+        # Un archivo de trabajo viejo de una descarga que sigue en curso no es huérfano
+        stray = [path for path in stray if not self.is_pinned(self._working_owner(path))]
+        if stray:
+            freed = self._delete(stray)
+            reclaimed += freed
+            self.evictions["stray"] += len(stray)
+
+        if evicted:
+            # Borra también las entradas de la caché de artefactos (viven en la misma fila)
+            file_store.delete(evicted)
+
+        stems_cache_bytes = stems_cache.total_bytes
+        if stems_cache.enforce():
+            reclaimed += stems_cache_bytes - stems_cache.total_bytes
+
+        self.runs += 1
+        self.bytes_reclaimed += reclaimed
+        self.usage_bytes = total
+        self.tracked_files = len(usage) - len(evicted)
+        self.last_run = now
+        self.last_run_seconds = time.monotonic() - start
+
+        return {"evicted": len(evicted), "stray": len(stray), "bytes_reclaimed": reclaimed}
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"⚠️ Janitor run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            print(f"✅ Disk janitor started (quota {self.max_bytes // (1024 * 1024)} MB, "
+                  f"max age {self.max_age_seconds / 3600:g}h)")
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "usage_bytes": self.usage_bytes,
+            "max_bytes": self.max_bytes,
+            "tracked_files": self.tracked_files,
+            "pinned": len(self._pins),
+            "runs": self.runs,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "evictions": dict(self.evictions),
+            "last_run": self.last_run,
+            "last_run_seconds": round(self.last_run_seconds, 3),
+        }
+
+
+# Instancia global
+disk_janitor = DiskJanitor(
+    dirs=[config.DOWNLOADS_DIR, config.STEMS_DIR],
+    max_bytes=config.DISK_QUOTA_BYTES,
+    max_age_hours=config.CLEANUP_AFTER_HOURS,
+    interval=config.CLEANUP_INTERVAL,
+    grace_seconds=config.CLEANUP_GRACE_SECONDS,
+    enabled=config.AUTO_CLEANUP
+)
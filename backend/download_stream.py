@@ -0,0 +1,134 @@
+"""
+Descarga HTTP en streaming a disco
+
+Escribe la respuesta por bloques en un archivo temporal del mismo directorio
+y lo renombra de forma atómica al terminar, así nunca tenemos el archivo
+completo en memoria ni dejamos archivos a medias con el nombre final.
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import httpx
+
+import config
+from http_clients import http_clients
+from tee_stream import TeeDownload
+
+
+class DownloadTooLargeError(Exception):
+    """El archivo remoto supera el tamaño máximo permitido"""
+
+
+async def stream_to_file(
+    url: str,
+    output_path: Path,
+    timeout: float = 120.0,
+    max_bytes: Optional[int] = None,
+    chunk_size: int = config.DOWNLOAD_CHUNK_SIZE,
+    buffer_size: int = config.DOWNLOAD_BUFFER_SIZE,
+    on_progress: Optional[Callable[[int, Optional[int]], None]] = None,
+    on_first_byte: Optional[Callable[[], None]] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    tee: Optional[TeeDownload] = None,
+) -> Dict:
+    """
+    Descarga `url` en `output_path` sin cargar el archivo completo en memoria
+
+    Args:
+        url: URL a descargar (se siguen redirecciones)
+        output_path: Ruta final del archivo
+        timeout: Timeout de httpx en segundos
+        max_bytes: Tamaño máximo permitido (None = sin límite)
+        chunk_size: Tamaño de cada bloque leído de la red
+        buffer_size: Bytes acumulados en memoria antes de escribir a disco
+        on_progress: Callback (bytes_descargados, total_o_None) tras cada escritura
+        on_first_byte: Callback al recibir el primer bloque de datos
+        client: Cliente httpx (por defecto el compartido de descargas)
+        tee: Descarga de tee_stream a la que se publica cada bloque escrito
+             (para servirlo a los clientes mientras se descarga)
+
+    Returns:
+        Dict con path, bytes, seconds y bytes_per_sec
+    """
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_name = tempfile.mkstemp(
+        dir=output_path.parent,
+        prefix=f".{output_path.name}.",
+        suffix=".part",
+    )
+    temp_path = Path(temp_name)
+    start = time.monotonic()
+    written = 0
+    client = client or http_clients.get("downloads")
+    if tee is not None:
+        # Escribir cada bloque enseguida: los lectores solo ven lo que ya está en disco
+        buffer_size = chunk_size
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            async with client.stream("GET", url, timeout=timeout) as response:
+                response.raise_for_status()
+
+                total = response.headers.get("Content-Length")
+                total = int(total) if total and total.isdigit() else None
+                if max_bytes and total and total > max_bytes:
+                    raise DownloadTooLargeError(
+                        f"Archivo demasiado grande: {total} bytes (máximo {max_bytes})"
+                    )
+                if tee is not None:
+                    tee.start(temp_path, total)
+
+                buffer = bytearray()
+                async for chunk in response.aiter_bytes(chunk_size):
+                    if on_first_byte and not buffer and not written:
+                        on_first_byte()
+                    buffer += chunk
+                    if max_bytes and written + len(buffer) > max_bytes:
+                        raise DownloadTooLargeError(
+                            f"Archivo demasiado grande: más de {max_bytes} bytes"
+                        )
+                    if len(buffer) >= buffer_size:
+                        f.write(buffer)
+                        written += len(buffer)
+                        buffer.clear()
+                        if tee is not None:
+                            f.flush()
+                            tee.advance(written)
+                        if on_progress:
+                            on_progress(written, total)
+
+                if buffer:
+                    f.write(buffer)
+                    written += len(buffer)
+                    if tee is not None:
+                        f.flush()
+                        tee.advance(written)
+                    if on_progress:
+                        on_progress(written, total)
+
+        os.replace(temp_path, output_path)
+    except BaseException as e:
+        temp_path.unlink(missing_ok=True)
+        if tee is not None:
+            tee.abort_attempt(str(e) or type(e).__name__)
+        raise
+
+    seconds = time.monotonic() - start
+    bytes_per_sec = written / seconds if seconds > 0 else 0.0
+    print(
+        f"📦 {output_path.name}: {written / (1024 * 1024):.2f} MB en {seconds:.1f}s "
+        f"({bytes_per_sec / (1024 * 1024):.2f} MB/s)"
+    )
+
+    return {
+        "path": output_path,
+        "bytes": written,
+        "seconds": seconds,
+        "bytes_per_sec": bytes_per_sec,
+    }
@@ -0,0 +1,261 @@
+"""
+Respuestas de archivos con soporte de Range y GET condicional
+
+FileResponse de Starlette (0.27) siempre envía el archivo completo. Esta
+versión agrega:
+
+- ETag fuerte a partir de la identidad del archivo (inode, tamaño, mtime)
+- If-None-Match -> 304 sin cuerpo
+- Range con uno o varios rangos (206, multipart/byteranges) y 416
+- If-Range: el rango solo se respeta si el archivo no cambió
+- Envío zero-copy (sendfile) si el servidor ASGI expone la extensión
+  http.response.zerocopysend
+"""
+
+import os
+import secrets
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Mapping, Optional, Tuple
+
+import anyio
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+# Más rangos que esto en una petición se ignoran (se envía el archivo completo)
+MAX_RANGES = 32
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def make_etag(stat_result: os.stat_result) -> str:
+    """ETag fuerte: cambia si el archivo se reemplaza (inode) o se modifica"""
+    return '"{:x}-{:x}-{:x}"'.format(stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    """Compara contra una lista de ETags (If-None-Match usa comparación débil)"""
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range(header: str, size: int) -> List[Tuple[int, int]]:
+    """
+    Parsea "bytes=a-b,c-,-n" en rangos [inicio, fin) ordenados y combinados.
+    Lanza ValueError si el header es inválido (se ignora) y
+    RangeNotSatisfiable si ningún rango cae dentro del archivo.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        raise ValueError("Unsupported range unit")
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            raise ValueError("Invalid range")
+        first, last = first.strip(), last.strip()
+        if first == "":
+            # Sufijo: los últimos N bytes
+            if not last.isdigit():
+                raise ValueError("Invalid range")
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(0, size - length), size))
+        else:
+            if not first.isdigit() or (last and not last.isdigit()):
+                raise ValueError("Invalid range")
+            start = int(first)
+            if last and int(last) < start:
+                raise ValueError("Invalid range")
+            if start >= size:
+                continue
+            end = int(last) + 1 if last else size
+            ranges.append((start, min(end, size)))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    # Combinar rangos solapados o contiguos
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RangeFileResponse(FileResponse):
+    chunk_size = 256 * 1024
+
+    def __init__(
+        self,
+        path,
+        request_headers: Mapping[str, str],
+        media_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        method: Optional[str] = None,
+        content_disposition_type: str = "attachment",
+    ):
+        """
+        Args:
+            path: Archivo a servir (debe existir)
+            request_headers: Headers de la petición (Range, If-None-Match, If-Range)
+            media_type / filename / method / content_disposition_type: como en FileResponse
+        """
+        stat_result = os.stat(path)
+        if not stat.S_ISREG(stat_result.st_mode):
+            raise RuntimeError(f"File at path {path} is not a file.")
+
+        super().__init__(
+            path,
+            media_type=media_type,
+            filename=filename,
+            stat_result=stat_result,
+            method=method,
+            content_disposition_type=content_disposition_type,
+        )
+        self.ranges: List[Tuple[int, int]] = [(0, stat_result.st_size)]
+        self.boundary: Optional[str] = None
+        self._evaluate(request_headers, stat_result)
+
+    def set_stat_headers(self, stat_result: os.stat_result) -> None:
+        self.headers.setdefault("content-length", str(stat_result.st_size))
+        self.headers.setdefault("last-modified", formatdate(stat_result.st_mtime, usegmt=True))
+        self.headers.setdefault("etag", make_etag(stat_result))
+        self.headers.setdefault("accept-ranges", "bytes")
+
+    def _evaluate(self, request_headers: Mapping[str, str], stat_result: os.stat_result):
+        """Decide el status (200 / 206 / 304 / 416) y los rangos a enviar"""
+        size = stat_result.st_size
+        etag = self.headers["etag"]
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag, weak=True):
+            self.status_code = 304
+            self.ranges = []
+            for header in ("content-length", "content-type", "content-disposition"):
+                if header in self.headers:
+                    del self.headers[header]
+            return
+
+        range_header = request_headers.get("range")
+        if not range_header or not self._if_range_ok(request_headers.get("if-range"), etag, stat_result):
+            return
+
+        try:
+            ranges = parse_range(range_header, size)
+        except ValueError:
+            return  # Range inválido: se ignora y se envía todo
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.ranges = []
+            self.headers["content-range"] = f"bytes */{size}"
+            self.headers["content-length"] = "0"
+            return
+
+        if len(ranges) > MAX_RANGES:
+            return
+
+        self.status_code = 206
+        self.ranges = ranges
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            self.headers["content-range"] = f"bytes {start}-{end - 1}/{size}"
+            self.headers["content-length"] = str(end - start)
+        else:
+            self.boundary = secrets.token_hex(16)
+            self._part_headers = [
+                self._part_header(start, end, size) for start, end in ranges
+            ]
+            self._closing = f"\r\n--{self.boundary}--\r\n".encode()
+            length = sum(len(h) for h in self._part_headers) + sum(e - s for s, e in ranges) + len(self._closing)
+            self.headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            self.headers["content-length"] = str(length)
+
+    @staticmethod
+    def _if_range_ok(if_range: Optional[str], etag: str, stat_result: os.stat_result) -> bool:
+        """If-Range: con ETag se exige coincidencia fuerte; con fecha, que no haya cambiado"""
+        if not if_range:
+            return True
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            return if_range == etag
+        try:
+            return int(parsedate_to_datetime(if_range).timestamp()) >= int(stat_result.st_mtime)
+        except (TypeError, ValueError):
+            return False
+
+    def _part_header(self, start: int, end: int, size: int) -> bytes:
+        return (
+            f"\r\n--{self.boundary}\r\n"
+            f"Content-Type: {self.media_type}\r\n"
+            f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n"
+        ).encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+
+        if self.send_header_only or not self.ranges:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        else:
+            zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+            if zero_copy:
+                await self._send_zero_copy(send)
+            else:
+                await self._send_chunks(send)
+
+        if self.background is not None:
+            await self.background()
+
+    async def _send_chunks(self, send: Send):
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            for index, (start, end) in enumerate(self.ranges):
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._part_headers[index], "more_body": True})
+                await file.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        closing = self._closing if self.boundary else b""
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    async def _send_zero_copy(self, send: Send):
+        """El servidor ASGI copia del archivo al socket con sendfile, sin pasar por Python"""
+        with open(self.path, "rb") as file:
+            for index, (start, end) in enumerate(self.ranges):
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self._part_headers[index], "more_body": True})
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.fileno(),
+                    "offset": start,
+                    "count": end - start,
+                    "more_body": True,
+                })
+        closing = self._closing if self.boundary else b""
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
@@ -0,0 +1,231 @@
+"""
+Metadata persistente de los archivos descargados
+
+Reemplaza el dict file_metadata en memoria: file_id -> título, nombre de
+archivo, tipo, tamaño, fecha de creación, último acceso, video_id de origen,
+el manifest de los stems generados ({stem: {path, bytes, mtime_ns, crc32}}),
+el hash del contenido del audio (clave de la caché de stems) y la calidad
+de descarga (las filas con video_id y quality son la caché de artefactos). Vive en
+SQLite (WAL), así sobrevive a los reinicios y la comparten todos los
+workers. Las escrituras se acumulan y se escriben por lotes en una sola
+transacción; las lecturas ven también lo pendiente.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import config
+
+# Columnas de la tabla files (file_id es la clave primaria)
+FIELDS = (
+    "title", "filename", "type", "size", "path", "video_id", "stems", "content_hash",
+    "quality", "created", "last_access",
+)
+# Columnas agregadas después de la primera versión (se añaden a bases existentes)
+MIGRATIONS = {"content_hash": "TEXT", "quality": "TEXT"}
+
+
+class FileMetadataStore:
+    def __init__(self, path: Path, flush_interval: float = 0.5, batch_size: int = 100):
+        """
+        Args:
+            path: Archivo de la base de datos
+            flush_interval: Segundos máximos que una escritura espera en el lote
+            batch_size: Escrituras pendientes que fuerzan un flush inmediato
+        """
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pending: Dict[str, Dict] = {}  # {file_id: campos a escribir}
+        self._flush_task: Optional[asyncio.Task] = None
+
+        # Estadísticas
+        self.writes = 0
+        self.flushes = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                " file_id TEXT PRIMARY KEY, title TEXT, filename TEXT, type TEXT,"
+                " size INTEGER, path TEXT, video_id TEXT, stems TEXT, content_hash TEXT,"
+                " quality TEXT, created REAL, last_access REAL)"
+            )
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(files)")}
+            for column, column_type in MIGRATIONS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE files ADD COLUMN {column} {column_type}")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_video_id ON files (video_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _parse_stems(raw: Optional[str]) -> Dict:
+        stems = json.loads(raw) if raw else {}
+        # Versiones anteriores guardaban solo la lista de nombres
+        if isinstance(stems, list):
+            stems = {name: {} for name in stems}
+        return stems
+
+    @classmethod
+    def _row_to_dict(cls, row: sqlite3.Row) -> Dict:
+        entry = dict(row)
+        entry["stems"] = cls._parse_stems(entry.get("stems"))
+        return entry
+
+    # --- Escritura (por lotes) ---
+
+    def put(self, file_id: str, **fields):
+        """Crea o actualiza un archivo; solo se modifican los campos indicados"""
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown file metadata fields: {', '.join(sorted(unknown))}")
+
+        now = time.time()
+        if "stems" in fields:
+            fields["stems"] = json.dumps(fields["stems"] or {})
+        fields.setdefault("last_access", now)
+
+        with self._lock:
+            pending = self._pending.setdefault(file_id, {"created": now})
+            pending.update(fields)
+            self.writes += 1
+            flush_now = len(self._pending) >= self.batch_size
+
+        if flush_now:
+            self.flush()
+
+    def touch(self, file_id: str):
+        """Marca el archivo como usado (para expulsión LRU)"""
+        self.put(file_id, last_access=time.time())
+
+    def flush(self):
+        """Escribe todas las escrituras pendientes en una sola transacción"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for file_id, fields in pending.items():
+                    created = fields.pop("created")
+                    columns = list(fields)
+                    # created solo se escribe al insertar; el resto se actualiza
+                    conn.execute(
+                        f"INSERT INTO files (file_id, created, {', '.join(columns)})"
+                        f" VALUES (?, ?, {', '.join('?' for _ in columns)})"
+                        f" ON CONFLICT (file_id) DO UPDATE SET"
+                        f" {', '.join(f'{c} = excluded.{c}' for c in columns)}",
+                        (file_id, created, *fields.values())
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self.flushes += 1
+
+    def delete(self, file_ids: Iterable[str]):
+        file_ids = list(file_ids)
+        if not file_ids:
+            return
+        with self._lock:
+            for file_id in file_ids:
+                self._pending.pop(file_id, None)
+            conn = self._connect()
+            conn.executemany("DELETE FROM files WHERE file_id = ?", ((f,) for f in file_ids))
+
+    # --- Lectura ---
+
+    def get(self, file_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            pending = dict(self._pending.get(file_id, {}))
+
+        if row is None and not pending:
+            return None
+        entry = self._row_to_dict(row) if row is not None else {"file_id": file_id, "stems": {}}
+        if pending:
+            if row is not None:
+                pending.pop("created", None)
+            if "stems" in pending:
+                pending["stems"] = self._parse_stems(pending["stems"])
+            entry.update(pending)
+        return entry
+
+    def _query(self, sql: str, params: tuple) -> List[Dict]:
+        # Las consultas por índice solo ven lo ya escrito
+        self.flush()
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def by_video_id(self, video_id: str) -> List[Dict]:
+        """Archivos descargados de un video (más recientes primero)"""
+        return self._query("SELECT * FROM files WHERE video_id = ? ORDER BY created DESC", (video_id,))
+
+    def least_recently_used(self, limit: int = 1000, after: float = 0.0, after_id: str = "") -> List[Dict]:
+        """
+        Archivos ordenados por último acceso (menos usados primero). Para la
+        página siguiente se pasa (last_access, file_id) de la última fila, así
+        no se saltan filas con el mismo last_access.
+        """
+        return self._query(
+            "SELECT * FROM files WHERE (last_access, file_id) > (?, ?)"
+            " ORDER BY last_access, file_id LIMIT ?", (after, after_id, limit)
+        )
+
+    # --- Ciclo de vida ---
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ File metadata flush failed: {e}")
+
+    def start(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            files, total_bytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files"
+            ).fetchone()
+            pending = len(self._pending)
+        return {
+            "files": files,
+            "bytes": total_bytes,
+            "pending_writes": pending,
+            "writes": self.writes,
+            "flushes": self.flushes,
+        }
+
+
+# Instancia global
+file_store = FileMetadataStore(
+    path=config.METADATA_DB,
+    flush_interval=config.METADATA_FLUSH_INTERVAL,
+    batch_size=config.METADATA_BATCH_SIZE
+)
@@ -0,0 +1,227 @@
+"""
+Hedging entre backends de descarga (Cobalt / yt-dlp)
+
+Si el backend primario no entrega su primer byte dentro del percentil
+configurado (p90 por defecto) de las latencias observadas, se arranca el
+secundario en paralelo, se queda el que termine primero y se cancela el
+otro (limpiando sus archivos parciales). Sin hedge, el secundario sigue
+funcionando como fallback cuando el primario falla.
+
+Las latencias incluyen las carreras que el primario perdió o falló sin
+entregar su primer byte: se registran censuradas en la duración de la
+carrera (solo contar a los ganadores subestima el percentil).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+
+PRIMARY = "primary"
+SECONDARY = "secondary"
+
+
+class HedgeError(Exception):
+    """Fallaron todos los backends; errors = {nombre: excepción}"""
+
+    def __init__(self, errors: Dict[str, BaseException]):
+        self.errors = errors
+        super().__init__(" | ".join(f"{name}: {error}" for name, error in errors.items()))
+
+
+class HedgeContext:
+    """Se pasa a cada backend: señal de primer byte y bandera de cancelación (thread-safe)"""
+
+    def __init__(self, on_first_byte: Optional[Callable[[], None]] = None):
+        self.cancelled = threading.Event()
+        self._on_first_byte = on_first_byte
+        self._first_byte_seen = False
+
+    def first_byte(self):
+        if not self._first_byte_seen:
+            self._first_byte_seen = True
+            if self._on_first_byte:
+                self._on_first_byte()
+
+
+class Hedger:
+    def __init__(
+        self,
+        enabled: bool = False,
+        percentile: float = 0.9,
+        default_delay: float = 8.0,
+        min_delay: float = 2.0,
+        max_delay: float = 30.0,
+        max_ratio: float = 0.25,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        """
+        Args:
+            enabled: Activa el hedging (si no, el secundario es solo fallback)
+            percentile: Percentil de latencia de primer byte que dispara el hedge
+            default_delay: Retardo usado hasta tener min_samples muestras
+            min_delay / max_delay: Límites del retardo aprendido
+            max_ratio: Fracción máxima de peticiones que pueden hacer hedge
+            window: Muestras de latencia que se conservan
+        """
+        self.enabled = enabled
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=window)
+
+        # Estadísticas
+        self.requests = 0
+        self.hedged = 0
+        self.wins = {PRIMARY: 0, SECONDARY: 0}
+        self.fallbacks = 0
+        self.censored = 0
+
+    def current_delay(self) -> float:
+        """Percentil de la latencia de primer byte del primario (acotado)"""
+        if len(self.samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile))
+        return min(self.max_delay, max(self.min_delay, ordered[index]))
+
+    def _within_budget(self) -> bool:
+        return self.hedged < self.max_ratio * self.requests
+
+    async def race(
+        self,
+        primary: Callable[[HedgeContext], Awaitable[Any]],
+        secondary: Callable[[HedgeContext], Awaitable[Any]],
+        cleanup_primary: Callable[[], None],
+        cleanup_secondary: Callable[[], None],
+    ) -> Tuple[Any, str]:
+        """
+        Ejecuta primary y, según el caso, secondary en hedge o como fallback.
+
+        Returns:
+            (resultado, PRIMARY | SECONDARY)
+        """
+        self.requests += 1
+        start = time.monotonic()
+        first_byte = asyncio.Event()
+
+        def on_first_byte():
+            self.samples.append(time.monotonic() - start)
+            first_byte.set()
+
+        contexts = {PRIMARY: HedgeContext(on_first_byte), SECONDARY: HedgeContext()}
+
+        def censor_primary():
+            """El primario terminó la carrera sin primer byte: su latencia es al menos la duración"""
+            if not contexts[PRIMARY]._first_byte_seen:
+                contexts[PRIMARY]._first_byte_seen = True  # Ignorar un aviso tardío
+                self.samples.append(time.monotonic() - start)
+                self.censored += 1
+
+        factories = {PRIMARY: primary, SECONDARY: secondary}
+        cleanups = {PRIMARY: cleanup_primary, SECONDARY: cleanup_secondary}
+        tasks: Dict[asyncio.Task, str] = {}
+
+        def launch(name: str) -> asyncio.Task:
+            task = asyncio.create_task(factories[name](contexts[name]))
+            tasks[task] = name
+            return task
+
+        primary_task = launch(PRIMARY)
+        pending = {primary_task}
+
+        try:
+            if self.enabled:
+                delay = self.current_delay()
+                first_byte_task = asyncio.create_task(first_byte.wait())
+                done, _ = await asyncio.wait(
+                    {primary_task, first_byte_task},
+                    timeout=delay,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                first_byte_task.cancel()
+                if not done and self._within_budget():
+                    self.hedged += 1
+                    print(f"🏁 Hedge: primary sin primer byte tras {delay:.1f}s, arrancando secundario")
+                    pending.add(launch(SECONDARY))
+
+            errors: Dict[str, BaseException] = {}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if t.exception() is None), None)
+
+                if winner is not None:
+                    for task in (done | pending) - {winner}:
+                        self._abandon(task, contexts[tasks[task]], cleanups[tasks[task]])
+                    name = tasks[winner]
+                    self.wins[name] += 1
+                    censor_primary()
+                    return winner.result(), name
+
+                for task in done:
+                    errors[tasks[task]] = task.exception()
+
+                # Primario falló sin hedge: el secundario actúa como fallback
+                if not pending and SECONDARY not in tasks.values():
+                    self.fallbacks += 1
+                    pending.add(launch(SECONDARY))
+        except asyncio.CancelledError:
+            for task, name in tasks.items():
+                if not task.done():
+                    self._abandon(task, contexts[name], cleanups[name])
+            raise
+
+        censor_primary()
+        raise HedgeError(errors)
+
+    @staticmethod
+    def _abandon(task: asyncio.Task, context: HedgeContext, cleanup: Callable[[], None]):
+        """Cancela el backend perdedor y limpia sus archivos cuando termine"""
+        context.cancelled.set()
+
+        def _cleanup(t: asyncio.Task):
+            if not t.cancelled():
+                t.exception()  # Marcar como recuperada
+            try:
+                cleanup()
+            except Exception as e:
+                print(f"⚠️ Hedge cleanup failed: {e}")
+
+        if task.done():
+            _cleanup(task)
+        else:
+            task.cancel()
+            task.add_done_callback(_cleanup)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "delay_s": round(self.current_delay(), 2),
+            "percentile": self.percentile,
+            "samples": len(self.samples),
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_ratio": round(self.hedged / self.requests, 3) if self.requests else 0.0,
+            "max_ratio": self.max_ratio,
+            "wins": dict(self.wins),
+            "fallbacks": self.fallbacks,
+            "censored_samples": self.censored,
+        }
+
+
+# Instancia global para descargas (primario = Cobalt, secundario = yt-dlp)
+download_hedger = Hedger(
+    enabled=config.HEDGE_ENABLED,
+    percentile=config.HEDGE_PERCENTILE,
+    default_delay=config.HEDGE_DEFAULT_DELAY,
+    min_delay=config.HEDGE_MIN_DELAY,
+    max_delay=config.HEDGE_MAX_DELAY,
+    max_ratio=config.HEDGE_MAX_RATIO
+)
@@ -0,0 +1,185 @@
+"""
+Clientes HTTP compartidos para todas las integraciones externas
+
+En vez de crear un httpx.AsyncClient por llamada (y pagar un handshake
+TCP+TLS cada vez), cada integración usa un cliente persistente con
+keep-alive, límite de conexiones por host y HTTP/2 opcional. Los clientes
+se crean al arrancar la app y se cierran al apagarla.
+"""
+
+import asyncio
+import threading
+from typing import Dict
+
+import httpx
+
+import config
+
+# Perfiles de cliente por integración
+CLIENT_PROFILES = {
+    # oEmbed, keep-alive y llamadas pequeñas
+    "default": {"timeout": 30.0, "follow_redirects": False},
+    # API de las instancias de Cobalt
+    "cobalt": {"timeout": 60.0, "follow_redirects": False},
+    # API de Replicate
+    "replicate": {"timeout": 60.0, "follow_redirects": False},
+    # Transferencias de archivos (túneles de Cobalt, stems de Replicate)
+    "downloads": {"timeout": 300.0, "follow_redirects": True},
+}
+
+
+class _HostLimitedStream(httpx.AsyncByteStream):
+    """Libera el cupo del host cuando se termina de leer la respuesta"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class MeteredTransport(httpx.AsyncHTTPTransport):
+    """Transporte con límite de conexiones por host y métricas del pool"""
+
+    def __init__(self, max_per_host: int, **kwargs):
+        super().__init__(**kwargs)
+        self.max_per_host = max_per_host
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+
+        # Estadísticas
+        self.requests = 0
+        self.connections_created = 0
+        self.waiting = 0  # Peticiones esperando cupo en su host
+        self.in_flight = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        slots = self._host_slots.get(host)
+        if slots is None:
+            slots = self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.in_flight -= 1
+                slots.release()
+
+        async def trace(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                self.connections_created += 1
+
+        request.extensions = {**request.extensions, "trace": trace}
+        self.requests += 1
+        self.in_flight += 1
+
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+
+        response.stream = _HostLimitedStream(response.stream, release)
+        return response
+
+    def stats(self) -> Dict:
+        connections = self._pool.connections
+        idle = sum(1 for c in connections if c.is_idle())
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "connections_open": len(connections),
+            "connections_idle": idle,
+            "connections_created": self.connections_created,
+            "connections_reused": max(0, self.requests - self.connections_created),
+        }
+
+
+class HttpClientRegistry:
+    def __init__(self):
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.transports: Dict[str, MeteredTransport] = {}
+        self.http2 = config.HTTP2_ENABLED and self._h2_available()
+        # Crear un contexto SSL cuesta ~40 ms de CPU: uno solo para todos los clientes
+        self._ssl_context = None
+        self._lock = threading.Lock()  # start() puede correr en un thread de arranque
+
+    @staticmethod
+    def _h2_available() -> bool:
+        try:
+            import h2  # noqa: F401
+            return True
+        except ImportError:
+            print("⚠️ HTTP/2 requested but 'h2' is not installed, using HTTP/1.1")
+            return False
+
+    def _create(self, name: str) -> httpx.AsyncClient:
+        profile = CLIENT_PROFILES.get(name, CLIENT_PROFILES["default"])
+        if self._ssl_context is None:
+            self._ssl_context = httpx.create_ssl_context()
+        transport = MeteredTransport(
+            max_per_host=config.HTTP_MAX_CONNECTIONS_PER_HOST,
+            verify=self._ssl_context,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=config.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=config.HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+        self.transports[name] = transport
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=profile["timeout"],
+            follow_redirects=profile["follow_redirects"],
+        )
+
+    def start(self):
+        """
+        Crea los clientes de todos los perfiles. Se llama en segundo plano al
+        arrancar (main.preload_modules); get() crea el que falte si se pide antes.
+        """
+        for name in CLIENT_PROFILES:
+            self.get(name)
+        print(f"✅ HTTP clients ready ({', '.join(self.clients)}; http2={self.http2})")
+
+    def get(self, name: str = "default") -> httpx.AsyncClient:
+        """Cliente compartido del perfil `name` (se crea si no existe)"""
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self.clients.get(name)
+                if client is None or client.is_closed:
+                    client = self.clients[name] = self._create(name)
+        return client
+
+    async def close(self):
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+        self.transports.clear()
+        print("🛑 HTTP clients closed")
+
+    def stats(self) -> Dict:
+        return {name: transport.stats() for name, transport in self.transports.items()}
+
+
+# Instancia global
+http_clients = HttpClientRegistry()
@@ -0,0 +1,248 @@
+"""
+Sistema de jobs asíncronos para descargas largas
+
+Un POST crea el job y responde de inmediato con su id; un pool de workers
+ejecuta la descarga y el cliente sigue el progreso por Server-Sent Events
+en /api/jobs/{id}/events. Los endpoints síncronos de siempre simplemente
+crean un job y esperan a que termine.
+
+Un runner que solo tiene que esperar a otro (p. ej. la misma descarga ya en
+curso en otro job) devuelve Detached: el worker queda libre y el job
+termina en segundo plano cuando termina esa espera.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import config
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Mínimo intervalo entre eventos de progreso (los hooks de yt-dlp son muy frecuentes)
+PROGRESS_MIN_INTERVAL = 0.5
+
+
+class Detached:
+    """Resultado de un runner que suelta el worker: el job termina con el resultado de awaitable"""
+
+    def __init__(self, awaitable: Awaitable[Dict]):
+        self.awaitable = awaitable
+
+
+class Job:
+    def __init__(self, kind: str, params: Optional[Dict] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.params = params or {}
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self._last_progress = (None, 0.0, -1)  # (stage, timestamp, percent)
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JOB_COMPLETED, JOB_FAILED)
+
+    def publish(self, event_type: str, **data):
+        """Agrega un evento al historial y despierta a los suscriptores"""
+        event = {"event": event_type, "seq": len(self.events), "ts": time.time(), **data}
+        self.events.append(event)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish_threadsafe(self, event_type: str, **data):
+        """Versión de publish() que se puede llamar desde threads del executor"""
+        self._loop.call_soon_threadsafe(lambda: self.publish(event_type, **data))
+
+    def progress(self, stage: str, downloaded: Optional[int] = None, total: Optional[int] = None, **data):
+        """Publica progreso limitando la frecuencia de eventos"""
+        percent = None
+        if downloaded is not None and total:
+            percent = min(100, int(downloaded * 100 / total))
+
+        last_stage, last_ts, last_percent = self._last_progress
+        now = time.monotonic()
+        if (
+            stage == last_stage
+            and now - last_ts < PROGRESS_MIN_INTERVAL
+            and (percent is None or percent == last_percent)
+        ):
+            return
+        self._last_progress = (stage, now, percent if percent is not None else -1)
+
+        self.publish("progress", stage=stage, downloaded=downloaded, total=total, percent=percent, **data)
+
+    def progress_threadsafe(self, stage: str, downloaded: Optional[int] = None, total: Optional[int] = None, **data):
+        """Versión de progress() que se puede llamar desde threads del executor"""
+        self._loop.call_soon_threadsafe(lambda: self.progress(stage, downloaded, total, **data))
+
+    async def wait(self):
+        """Espera a que el job termine"""
+        while not self.done:
+            await self._changed.wait()
+
+    async def subscribe(self, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Dict]]:
+        """
+        Itera los eventos del job (historial + nuevos) hasta que termina.
+        Con heartbeat, emite None cada `heartbeat` segundos sin eventos.
+        """
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                return
+            changed = self._changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+            "last_event": self.events[-1] if self.events else None,
+        }
+
+
+class JobManager:
+    def __init__(self, workers: int = 4, history_limit: int = 500):
+        """
+        Args:
+            workers: Jobs ejecutándose a la vez
+            history_limit: Jobs terminados que se conservan para consulta
+        """
+        self.workers = workers
+        self.history_limit = history_limit
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._detached_tasks = set()
+        self.detached = 0
+
+    def start(self):
+        """Arranca los workers (idempotente)"""
+        if self._worker_tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+        print(f"✅ Job workers started ({self.workers})")
+
+    async def stop(self):
+        tasks = self._worker_tasks + list(self._detached_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._queue = None
+
+    def submit(self, kind: str, runner: Callable[[Job], Awaitable[Dict]], params: Optional[Dict] = None) -> Job:
+        """Crea un job y lo encola; runner(job) devuelve el resultado"""
+        self.start()
+        job = Job(kind, params)
+        self.jobs[job.id] = job
+        self._prune()
+        job.publish("queued", queue_position=self._queue.qsize() + 1)
+        self._queue.put_nowait((job, runner))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def active_jobs(self) -> List[Job]:
+        return [job for job in self.jobs.values() if not job.done]
+
+    def _prune(self):
+        """Elimina los jobs terminados más antiguos por encima del límite"""
+        excess = len(self.jobs) - self.history_limit
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self.jobs.values() if j.done][:excess]:
+            del self.jobs[job_id]
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job, runner = await self._queue.get()
+            job.status = JOB_RUNNING
+            job.started_at = time.time()
+            job.publish("started", worker=worker_id)
+            try:
+                await self._run(job, runner(job))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job, awaitable: Awaitable):
+        """Espera el resultado del job y publica cómo terminó"""
+        try:
+            result = await awaitable
+            if isinstance(result, Detached):
+                # El runner solo espera a otra operación: seguir fuera del pool de workers
+                self.detached += 1
+                job.publish("detached")
+                task = asyncio.create_task(self._run(job, result.awaitable))
+                self._detached_tasks.add(task)
+                task.add_done_callback(self._detached_tasks.discard)
+                return
+            job.result = result
+            job.status = JOB_COMPLETED
+            job.finished_at = time.time()
+            job.publish("completed", result=job.result)
+        except asyncio.CancelledError:
+            job.status = JOB_FAILED
+            job.error = "Job cancelado"
+            job.finished_at = time.time()
+            job.publish("failed", error=job.error)
+            raise
+        except Exception as e:
+            print(f"❌ Job {job.id} failed: {e}")
+            job.status = JOB_FAILED
+            job.error = str(e)
+            job.finished_at = time.time()
+            job.publish("failed", error=job.error)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "jobs": counts,
+            "detached_running": len(self._detached_tasks),
+            "detached_total": self.detached,
+        }
+
+
+def format_sse(event: Optional[Dict]) -> str:
+    """Formatea un evento como Server-Sent Event (None = comentario de heartbeat)"""
+    if event is None:
+        return ": ping\n\n"
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+
+# Instancia global
+job_manager = JobManager(workers=config.JOB_WORKERS, history_limit=config.JOB_HISTORY_LIMIT)
@@ -1,22 +1,44 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import yt_dlp
 import os
 import uuid
 from pathlib import Path
 import asyncio
-from typing import Optional
+import time
+import threading
+from typing import List, Optional, Union
+from urllib.parse import quote
 import json
 import re
 from datetime import datetime
-import httpx
 import config
+from http_clients import http_clients
 from proxy_manager import proxy_manager
-from rate_limiter import rate_limiter, check_rate_limit, stems_rate_limiter, check_stems_rate_limit
+from cookie_manager import cookie_manager, readonly_cookiefile, CookieSet
+from rate_limiter import (
+    rate_limiter, check_rate_limit, acquire_rate_limit,
+    stems_rate_limiter, check_stems_rate_limit, acquire_stems_rate_limit
+)
 from cobalt_service import cobalt_service
 from replicate_service import replicate_service
+from download_stream import stream_to_file
+from file_responses import RangeFileResponse
+from tee_stream import tee_streams, TeeDownload, TeeStreamError, TEE_FAILED
+from blocking_executor import ytdlp_executor
+from jobs import Detached, Job, JOB_COMPLETED, job_manager, format_sse
+from batch_downloads import batch_manager
+from singleflight import download_flight, stems_flight, video_info_flight
+from artifact_cache import artifact_cache
+from file_store import file_store
+from disk_janitor import disk_janitor
+from stems_cache import stems_cache, hash_file
+from separation_backends import separation_backend, SeparationError
+from stem_bundle import build_manifest, manifest_is_current, stem_path
+from zip_stream import StoredZip, ZipWriter
+from video_info_cache import video_info_cache, CACHE_STALE
+from hedging import download_hedger, HedgeContext, HedgeError, PRIMARY, SECONDARY
 
 app = FastAPI(title="YouTube Music Downloader API")
 
@@ -46,18 +68,38 @@ async def keep_alive_ping():
     while True:
         await asyncio.sleep(KEEP_ALIVE_INTERVAL)
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                response = await client.get(f"{backend_url}/")
-                print(f"🏓 Keep-alive ping: {response.status_code}")
+            response = await http_clients.get("default").get(f"{backend_url}/", timeout=30)
+            print(f"🏓 Keep-alive ping: {response.status_code}")
         except Exception as e:
             print(f"⚠️ Keep-alive ping failed: {e}")
 
+def preload_modules():
+    """
+    Importa yt_dlp y crea los clientes HTTP (contexto SSL, httpcore) en un
+    thread después del arranque: /health responde sin esperarlos y la primera
+    descarga ya no paga ese costo
+    """
+    start = time.monotonic()
+    http_clients.start()
+    import yt_dlp  # noqa: F401
+    print(f"✅ Preload finished ({time.monotonic() - start:.2f}s)")
+
 @app.on_event("startup")
 async def start_keep_alive():
     """Inicia el task de keep-alive al arrancar el servidor"""
     global keep_alive_task
+    config.ensure_dirs()
+    cobalt_service.health.start()
+    rate_limiter.start_sweeper()
+    stems_rate_limiter.start_sweeper()
+    file_store.start()
+    disk_janitor.start()
+    separation_backend.start()
+    proxy_manager.start()
     keep_alive_task = asyncio.create_task(keep_alive_ping())
     print("✅ Keep-alive task started (ping every 10 minutes)")
+    job_manager.start()
+    asyncio.get_running_loop().run_in_executor(None, preload_modules)
 
 @app.on_event("shutdown")
 async def stop_keep_alive():
@@ -66,53 +108,67 @@ async def stop_keep_alive():
     if keep_alive_task:
         keep_alive_task.cancel()
         print("🛑 Keep-alive task stopped")
+    batch_manager.stop()
+    await job_manager.stop()
+    cobalt_service.health.stop()
+    rate_limiter.stop_sweeper()
+    stems_rate_limiter.stop_sweeper()
+    ytdlp_executor.shutdown()
+    disk_janitor.stop()
+    separation_backend.stop()
+    proxy_manager.stop()
+    file_store.stop()
+    await http_clients.close()
 
-# Store metadata for downloaded files
-file_metadata = {}
-
-def get_ytdlp_opts_with_cookies(base_opts: dict, use_proxy: bool = True) -> dict:
-    """Add cookies and proxy to yt-dlp options if configured"""
+def get_ytdlp_opts_with_cookies(
+    base_opts: dict,
+    use_proxy: bool = True,
+    cookies: Optional[CookieSet] = None,
+    proxy: Optional[str] = None
+) -> dict:
+    """
+    Add cookies and proxy to yt-dlp options if configured.
+    cookies: juego de cookies ya elegido (si no, el siguiente de la rotación)
+    proxy: proxy del pool ya elegido para el job (proxy_manager.acquire)
+    """
     opts = base_opts.copy()
     
-    # Solo usar proxy si está configurado explícitamente en config
-    # Los proxies públicos gratuitos no son confiables
+    # Un proxy fijo configurado tiene prioridad; si no, el del pool validado
+    # (los proxies públicos sin validar no son confiables)
     if use_proxy and config.PROXY_URL:
         opts['proxy'] = config.PROXY_URL
         print(f"🔄 Using configured proxy")
+    elif use_proxy and proxy:
+        opts['proxy'] = proxy
+        print(f"🔄 Using pool proxy: {proxy}")
     
-    # Check if cookies are in environment variable (for Render/production)
-    cookies_content = os.getenv('YOUTUBE_COOKIES')
-    if cookies_content:
-        try:
-            print(f"Found YOUTUBE_COOKIES environment variable (length: {len(cookies_content)} chars)")
-            # Write cookies to temporary file with proper Netscape format
-            temp_cookies_file = DOWNLOADS_DIR / 'temp_cookies.txt'
-            
-            # Write entire content (should already have Netscape header)
-            temp_cookies_file.write_text(cookies_content, encoding='utf-8')
-            opts['cookiefile'] = str(temp_cookies_file)
-            
-            # Count non-comment lines
-            cookie_lines = [line for line in cookies_content.split('\n') if line.strip() and not line.startswith('#')]
-            print(f"✅ Using cookies file with {len(cookie_lines)} cookie entries")
-            print(f"📁 Cookies written to: {temp_cookies_file}")
-        except Exception as e:
-            print(f"❌ Error processing cookies from environment: {e}")
-            import traceback
-            traceback.print_exc()
+    # YOUTUBE_COOKIES* (Render/producción) o archivos de cookies, ya validados
+    # y escritos una sola vez por cookie_manager
+    cookie_set = cookies or cookie_manager.acquire()
+    if cookie_set:
+        opts['cookiefile'] = cookie_set.path
+        print(f"🍪 Using cookies {cookie_set.name} ({cookie_set.cookies} entries)")
     # For local development: use browser cookies if configured
     elif config.YOUTUBE_COOKIES_BROWSER:
         opts['cookiesfrombrowser'] = (config.YOUTUBE_COOKIES_BROWSER,)
         print(f"🍪 Using cookies from browser: {config.YOUTUBE_COOKIES_BROWSER}")
-    # Or from file if it exists
-    elif config.YOUTUBE_COOKIES_FILE and Path(config.YOUTUBE_COOKIES_FILE).exists():
-        opts['cookiefile'] = config.YOUTUBE_COOKIES_FILE
-        print(f"🍪 Using cookies from file: {config.YOUTUBE_COOKIES_FILE}")
     else:
         print("⚠️ No cookies configured")
     
     return opts
 
+def extract_info_sync(url: str, ydl_opts: dict, download: bool = False) -> Optional[dict]:
+    """Llamada bloqueante a yt-dlp - ejecutar siempre vía ytdlp_executor"""
+    # yt_dlp se importa en el primer uso (o en preload_modules): cuesta ~0.2s al arrancar
+    import yt_dlp
+    if ydl_opts.get('cookiefile'):
+        # yt-dlp reescribe el cookiefile al cerrar: se le da una copia en memoria
+        ydl_opts = {**ydl_opts, 'cookiefile': readonly_cookiefile(ydl_opts['cookiefile'])}
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        info = ydl.extract_info(url, download=download)
+        # sanitize_info deja un dict serializable (necesario con executor de procesos)
+        return ydl.sanitize_info(info) if info else info
+
 def sanitize_filename(filename: str) -> str:
     """Clean filename to be safe for file systems"""
     # Remove invalid characters
@@ -126,6 +182,15 @@ def sanitize_filename(filename: str) -> str:
 class VideoURL(BaseModel):
     url: str
 
+class BatchRequest(BaseModel):
+    urls: List[str] = []
+    playlist_url: Optional[str] = None  # Se expande a sus videos (hasta BATCH_MAX_ITEMS)
+    type: str = "audio"  # audio o video
+
+class DownloadJobRequest(BaseModel):
+    url: str
+    type: str = "audio"  # audio o video
+
 class SeparateRequest(BaseModel):
     file_id: str
     two_stems: bool = True  # True = solo vocals/instrumental (rápido), False = 4 stems completos
@@ -151,6 +216,41 @@ async def health_check():
         "service": "youtube-steams-backend"
     }
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Métricas internas de los subsistemas del backend"""
+    return {
+        "executor": ytdlp_executor.stats(),
+        "rate_limits": {
+            "downloads": rate_limiter.stats(),
+            "stems": stems_rate_limiter.stats(),
+        },
+        "jobs": job_manager.stats(),
+        "batches": batch_manager.stats(),
+        "cookies": cookie_manager.stats(),
+        "proxies": proxy_manager.stats(),
+        "http_pools": http_clients.stats(),
+        "artifact_cache": artifact_cache.stats(),
+        "file_store": file_store.stats(),
+        "tee_streams": tee_streams.stats(),
+        "replicate": replicate_service.stats(),
+        "separation": separation_backend.stats(),
+        "disk_janitor": disk_janitor.stats(),
+        "stems_cache": stems_cache.stats(),
+        "video_info_cache": video_info_cache.stats(),
+        "hedging": download_hedger.stats(),
+        "single_flight": {
+            "downloads": download_flight.stats(),
+            "stems": stems_flight.stats(),
+            "video_info": video_info_flight.stats(),
+        },
+    }
+
+@app.get("/api/cobalt/instances")
+async def get_cobalt_instances():
+    """Estado de salud de las instancias de Cobalt, en el orden en que se intentan"""
+    return {"instances": cobalt_service.health.snapshot()}
+
 @app.get("/api/rate-limit-status")
 async def get_rate_limit_status(request: Request):
     """Obtiene el estado actual del límite de descargas para el usuario"""
@@ -185,9 +285,8 @@ async def test_youtube():
             **config.YTDLP_EXTRA_OPTS,
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(test_url, download=False)
-            
+        info = await ytdlp_executor.run(extract_info_sync, test_url, ydl_opts)
+
         return {
             "status": "success",
             "title": info.get('title'),
@@ -224,12 +323,17 @@ async def test_stems():
         audio_files = [f.name for f in DOWNLOADS_DIR.glob("*.mp3")]
     
     return {
+        "separation_backend": separation_backend.name,
+        "separation_backend_configured": separation_backend.is_configured(),
         "demucs_module_installed": demucs_module,
         "demucs_version": demucs_version,
         "demucs_executable": shutil.which("demucs"),
         "python_executable": sys.executable,
         "model_fast": config.DEMUCS_MODEL_FAST,
         "model_full": config.DEMUCS_MODEL_FULL,
+        "demucs_workers": config.DEMUCS_WORKERS,
+        "demucs_segment": config.DEMUCS_SEGMENT,
+        "demucs_jobs": config.DEMUCS_JOBS,
         "downloads_dir": str(DOWNLOADS_DIR),
         "stems_dir": str(STEMS_DIR),
         "audio_files_count": len(audio_files),
@@ -249,47 +353,100 @@ def extract_video_id(url: str) -> Optional[str]:
             return match.group(1)
     return None
 
+async def get_video_stats(video_id: str) -> dict:
+    """Duración y vistas con yt-dlp (también refresca solo view_count en la caché)"""
+    ydl_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        'noplaylist': True,
+        'skip_download': True,
+        'format': None,
+        'socket_timeout': 15,
+    }
+    info = await ytdlp_executor.run(
+        extract_info_sync, f"https://www.youtube.com/watch?v={video_id}", ydl_opts
+    )
+    if not info:
+        raise ValueError("yt-dlp returned no info")
+    duration = info.get('duration', 0) or 0
+    view_count = info.get('view_count', 0) or 0
+    print(f"📊 Metadata from yt-dlp: duration={duration}s, views={view_count}")
+    return {"duration": duration, "view_count": view_count}
+
 async def get_video_info_oembed(video_id: str) -> dict:
     """Obtiene info del video usando YouTube oEmbed API (no requiere auth)"""
     oembed_url = f"https://www.youtube.com/oembed?url=https://www.youtube.com/watch?v={video_id}&format=json"
     
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        response = await client.get(oembed_url)
-        response.raise_for_status()
-        data = response.json()
-        
-        # Obtener duración y vistas usando yt-dlp (extracción rápida sin descarga)
-        duration = 0
-        view_count = 0
-        try:
-            ydl_opts = {
-                'quiet': True,
-                'no_warnings': True,
-                'extract_flat': False,
-                'noplaylist': True,
-                'skip_download': True,
-                'format': None,
-                'socket_timeout': 15,
-            }
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
-                if info:
-                    duration = info.get('duration', 0) or 0
-                    view_count = info.get('view_count', 0) or 0
-                    print(f"📊 Metadata from yt-dlp: duration={duration}s, views={view_count}")
-        except Exception as e:
-            print(f"⚠️ Could not get duration/views from yt-dlp: {e}")
-        
-        return {
-            "id": video_id,
-            "title": data.get("title", "Unknown"),
-            "artist": data.get("author_name", "Unknown"),
-            "thumbnail": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-            "duration": duration,
-            "view_count": view_count,
-            "upload_date": None,
-            "description": "",
-        }
+    response = await http_clients.get("default").get(oembed_url, timeout=10.0)
+    response.raise_for_status()
+    data = response.json()
+    
+    # Obtener duración y vistas usando yt-dlp (extracción rápida sin descarga)
+    stats = {"duration": 0, "view_count": 0}
+    try:
+        stats = await get_video_stats(video_id)
+    except Exception as e:
+        print(f"⚠️ Could not get duration/views from yt-dlp: {e}")
+    
+    return {
+        "id": video_id,
+        "title": data.get("title", "Unknown"),
+        "artist": data.get("author_name", "Unknown"),
+        "thumbnail": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
+        "duration": stats["duration"],
+        "view_count": stats["view_count"],
+        "upload_date": None,
+        "description": "",
+    }
+
+async def fetch_video_info(video_id: str, video_url: str) -> dict:
+    """Obtiene la metadata del video: oEmbed primero, fallback a yt-dlp"""
+    # Intentar primero con oEmbed (no requiere auth)
+    try:
+        video_info = await get_video_info_oembed(video_id)
+        print(f"✅ Video info retrieved via oEmbed: {video_info['title']}")
+        return video_info
+    except Exception as oembed_error:
+        print(f"⚠️ oEmbed failed: {oembed_error}, trying yt-dlp...")
+
+    # Fallback a yt-dlp si oEmbed falla
+    base_opts = {
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': False,
+        'ignoreerrors': False,
+        'no_color': True,
+        'noplaylist': True,
+        'skip_download': True,
+        'format': None,
+        'nocheckcertificate': True,
+        'socket_timeout': 30,
+    }
+
+    cookie_set = cookie_manager.acquire()
+    proxy = proxy_manager.acquire()
+    ydl_opts = get_ytdlp_opts_with_cookies(base_opts, cookies=cookie_set, proxy=proxy)
+
+    with cookie_manager.track(cookie_set), proxy_manager.track(proxy):
+        info = await ytdlp_executor.run(extract_info_sync, video_url, ydl_opts)
+
+    if not info:
+        raise HTTPException(status_code=400, detail="No se pudo obtener información del video")
+
+    video_info = {
+        "id": info.get('id'),
+        "title": info.get('title'),
+        "artist": info.get('artist') or info.get('uploader') or info.get('channel'),
+        "thumbnail": info.get('thumbnail') or info.get('thumbnails', [{}])[0].get('url'),
+        "duration": info.get('duration', 0),
+        "view_count": info.get('view_count', 0),
+        "upload_date": info.get('upload_date'),
+        "description": (info.get('description') or '')[:200],
+    }
+
+    print(f"✅ Video info retrieved via yt-dlp: {video_info['title']}")
+    return video_info
 
 @app.post("/api/video-info")
 async def get_video_info(video: VideoURL):
@@ -301,51 +458,26 @@ async def get_video_info(video: VideoURL):
         video_id = extract_video_id(video.url)
         if not video_id:
             raise HTTPException(status_code=400, detail="URL de YouTube inválida")
-        
-        # Intentar primero con oEmbed (no requiere auth)
-        try:
-            video_info = await get_video_info_oembed(video_id)
-            print(f"✅ Video info retrieved via oEmbed: {video_info['title']}")
-            return video_info
-        except Exception as oembed_error:
-            print(f"⚠️ oEmbed failed: {oembed_error}, trying yt-dlp...")
-        
-        # Fallback a yt-dlp si oEmbed falla
-        base_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            'ignoreerrors': False,
-            'no_color': True,
-            'noplaylist': True,
-            'skip_download': True,
-            'format': None,
-            'nocheckcertificate': True,
-            'socket_timeout': 30,
-        }
-        
-        ydl_opts = get_ytdlp_opts_with_cookies(base_opts)
-        
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(video.url, download=False)
-            
-            if not info:
-                raise HTTPException(status_code=400, detail="No se pudo obtener información del video")
-            
-            video_info = {
-                "id": info.get('id'),
-                "title": info.get('title'),
-                "artist": info.get('artist') or info.get('uploader') or info.get('channel'),
-                "thumbnail": info.get('thumbnail') or info.get('thumbnails', [{}])[0].get('url'),
-                "duration": info.get('duration', 0),
-                "view_count": info.get('view_count', 0),
-                "upload_date": info.get('upload_date'),
-                "description": (info.get('description') or '')[:200],
-            }
-            
-            print(f"✅ Video info retrieved via yt-dlp: {video_info['title']}")
+
+        # Caché: una entrada vencida se sirve igual mientras se revalida en segundo plano
+        video_info, cache_state = video_info_cache.get(video_id)
+        if video_info is not None:
+            if cache_state == CACHE_STALE:
+                video_info_cache.revalidate(
+                    video_id,
+                    lambda: fetch_video_info(video_id, video.url),
+                    volatile_fetcher=lambda: get_video_stats(video_id)
+                )
             return video_info
-            
+
+        # Peticiones simultáneas del mismo video comparten la extracción
+        video_info, shared = await video_info_flight.do(
+            video_id, lambda: fetch_video_info(video_id, video.url)
+        )
+        if not shared:
+            video_info_cache.put(video_id, video_info)
+        return video_info
+
     except HTTPException:
         raise
     except Exception as e:
@@ -354,7 +486,7 @@ async def get_video_info(video: VideoURL):
         traceback.print_exc()
         raise HTTPException(status_code=400, detail=f"Error al obtener información del video: {str(e)}")
 
-async def download_audio_cobalt(video_url: str, file_id: str) -> tuple[Path, str]:
+async def download_audio_cobalt(video_url: str, file_id: str, on_progress=None, on_first_byte=None, tee=None) -> tuple[Path, str]:
     """Intenta descargar audio usando Cobalt API"""
     cobalt_response = await cobalt_service.get_download_url(
         url=video_url,
@@ -376,18 +508,27 @@ async def download_audio_cobalt(video_url: str, file_id: str) -> tuple[Path, str
     print(f"📥 Descargando desde Cobalt: {download_url[:60]}...")
     
     output_path = DOWNLOADS_DIR / f"{file_id}.mp3"
-    
-    async with httpx.AsyncClient(timeout=120.0, follow_redirects=True) as client:
-        response = await client.get(download_url)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-    
+
+    await stream_to_file(
+        download_url,
+        output_path,
+        timeout=120.0,
+        max_bytes=config.MAX_AUDIO_DOWNLOAD_BYTES,
+        on_progress=on_progress,
+        on_first_byte=on_first_byte,
+        tee=tee
+    )
+
     clean_title = sanitize_filename(filename.replace('.mp3', '').replace('.m4a', ''))
     return output_path, clean_title
 
-def download_audio_ytdlp(video_url: str, file_id: str) -> tuple[Path, str]:
+def download_audio_ytdlp(
+    video_url: str,
+    file_id: str,
+    hooks: Optional[dict] = None,
+    cookies: Optional[CookieSet] = None,
+    proxy: Optional[str] = None
+) -> tuple[Path, str]:
     """Fallback: descarga audio usando yt-dlp con cookies"""
     base_opts = {
         'format': 'ba/b',  # ba = best audio, b = best (fallback más simple)
@@ -402,76 +543,20 @@ def download_audio_ytdlp(video_url: str, file_id: str) -> tuple[Path, str]:
         'noplaylist': True,
         'nocheckcertificate': True,
         'socket_timeout': 60,
+        **(hooks or {}),
     }
     
-    ydl_opts = get_ytdlp_opts_with_cookies(base_opts)
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(video_url, download=True)
-    
+    ydl_opts = get_ytdlp_opts_with_cookies(base_opts, cookies=cookies, proxy=proxy)
+
+    info = extract_info_sync(video_url, ydl_opts, download=True)
+
     title = info.get('title', 'audio')
     clean_title = sanitize_filename(title)
     output_path = DOWNLOADS_DIR / f"{file_id}.mp3"
     
     return output_path, clean_title
 
-@app.post("/api/download")
-async def download_audio(video: VideoURL, request: Request, limit_status: dict = Depends(check_rate_limit)):
-    """Download audio from YouTube - intenta Cobalt primero, fallback a yt-dlp"""
-    try:
-        # Registrar la descarga
-        rate_limiter.record_download(request)
-        
-        file_id = str(uuid.uuid4())
-        clean_title = None
-        
-        print(f"🎵 Downloading audio: {video.url}")
-        
-        # Intentar primero con Cobalt
-        try:
-            output_path, clean_title = await download_audio_cobalt(video.url, file_id)
-            print(f"✅ Downloaded via Cobalt: {clean_title}")
-        except Exception as cobalt_error:
-            print(f"⚠️ Cobalt failed: {cobalt_error}")
-            print(f"🔄 Trying yt-dlp fallback...")
-            
-            # Fallback a yt-dlp
-            try:
-                output_path, clean_title = download_audio_ytdlp(video.url, file_id)
-                print(f"✅ Downloaded via yt-dlp: {clean_title}")
-            except Exception as ytdlp_error:
-                print(f"❌ yt-dlp also failed: {ytdlp_error}")
-                raise Exception(f"No se pudo descargar. Cobalt: {cobalt_error} | yt-dlp: {ytdlp_error}")
-        
-        if not clean_title:
-            clean_title = f"audio_{file_id[:8]}"
-        
-        # Store metadata
-        file_metadata[file_id] = {
-            'title': clean_title,
-            'filename': f"{clean_title}.mp3",
-            'type': 'audio'
-        }
-        
-        # Obtener estado actualizado del límite
-        updated_status = rate_limiter.get_status(request)
-            
-        return {
-            "file_id": file_id,
-            "filename": f"{clean_title}.mp3",
-            "message": "Download completed successfully",
-            "rate_limit": {
-                "remaining": updated_status["remaining"],
-                "total": updated_status["total"],
-                "reset_time": updated_status["reset_time"]
-            }
-        }
-        
-    except Exception as e:
-        print(f"❌ Error downloading: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error downloading audio: {str(e)}")
-
-async def download_video_cobalt(video_url: str, file_id: str) -> tuple[Path, str]:
+async def download_video_cobalt(video_url: str, file_id: str, on_progress=None, on_first_byte=None, tee=None) -> tuple[Path, str]:
     """Intenta descargar video usando Cobalt API"""
     cobalt_response = await cobalt_service.get_download_url(
         url=video_url,
@@ -492,18 +577,27 @@ async def download_video_cobalt(video_url: str, file_id: str) -> tuple[Path, str
     print(f"📥 Descargando video desde Cobalt: {download_url[:60]}...")
     
     output_path = DOWNLOADS_DIR / f"{file_id}.mp4"
-    
-    async with httpx.AsyncClient(timeout=300.0, follow_redirects=True) as client:
-        response = await client.get(download_url)
-        response.raise_for_status()
-        
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
-    
+
+    await stream_to_file(
+        download_url,
+        output_path,
+        timeout=300.0,
+        max_bytes=config.MAX_VIDEO_DOWNLOAD_BYTES,
+        on_progress=on_progress,
+        on_first_byte=on_first_byte,
+        tee=tee
+    )
+
     clean_title = sanitize_filename(filename.replace('.mp4', '').replace('.webm', ''))
     return output_path, clean_title
 
-def download_video_ytdlp(video_url: str, file_id: str) -> tuple[Path, str]:
+def download_video_ytdlp(
+    video_url: str,
+    file_id: str,
+    hooks: Optional[dict] = None,
+    cookies: Optional[CookieSet] = None,
+    proxy: Optional[str] = None
+) -> tuple[Path, str]:
     """Fallback: descarga video usando yt-dlp con cookies"""
     base_opts = {
         'format': 'bv+ba/b',  # bv = best video, ba = best audio, b = best
@@ -514,78 +608,614 @@ def download_video_ytdlp(video_url: str, file_id: str) -> tuple[Path, str]:
         'merge_output_format': 'mp4',
         'nocheckcertificate': True,
         'socket_timeout': 60,
+        **(hooks or {}),
     }
     
-    ydl_opts = get_ytdlp_opts_with_cookies(base_opts)
-    
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(video_url, download=True)
-    
+    ydl_opts = get_ytdlp_opts_with_cookies(base_opts, cookies=cookies, proxy=proxy)
+
+    info = extract_info_sync(video_url, ydl_opts, download=True)
+
     title = info.get('title', 'video')
     clean_title = sanitize_filename(title)
     output_path = DOWNLOADS_DIR / f"{file_id}.mp4"
     
     return output_path, clean_title
 
+# Calidad por tipo de descarga (parte de la clave de single-flight)
+DOWNLOAD_QUALITY = {"audio": "320", "video": "1080"}
+
+def make_ytdlp_hooks(job: Job, cancelled: Optional[threading.Event] = None) -> dict:
+    """
+    progress_hooks y postprocessor_hooks de yt-dlp que reportan al job (se llaman
+    desde el executor). Si `cancelled` se activa, el siguiente hook aborta la descarga.
+    """
+    def check_cancelled():
+        if cancelled is not None and cancelled.is_set():
+            import yt_dlp
+            raise yt_dlp.utils.DownloadCancelled("Descarga cancelada (hedge perdido)")
+
+    def on_download(d):
+        check_cancelled()
+        if d.get('status') in ('downloading', 'finished'):
+            total = d.get('total_bytes') or d.get('total_bytes_estimate')
+            job.progress_threadsafe("ytdlp_download", d.get('downloaded_bytes'), total)
+
+    def on_postprocess(d):
+        check_cancelled()
+        # Etapas de ffmpeg (ExtractAudio, Merger...) - pocas, se publican todas
+        job.publish_threadsafe("progress", stage="ffmpeg", postprocessor=d.get('postprocessor'), status=d.get('status'))
+
+    return {'progress_hooks': [on_download], 'postprocessor_hooks': [on_postprocess]}
+
+def remove_partial_files(working_id: str):
+    """Borra los archivos (completos o parciales) de un id de trabajo"""
+    for path in list(DOWNLOADS_DIR.glob(f"{working_id}.*")) + list(DOWNLOADS_DIR.glob(f".{working_id}.*")):
+        path.unlink(missing_ok=True)
+
+def run_ytdlp_cancellable(
+    ytdlp_download,
+    video_url: str,
+    working_id: str,
+    hooks: dict,
+    cancelled: threading.Event,
+    cookies: Optional[CookieSet] = None,
+    proxy: Optional[str] = None
+):
+    """
+    Ejecuta la descarga de yt-dlp en el thread del executor y limpia sus archivos
+    si falla o si se canceló mientras tanto (se limpia aquí porque el thread sigue
+    corriendo aunque se cancele la tarea asyncio)
+    """
+    try:
+        result = ytdlp_download(video_url, working_id, hooks, cookies, proxy)
+    except BaseException:
+        remove_partial_files(working_id)
+        raise
+    if cancelled.is_set():
+        import yt_dlp
+        remove_partial_files(working_id)
+        raise yt_dlp.utils.DownloadCancelled("Descarga cancelada (hedge perdido)")
+    return result
+
+async def download_media(job: Job, video_url: str, stream_key=None, file_id: Optional[str] = None) -> dict:
+    """
+    Cadena de descarga: Cobalt como primario y yt-dlp como fallback, o en
+    paralelo si Cobalt tarda más que el retardo de hedge (download_hedger).
+    Lo que escribe Cobalt se publica en tee_streams para servirlo mientras baja.
+    El llamador fija file_id en disk_janitor mientras dura la descarga.
+    """
+    is_audio = job.kind == "audio"
+    ext = "mp3" if is_audio else "mp4"
+    cobalt_download = download_audio_cobalt if is_audio else download_video_cobalt
+    ytdlp_download = download_audio_ytdlp if is_audio else download_video_ytdlp
+
+    file_id = file_id or str(uuid.uuid4())
+    # Cada backend escribe con su propio id de trabajo; el ganador se renombra a file_id
+    cobalt_id = f"{file_id}-cobalt"
+    ytdlp_id = f"{file_id}-ytdlp"
+
+    tee = tee_streams.open(file_id, job.kind, key=stream_key)
+    job.publish("stream", file_id=file_id)
+
+    async def cobalt_backend(ctx: HedgeContext):
+        job.progress("cobalt")
+        result = await cobalt_download(
+            video_url,
+            cobalt_id,
+            on_progress=lambda downloaded, total: job.progress("cobalt_download", downloaded, total),
+            on_first_byte=ctx.first_byte,
+            tee=tee
+        )
+        print(f"✅ Downloaded via Cobalt: {result[1]}")
+        return result
+
+    async def ytdlp_backend(ctx: HedgeContext):
+        print(f"🔄 Trying yt-dlp...")
+        job.progress("ytdlp")
+        # Cookies y proxy (fijo por job) se eligen aquí para registrar el resultado
+        # aunque yt-dlp corra en otro proceso
+        cookie_set = cookie_manager.acquire()
+        proxy = proxy_manager.acquire(job.id)
+        with cookie_manager.track(cookie_set), proxy_manager.track(proxy):
+            # Los hooks (y con ellos la cancelación) no se pueden enviar a un executor de procesos
+            if ytdlp_executor.supports_callbacks:
+                result = await ytdlp_executor.run(
+                    run_ytdlp_cancellable, ytdlp_download, video_url, ytdlp_id,
+                    make_ytdlp_hooks(job, ctx.cancelled), ctx.cancelled, cookie_set, proxy
+                )
+            else:
+                # El proceso sigue escribiendo aunque pierda el hedge: limpiar cuando termine de verdad
+                result = await ytdlp_executor.run(
+                    ytdlp_download, video_url, ytdlp_id, None, cookie_set, proxy,
+                    on_abandoned=lambda: remove_partial_files(ytdlp_id)
+                )
+        print(f"✅ Downloaded via yt-dlp: {result[1]}")
+        return result
+
+    def cleanup_cobalt():
+        tee.abort_attempt("Cobalt abandonado")
+        remove_partial_files(cobalt_id)
+
+    try:
+        (output_path, clean_title), backend = await download_hedger.race(
+            cobalt_backend,
+            ytdlp_backend,
+            cleanup_primary=cleanup_cobalt,
+            cleanup_secondary=lambda: remove_partial_files(ytdlp_id)
+        )
+        final_path = DOWNLOADS_DIR / f"{file_id}.{ext}"
+        os.replace(output_path, final_path)
+        tee.finish(final_path)
+    except HedgeError as e:
+        cobalt_error = e.errors.get(PRIMARY)
+        ytdlp_error = e.errors.get(SECONDARY)
+        print(f"❌ Cobalt and yt-dlp failed: {cobalt_error} | {ytdlp_error}")
+        tee.fail(f"Cobalt: {cobalt_error} | yt-dlp: {ytdlp_error}")
+        raise Exception(f"No se pudo descargar. Cobalt: {cobalt_error} | yt-dlp: {ytdlp_error}")
+    except BaseException as e:
+        tee.fail(str(e) or type(e).__name__)
+        raise
+    finally:
+        tee_streams.close(tee)
+        proxy_manager.release(job.id)
+
+    if not clean_title:
+        clean_title = f"{job.kind}_{file_id[:8]}"
+
+    # Store metadata
+    file_store.put(
+        file_id,
+        title=clean_title,
+        filename=f"{clean_title}.{ext}",
+        type=job.kind,
+        size=final_path.stat().st_size,
+        path=str(final_path),
+        video_id=extract_video_id(video_url)
+    )
+
+    return {
+        "file_id": file_id,
+        "filename": f"{clean_title}.{ext}",
+        "type": job.kind
+    }
+
+async def run_download_job(job: Job) -> Union[dict, Detached]:
+    """
+    Job de descarga - primero busca en la caché de artefactos; las descargas
+    idénticas en curso se comparten (single-flight) y el job que se suma
+    suelta su worker mientras espera
+    """
+    video_url = job.params["url"]
+    video_id = extract_video_id(video_url)
+    quality = DOWNLOAD_QUALITY[job.kind]
+
+    if video_id:
+        cached = artifact_cache.get(video_id, job.kind, quality)
+        if cached:
+            print(f"⚡ Artifact cache hit: {video_id}:{job.kind}:{quality} -> {cached['file_id']}")
+            job.progress("cache_hit")
+            return {
+                "file_id": cached['file_id'],
+                "filename": cached['filename'],
+                "type": job.kind
+            }
+
+    key = (video_id or video_url, job.kind, quality)
+
+    async def fetch() -> dict:
+        # Los archivos de trabajo y el resultado no se tocan hasta que quedan registrados
+        file_id = str(uuid.uuid4())
+        with disk_janitor.pin(file_id):
+            result = await download_media(job, video_url, stream_key=key, file_id=file_id)
+            if video_id:
+                artifact_cache.put(result["file_id"], quality)
+        return result
+
+    leader = download_flight.join(key)
+    if leader is not None:
+        job.progress("coalesced")
+        # Quien se suma a una descarga en curso también puede seguirla en streaming
+        tee = tee_streams.for_key(key)
+        if tee is not None:
+            job.publish("stream", file_id=tee.file_id)
+        # Esperar al líder no ocupa un worker del JobManager
+        return Detached(leader)
+
+    result, shared = await download_flight.do(key, fetch)
+    return result
+
+def rate_limit_info(request: Request) -> dict:
+    """Estado actualizado del límite de descargas para incluir en las respuestas"""
+    updated_status = rate_limiter.get_status(request)
+    return {
+        "remaining": updated_status["remaining"],
+        "total": updated_status["total"],
+        "reset_time": updated_status["reset_time"]
+    }
+
+@app.post("/api/download")
+async def download_audio(video: VideoURL, request: Request, limit_status: dict = Depends(check_rate_limit)):
+    """Download audio from YouTube - intenta Cobalt primero, fallback a yt-dlp"""
+    # Registrar la descarga (atómico entre workers)
+    await acquire_rate_limit(request)
+
+    print(f"🎵 Downloading audio: {video.url}")
+
+    job = job_manager.submit("audio", run_download_job, {"url": video.url})
+    await job.wait()
+
+    if job.status != JOB_COMPLETED:
+        print(f"❌ Error downloading: {job.error}")
+        raise HTTPException(status_code=400, detail=f"Error downloading audio: {job.error}")
+
+    return {
+        "file_id": job.result["file_id"],
+        "filename": job.result["filename"],
+        "job_id": job.id,
+        "message": "Download completed successfully",
+        "rate_limit": rate_limit_info(request)
+    }
+
 @app.post("/api/download-video")
 async def download_video(video: VideoURL, request: Request, limit_status: dict = Depends(check_rate_limit)):
     """Download video from YouTube - intenta Cobalt primero, fallback a yt-dlp"""
+    # Registrar la descarga (atómico entre workers)
+    await acquire_rate_limit(request)
+
+    print(f"🎬 Downloading video: {video.url}")
+
+    job = job_manager.submit("video", run_download_job, {"url": video.url})
+    await job.wait()
+
+    if job.status != JOB_COMPLETED:
+        print(f"❌ Error downloading video: {job.error}")
+        raise HTTPException(status_code=400, detail=f"Error downloading video: {job.error}")
+
+    return {
+        "file_id": job.result["file_id"],
+        "filename": job.result["filename"],
+        "job_id": job.id,
+        "message": "Video download completed successfully",
+        "rate_limit": rate_limit_info(request)
+    }
+
+@app.post("/api/jobs", status_code=202)
+async def create_download_job(job_request: DownloadJobRequest, request: Request, limit_status: dict = Depends(check_rate_limit)):
+    """Crea un job de descarga y responde de inmediato; el progreso se sigue en /api/jobs/{id}/events"""
+    if job_request.type not in ("audio", "video"):
+        raise HTTPException(status_code=400, detail="Tipo de descarga inválido (audio o video)")
+
+    # Registrar la descarga (atómico entre workers)
+    await acquire_rate_limit(request)
+
+    job = job_manager.submit(job_request.type, run_download_job, {"url": job_request.url})
+    print(f"🧾 Job {job.id} created ({job_request.type}): {job_request.url}")
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "events_url": f"/api/jobs/{job.id}/events",
+        "rate_limit": rate_limit_info(request)
+    }
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Estado actual de un job"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+@app.get("/api/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """Progreso del job en vivo (Server-Sent Events)"""
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event in job.subscribe(heartbeat=config.JOB_SSE_HEARTBEAT):
+            yield format_sse(event)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def expand_playlist(playlist_url: str) -> List[str]:
+    """URLs de los videos de una playlist (extracción plana: no resuelve cada video)"""
+    cookie_set = cookie_manager.acquire()
+    proxy = proxy_manager.acquire()
+    ydl_opts = get_ytdlp_opts_with_cookies({
+        'quiet': True,
+        'no_warnings': True,
+        'extract_flat': 'in_playlist',
+        'noplaylist': False,
+        'skip_download': True,
+        'playlistend': config.BATCH_MAX_ITEMS,
+        'socket_timeout': 30,
+    }, cookies=cookie_set, proxy=proxy)
+    with cookie_manager.track(cookie_set), proxy_manager.track(proxy):
+        info = await ytdlp_executor.run(extract_info_sync, playlist_url, ydl_opts)
+    if not info:
+        return []
+    if not info.get('entries'):
+        # No era una playlist: un solo video
+        return [info.get('webpage_url') or playlist_url]
+
+    urls = []
+    for entry in info['entries']:
+        if not entry:
+            continue
+        url = entry.get('url')
+        if not (url and url.startswith('http')) and entry.get('id'):
+            url = f"https://www.youtube.com/watch?v={entry['id']}"
+        if url:
+            urls.append(url)
+    return urls
+
+@app.post("/api/batch", status_code=202)
+async def create_batch(batch_request: BatchRequest, request: Request, limit_status: dict = Depends(check_rate_limit)):
+    """Descarga por lotes (lista de URLs y/o playlist); cada elemento cuenta como una descarga"""
+    if batch_request.type not in ("audio", "video"):
+        raise HTTPException(status_code=400, detail="Tipo de descarga inválido (audio o video)")
+
+    urls = [url.strip() for url in batch_request.urls if url.strip()]
+    if batch_request.playlist_url:
+        try:
+            urls += await expand_playlist(batch_request.playlist_url)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error reading playlist: {e}")
+    if not urls:
+        raise HTTPException(status_code=400, detail="No hay URLs para descargar")
+
+    # Un cargo atómico por elemento; los que no entran quedan como rate_limited
+    ip = rate_limiter.get_client_ip(request)
+    async def charge() -> bool:
+        return (await rate_limiter.acquire_key(ip))["allowed"]
+
+    batch = await batch_manager.create(batch_request.type, urls, charge=charge)
+    batch_manager.start(batch, run_download_job)
+    print(f"📦 Batch {batch.id} created ({batch_request.type}, {len(batch.items)} items)")
+
+    return {
+        **batch.to_dict(),
+        "status_url": f"/api/batch/{batch.id}",
+        "archive_url": f"/api/batch/{batch.id}/archive.zip",
+        "rate_limit": rate_limit_info(request)
+    }
+
+@app.get("/api/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Estado del lote y de cada elemento (con su job_id para seguir el progreso)"""
+    batch = batch_manager.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch.to_dict()
+
+@app.get("/api/batch/{batch_id}/archive.zip")
+async def download_batch_archive(batch_id: str):
+    """ZIP con los archivos del lote, enviado a medida que cada elemento termina"""
+    batch = batch_manager.get(batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    ext = "mp3" if batch.kind == "audio" else "mp4"
+
+    async def body():
+        writer = ZipWriter()
+        async for item in batch.completed_items():
+            file_id = item.result["file_id"]
+            path = DOWNLOADS_DIR / f"{file_id}.{ext}"
+            if not path.exists():
+                continue
+            arcname = writer.unique_name(sanitize_filename(item.result["filename"]) or f"{file_id}.{ext}")
+            with disk_janitor.pin(file_id):
+                async for chunk in writer.add_file(arcname, path):
+                    yield chunk
+            file_store.touch(file_id)
+        yield writer.finish()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="batch-{batch_id[:8]}.zip"'}
+    )
+
+@app.post("/api/replicate/webhook")
+async def replicate_webhook(request: Request):
+    """
+    Replicate avisa aquí cuando termina una predicción (resuelve la espera sin
+    polling). Sin REPLICATE_WEBHOOK_SECRET el aviso solo despierta la espera.
+    """
+    body = await request.body()
+    verified = replicate_service.verify_webhook(request.headers, body)
+    if replicate_service.webhook_secret and not verified:
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
     try:
-        # Registrar la descarga
-        rate_limiter.record_download(request)
-        
-        file_id = str(uuid.uuid4())
-        clean_title = None
-        
-        print(f"🎬 Downloading video: {video.url}")
-        
-        # Intentar primero con Cobalt
+        prediction = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    if not isinstance(prediction, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON")
+
+    resolved = replicate_service.handle_webhook(prediction, verified=verified)
+    print(f"🪝 Replicate webhook: {prediction.get('id')} {prediction.get('status')} "
+          f"(resolved={resolved}, verified={verified})")
+    return {"received": True, "resolved": resolved}
+
+STREAM_MEDIA_TYPES = {"audio": ("audio/mpeg", "mp3"), "video": ("video/mp4", "mp4")}
+
+async def tee_response(tee: TeeDownload, headers: dict) -> StreamingResponse:
+    """
+    Sirve una descarga en curso siguiendo el archivo mientras crece.
+    TeeStreamError si la descarga falla antes de tener algo que servir.
+    """
+    reader = await tee.open_reader()
+    kind = tee.kind
+    media_type, ext = STREAM_MEDIA_TYPES[kind]
+    headers = {
+        **headers,
+        "X-File-Id": tee.file_id,
+        "Content-Disposition": f'attachment; filename="{kind}_{tee.file_id}.{ext}"',
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    }
+    # Con tamaño conocido el cliente detecta una descarga cortada (es el
+    # total del intento que abrió el lector, no el de un intento posterior)
+    if reader.total:
+        headers["Content-Length"] = str(reader.total)
+
+    async def body():
         try:
-            output_path, clean_title = await download_video_cobalt(video.url, file_id)
-            print(f"✅ Video downloaded via Cobalt: {clean_title}")
-        except Exception as cobalt_error:
-            print(f"⚠️ Cobalt failed: {cobalt_error}")
-            print(f"🔄 Trying yt-dlp fallback...")
-            
-            # Fallback a yt-dlp
-            try:
-                output_path, clean_title = download_video_ytdlp(video.url, file_id)
-                print(f"✅ Video downloaded via yt-dlp: {clean_title}")
-            except Exception as ytdlp_error:
-                print(f"❌ yt-dlp also failed: {ytdlp_error}")
-                raise Exception(f"No se pudo descargar. Cobalt: {cobalt_error} | yt-dlp: {ytdlp_error}")
-        
-        if not clean_title:
-            clean_title = f"video_{file_id[:8]}"
-        
-        # Store metadata
-        file_metadata[file_id] = {
-            'title': clean_title,
-            'filename': f"{clean_title}.mp4",
-            'type': 'video'
-        }
-        
-        # Obtener estado actualizado del límite
-        updated_status = rate_limiter.get_status(request)
-            
-        return {
-            "file_id": file_id,
-            "filename": f"{clean_title}.mp4",
-            "message": "Video download completed successfully",
-            "rate_limit": {
-                "remaining": updated_status["remaining"],
-                "total": updated_status["total"],
-                "reset_time": updated_status["reset_time"]
+            with disk_janitor.pin(tee.file_id):
+                async for chunk in reader.iter_bytes():
+                    yield chunk
+        except TeeStreamError as e:
+            tee_streams.interrupted += 1
+            print(f"⚠️ Stream {tee.file_id} interrupted: {e}")
+            raise
+        finally:
+            reader.close()
+
+    tee_streams.streams += 1
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+@app.get("/api/stream")
+async def stream_download(url: str, request: Request, type: str = "audio", limit_status: dict = Depends(check_rate_limit)):
+    """
+    Descarga y envía el archivo al mismo tiempo: los bytes de Cobalt llegan al
+    cliente a medida que se escriben en disco. Si la descarga ya estaba en la
+    caché (o la ganó yt-dlp antes de empezar), se envía el archivo completo.
+    """
+    if type not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="Tipo de descarga inválido (audio o video)")
+
+    await acquire_rate_limit(request)
+    job = job_manager.submit(type, run_download_job, {"url": url})
+    print(f"📡 Streaming {type} (job {job.id}): {url}")
+
+    tee = None
+    async for event in job.subscribe():
+        if event and event["event"] == "stream":
+            tee = tee_streams.get(event["file_id"])
+            break
+
+    if tee is not None:
+        try:
+            return await tee_response(tee, {"X-Job-Id": job.id})
+        except TeeStreamError:
+            pass
+
+    # Sin stream disponible (caché, descarga ya terminada o fallida): esperar el resultado
+    await job.wait()
+    if job.status != JOB_COMPLETED:
+        raise HTTPException(status_code=400, detail=f"Error downloading {type}: {job.error}")
+
+    media_type, ext = STREAM_MEDIA_TYPES[type]
+    return RangeFileResponse(
+        DOWNLOADS_DIR / f"{job.result['file_id']}.{ext}",
+        request.headers,
+        media_type=media_type,
+        filename=job.result["filename"],
+        method=request.method
+    )
+
+@app.get("/api/stream-file/{file_id}")
+async def stream_file(file_id: str, request: Request):
+    """Se suma a una descarga en curso (o sirve el archivo si ya terminó)"""
+    tee = tee_streams.get(file_id)
+    if tee is not None and tee.state != TEE_FAILED:
+        try:
+            response = await tee_response(tee, {})
+            tee_streams.late_joins += 1
+            return response
+        except TeeStreamError:
+            pass
+
+    if (DOWNLOADS_DIR / f"{file_id}.mp3").exists():
+        return await download_file(file_id, request)
+    return await download_video_file(file_id, request)
+
+async def get_content_hash(file_id: str, path: Path) -> str:
+    """Hash del contenido del audio (se calcula una vez y se guarda en file_store)"""
+    metadata = file_store.get(file_id)
+    if metadata and metadata.get("content_hash"):
+        return metadata["content_hash"]
+    loop = asyncio.get_running_loop()
+    content_hash = await loop.run_in_executor(None, hash_file, path)
+    file_store.put(file_id, content_hash=content_hash)
+    return content_hash
+
+async def save_stem_manifest(file_id: str, names) -> dict:
+    """Guarda el manifest de stems (ruta, tamaño, CRC32) de file_id"""
+    previous = (file_store.get(file_id) or {}).get("stems") or {}
+    loop = asyncio.get_running_loop()
+    manifest = await loop.run_in_executor(None, build_manifest, file_id, list(names), previous)
+    file_store.put(file_id, stems=manifest)
+    return manifest
+
+async def get_stem_manifest(file_id: str) -> dict:
+    """Manifest de stems actualizado (se reconstruye si falta o no coincide con el disco)"""
+    manifest = (file_store.get(file_id) or {}).get("stems") or {}
+    if manifest_is_current(manifest):
+        return manifest
+    names = list(manifest) or [p.stem for p in sorted((STEMS_DIR / file_id).glob("*.mp3"))]
+    return await save_stem_manifest(file_id, names)
+
+async def cached_stems_response(file_id: str, cache_key: str, output_dir: Path) -> dict:
+    """Enlaza una separación cacheada en output_dir (sin Replicate ni cuota)"""
+    names = stems_cache.materialize(cache_key, output_dir)
+    await save_stem_manifest(file_id, names)
+    print(f"♻️ Stems from cache: {names}")
+    return {
+        "file_id": file_id,
+        "stems": [
+            {
+                "name": name,
+                "file_id": f"{file_id}/{name}.mp3",
+                "bytes": (output_dir / f"{name}.mp3").stat().st_size,
             }
-        }
-        
-    except Exception as e:
-        print(f"❌ Error downloading video: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Error downloading video: {str(e)}")
+            for name in names
+        ],
+        "failed_stems": [],
+        "cached": True,
+        "timings": {"separation_seconds": 0.0, "download_seconds": 0.0},
+        "message": "Stems separated successfully"
+    }
+
+async def run_stem_separation(
+    file_id: str,
+    two_stems: bool,
+    input_file: Path,
+    output_dir: Path,
+    cache_key: Optional[str] = None,
+    content_hash: Optional[str] = None
+) -> dict:
+    """Separa con el backend configurado y guarda el resultado en la caché"""
+    try:
+        separation = await separation_backend.separate(
+            file_id, input_file, two_stems, output_dir, content_hash=content_hash
+        )
+    except SeparationError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    # Solo separaciones completas: una parcial se repetiría igual de incompleta
+    if cache_key and not separation["failed_stems"]:
+        stems_cache.put(
+            cache_key,
+            output_dir,
+            [s["name"] for s in separation["stems"]],
+            separation_seconds=separation["separation_seconds"],
+            file_id=file_id,
+            two_stems=two_stems
+        )
+    return separation
 
 @app.post("/api/separate-stems")
 async def separate_stems(request: SeparateRequest, http_request: Request, limit_status: dict = Depends(check_stems_rate_limit)):
-    """Separate audio into stems using Replicate API (cloud GPU) - Limited to 3/day per user"""
+    """Separate audio into stems (Replicate cloud GPU or local Demucs) - Limited to 3/day per user"""
     print(f"\n{'='*60}")
     print(f"STEM SEPARATION REQUEST RECEIVED")
     print(f"{'='*60}")
@@ -603,63 +1233,53 @@ async def separate_stems(request: SeparateRequest, http_request: Request, limit_
         output_dir = STEMS_DIR / request.file_id
         output_dir.mkdir(exist_ok=True)
         
-        stems = []
         mode = "2 stems (vocals + instrumental)" if request.two_stems else "4 stems"
         print(f"🎵 Mode: {mode}")
+
+        # Mismo audio + modo + modelo ya separado: responder desde la caché
+        content_hash = await get_content_hash(request.file_id, input_file)
+        cache_key = stems_cache.make_key(content_hash, request.two_stems, separation_backend.model_id(request.two_stems))
+        if stems_cache.get(cache_key):
+            return await cached_stems_response(request.file_id, cache_key, output_dir)
         
-        # Verificar que Replicate está configurado
-        if not replicate_service.is_configured():
-            print("❌ Replicate API not configured")
+        # Verificar que el backend de separación está configurado
+        if not separation_backend.is_configured():
+            print(f"❌ Separation backend not configured: {separation_backend.name}")
             raise HTTPException(
                 status_code=503, 
                 detail="Separación de stems no disponible. El servicio no está configurado."
             )
         
         # Registrar uso de stems ANTES de procesar
-        stems_rate_limiter.record_download(http_request)
-        
-        print("☁️ Separando con Replicate API (Cloud GPU)...")
-        
-        # URL pública del archivo de audio
-        backend_url = os.getenv('BACKEND_URL', 'https://youtube-steams-backend.onrender.com')
-        audio_url = f"{backend_url}/api/download-file/{request.file_id}"
-        print(f"📎 Audio URL: {audio_url}")
-        
-        result = await replicate_service.separate_stems(
-            audio_url=audio_url,
-            two_stems=request.two_stems
-        )
+        await acquire_stems_rate_limit(http_request)
         
-        if not result:
-            raise HTTPException(
-                status_code=500,
-                detail="Error en la separación de stems. Intenta de nuevo."
+        # Separaciones idénticas en curso se comparten (single-flight)
+        # El janitor no puede borrar el audio mientras Replicate lo descarga
+        key = (request.file_id, request.two_stems)
+        with disk_janitor.pin(request.file_id):
+            separation, shared = await stems_flight.do(
+                key,
+                lambda: run_stem_separation(
+                    request.file_id, request.two_stems, input_file, output_dir, cache_key, content_hash
+                )
             )
-        
-        print(f"✅ Replicate returned: {result}")
-        
-        # Descargar los stems del resultado
-        for stem_name, stem_url in result.items():
-            if stem_url and isinstance(stem_url, str) and stem_url.startswith('http'):
-                stem_path = output_dir / f"{stem_name}.mp3"
-                if await replicate_service.download_stem(stem_url, stem_path):
-                    stems.append({
-                        "name": stem_name,
-                        "file_id": f"{request.file_id}/{stem_name}.mp3"
-                    })
-        
-        if not stems:
-            raise HTTPException(
-                status_code=500,
-                detail="No se pudieron descargar los stems generados."
-            )
-        
+
+        stems = separation["stems"]
         print(f"✅ Stems separados: {[s['name'] for s in stems]}")
+        if separation["failed_stems"]:
+            print(f"⚠️ Stems fallidos: {[s['name'] for s in separation['failed_stems']]}")
+        await save_stem_manifest(request.file_id, [s['name'] for s in stems])
         
         return {
             "file_id": request.file_id,
             "stems": stems,
-            "message": "Stems separated successfully"
+            "failed_stems": separation["failed_stems"],
+            "cached": False,
+            "timings": {
+                "separation_seconds": separation["separation_seconds"],
+                "download_seconds": separation["download_seconds"],
+            },
+            "message": "Stems separated successfully" if not separation["failed_stems"] else "Some stems could not be downloaded"
         }
         
     except HTTPException:
@@ -670,8 +1290,8 @@ async def separate_stems(request: SeparateRequest, http_request: Request, limit_
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error al separar stems: {str(e)}")
 
-@app.get("/api/download-file/{file_id}")
-async def download_file(file_id: str):
+@app.api_route("/api/download-file/{file_id}", methods=["GET", "HEAD"])
+async def download_file(file_id: str, request: Request):
     """Download the audio file"""
     file_path = DOWNLOADS_DIR / f"{file_id}.mp3"
     
@@ -679,16 +1299,20 @@ async def download_file(file_id: str):
         raise HTTPException(status_code=404, detail="File not found")
     
     # Get original filename from metadata
-    filename = file_metadata.get(file_id, {}).get('filename', f"audio_{file_id}.mp3")
+    metadata = file_store.get(file_id) or {}
+    filename = metadata.get('filename') or f"audio_{file_id}.mp3"
+    file_store.touch(file_id)
     
-    return FileResponse(
-        path=file_path,
+    return RangeFileResponse(
+        file_path,
+        request.headers,
         media_type="audio/mpeg",
-        filename=filename
+        filename=filename,
+        method=request.method
     )
 
-@app.get("/api/download-video-file/{file_id}")
-async def download_video_file(file_id: str):
+@app.api_route("/api/download-video-file/{file_id}", methods=["GET", "HEAD"])
+async def download_video_file(file_id: str, request: Request):
     """Download the video file"""
     file_path = DOWNLOADS_DIR / f"{file_id}.mp4"
     
@@ -696,42 +1320,66 @@ async def download_video_file(file_id: str):
         raise HTTPException(status_code=404, detail="Video file not found")
     
     # Get original filename from metadata
-    filename = file_metadata.get(file_id, {}).get('filename', f"video_{file_id}.mp4")
+    metadata = file_store.get(file_id) or {}
+    filename = metadata.get('filename') or f"video_{file_id}.mp4"
+    file_store.touch(file_id)
     
-    return FileResponse(
-        path=file_path,
+    return RangeFileResponse(
+        file_path,
+        request.headers,
         media_type="video/mp4",
-        filename=filename
+        filename=filename,
+        method=request.method
     )
 
-@app.get("/api/download-stem/{file_id}/{stem_name}")
-async def download_stem(file_id: str, stem_name: str):
+@app.api_route("/api/download-stem/{file_id}/{stem_name}", methods=["GET", "HEAD"])
+async def download_stem(file_id: str, stem_name: str, request: Request):
     """Download a specific stem"""
-    # Buscar en múltiples ubicaciones posibles
-    possible_paths = [
-        STEMS_DIR / config.DEMUCS_MODEL_FULL / file_id / f"{stem_name}.mp3",
-        STEMS_DIR / config.DEMUCS_MODEL_FAST / file_id / f"{stem_name}.mp3",
-        STEMS_DIR / "htdemucs_ft" / file_id / f"{stem_name}.mp3",
-        STEMS_DIR / "htdemucs" / file_id / f"{stem_name}.mp3",
-    ]
-    
-    stem_path = None
-    for path in possible_paths:
-        if path.exists():
-            stem_path = path
-            break
-    
-    if not stem_path:
+    # Ruta desde el manifest de stems (una búsqueda por clave)
+    metadata = file_store.get(file_id) or {}
+    path = stem_path(file_id, stem_name, metadata.get("stems") or {})
+    if not path.exists():
         raise HTTPException(status_code=404, detail="Stem file not found")
     
     # Get original title from metadata and create descriptive filename
-    original_title = file_metadata.get(file_id, {}).get('title', 'audio')
+    original_title = metadata.get('title') or 'audio'
     filename = f"{original_title} - {stem_name}.mp3"
     
-    return FileResponse(
-        path=stem_path,
+    return RangeFileResponse(
+        path,
+        request.headers,
         media_type="audio/mpeg",
-        filename=filename
+        filename=filename,
+        method=request.method
+    )
+
+@app.get("/api/download-stems/{file_id}.zip")
+async def download_stems_zip(file_id: str):
+    """Todos los stems de file_id en un ZIP generado al vuelo (sin recomprimir)"""
+    manifest = await get_stem_manifest(file_id)
+    if not manifest:
+        raise HTTPException(status_code=404, detail="Stems not found")
+
+    original_title = sanitize_filename((file_store.get(file_id) or {}).get('title') or 'audio')
+    bundle = StoredZip([
+        (f"{original_title} - {name}.mp3", STEMS_DIR / entry["path"], entry)
+        for name, entry in manifest.items()
+    ])
+    file_store.touch(file_id)
+
+    async def body():
+        # Los stems se abren uno por uno mientras se envía el ZIP
+        with disk_janitor.pin(file_id):
+            async for chunk in bundle.iter_bytes():
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={
+            "Content-Length": str(bundle.content_length),
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(original_title + ' - stems.zip')}",
+        }
     )
 
 if __name__ == "__main__":
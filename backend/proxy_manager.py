@@ -1,68 +1,327 @@
 """
-Proxy Manager - Maneja proxies públicos gratuitos con rotación automática
+Proxy Manager - Pool de proxies validados en segundo plano
+
+Los candidatos salen de PROXY_POOL (lista fija) y de PROXY_POOL_SOURCES
+(URLs que devuelven "ip:puerto" por línea, p. ej. proxyscrape). Cada
+PROXY_REFRESH_INTERVAL segundos se validan todos en paralelo (hasta
+PROXY_VALIDATE_CONCURRENCY a la vez) contra PROXY_TEST_URL y se quedan los
+PROXY_POOL_SIZE de menor costo esperado (latencia EWMA penalizada por la
+tasa de éxito, igual que las instancias de Cobalt).
+
+Cada job recibe un proxy fijo (sticky) mientras ese proxy siga en el pool;
+un proxy con varios fallos de red seguidos sale del pool y no vuelve a
+validarse hasta que pasa PROXY_EJECT_COOLDOWN. Los errores propios del
+video (403, 429, verificación de bot) no cuentan contra el proxy. Nada de
+esto toca la red al importar: el pool se llena después de start() y
+mientras tanto las descargas van sin proxy.
 """
 
-import requests
+import asyncio
 import random
-from typing import Optional, List
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import httpx
+
+import config
+from http_clients import http_clients
+
+# Fallos de conexión o del propio proxy. Un 403/429 o la verificación de bot
+# dependen del video o de las cookies: no sacan del pool a un proxy sano
+PROXY_ERRORS = (
+    "proxy", "tunnel", "407", "unable to connect", "timed out", "timeout",
+    "connection refused", "connection reset", "remote end closed",
+)
+
+
+def normalize_proxy(entry: str) -> Optional[str]:
+    """ "ip:puerto" -> "http://ip:puerto" (respeta el esquema si ya lo trae)"""
+    entry = entry.strip()
+    if not entry or entry.startswith("#"):
+        return None
+    return entry if "://" in entry else f"http://{entry}"
+
+
+class ProxyHealth:
+    def __init__(self, url: str):
+        self.url = url
+        self.latency_ewma: Optional[float] = None  # segundos
+        self.success_ewma = 1.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.validated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def expected_cost(self) -> float:
+        """Latencia esperada penalizada por la probabilidad de fallo"""
+        latency = self.latency_ewma if self.latency_ewma is not None else config.PROXY_VALIDATE_TIMEOUT
+        return latency / max(self.success_ewma, 0.05)
+
+    def to_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "latency_ms": round(self.latency_ewma * 1000) if self.latency_ewma is not None else None,
+            "success_rate": round(self.success_ewma, 3),
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "validated_at": self.validated_at,
+            "last_error": self.last_error,
+        }
+
 
 class ProxyManager:
-    def __init__(self):
-        self.proxies: List[str] = []
-        self.current_index = 0
-        self.load_proxies()
-    
-    def load_proxies(self):
-        """Carga lista de proxies públicos gratuitos"""
-        # Lista de proxies públicos confiables (actualizar periódicamente)
-        # Estos son ejemplos - en producción usar API de proxies
-        self.proxies = [
-            # Formato: http://ip:puerto
-            "http://proxy.server.com:8080",  # Placeholder
-        ]
-        
-        # Intentar cargar desde API pública
+    def __init__(
+        self,
+        static_proxies: Optional[List[str]] = None,
+        sources: Optional[List[str]] = None,
+        test_url: str = "https://www.youtube.com/generate_204",
+        validate_concurrency: int = 50,
+        validate_timeout: float = 5.0,
+        refresh_interval: float = 600,
+        max_candidates: int = 500,
+        pool_size: int = 20,
+        failure_threshold: int = 2,
+        eject_cooldown: float = 1800,
+        alpha: float = 0.3,
+        sticky_limit: int = 1024,
+    ):
+        """
+        Args:
+            static_proxies: Proxies fijos (siempre candidatos)
+            sources: URLs con listas de proxies ("ip:puerto" por línea)
+            test_url: URL que se pide a través de cada candidato para validarlo
+            validate_concurrency: Validaciones simultáneas
+            validate_timeout: Segundos máximos por validación
+            refresh_interval: Segundos entre rondas de validación
+            max_candidates: Candidatos validados por ronda
+            pool_size: Proxies que se mantienen en el pool (los de menor costo)
+            failure_threshold: Fallos seguidos que sacan un proxy del pool
+            eject_cooldown: Segundos que un proxy expulsado queda fuera de las validaciones
+            alpha: Peso de la última muestra en los EWMA
+            sticky_limit: Asignaciones job -> proxy que se recuerdan
+        """
+        self.static_proxies = [p for p in map(normalize_proxy, static_proxies or []) if p]
+        self.sources = sources or []
+        self.test_url = test_url
+        self.validate_concurrency = validate_concurrency
+        self.validate_timeout = validate_timeout
+        self.refresh_interval = refresh_interval
+        self.max_candidates = max_candidates
+        self.pool_size = pool_size
+        self.failure_threshold = failure_threshold
+        self.eject_cooldown = eject_cooldown
+        self.alpha = alpha
+        self.sticky_limit = sticky_limit
+
+        self.health: Dict[str, ProxyHealth] = {}
+        self.pool: List[str] = []  # Ordenado de menor a mayor costo esperado
+        self.sticky: "OrderedDict[str, str]" = OrderedDict()
+        self.assigned: Counter = Counter()
+        self.cooldowns: Dict[str, float] = {}  # {url: instante (monotonic) en que puede volver}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._ssl_context = None
+
+        # Estadísticas
+        self.rounds = 0
+        self.candidates = 0
+        self.validated_ok = 0
+        self.ejections = 0
+        self.last_round_seconds: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.static_proxies or self.sources)
+
+    async def fetch_candidates(self) -> List[str]:
+        """Proxies fijos + los de las fuentes (sin repetidos, hasta max_candidates)"""
+        fetched: List[str] = []
+        for source in self.sources:
+            try:
+                response = await http_clients.get("default").get(source, timeout=self.validate_timeout * 2)
+                response.raise_for_status()
+                fetched.extend(p for p in map(normalize_proxy, response.text.splitlines()) if p)
+            except Exception as e:
+                print(f"⚠️ Could not load proxies from {source}: {e}")
+        random.shuffle(fetched)
+        candidates = list(dict.fromkeys(self.static_proxies + self.pool + fetched))
+        return candidates[:self.max_candidates]
+
+    async def validate(self, url: str) -> bool:
+        """Pide test_url a través del proxy y registra la latencia"""
+        if self._ssl_context is None:
+            # Un contexto SSL por cliente cuesta CPU: se comparte entre todas las validaciones
+            self._ssl_context = httpx.create_ssl_context()
+        start = time.monotonic()
         try:
-            # Free Proxy List API
-            response = requests.get(
-                "https://api.proxyscrape.com/v2/?request=get&protocol=http&timeout=10000&country=all&ssl=all&anonymity=all",
-                timeout=5
-            )
-            if response.status_code == 200:
-                proxy_list = response.text.strip().split('\n')
-                self.proxies = [f"http://{proxy}" for proxy in proxy_list if proxy]
-                print(f"✅ Loaded {len(self.proxies)} public proxies")
+            async with httpx.AsyncClient(proxy=url, timeout=self.validate_timeout, verify=self._ssl_context) as client:
+                start = time.monotonic()
+                response = await client.get(self.test_url)
+            ok = response.status_code < 400
+            error = None if ok else f"HTTP {response.status_code}"
         except Exception as e:
-            print(f"⚠️ Could not load public proxies: {e}")
-            # Fallback: usar sin proxy
-            self.proxies = []
-    
-    def get_proxy(self) -> Optional[str]:
-        """Obtiene el siguiente proxy de la lista"""
-        if not self.proxies:
-            return None
-        
-        proxy = self.proxies[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.proxies)
-        return proxy
-    
-    def get_random_proxy(self) -> Optional[str]:
-        """Obtiene un proxy aleatorio"""
-        if not self.proxies:
+            ok = False
+            error = str(e) or type(e).__name__
+        latency = time.monotonic() - start
+
+        if url not in self.health:
+            self.health[url] = ProxyHealth(url)
+        self.health[url].validated_at = time.time()
+        if ok:
+            self.record_success(url, latency)
+        else:
+            self.record_failure(url, error)
+        return ok
+
+    async def refresh(self):
+        """Una ronda de validación: reconstruye el pool con los candidatos que responden"""
+        start = time.monotonic()
+        candidates = await self.fetch_candidates()
+        # Los expulsados no se validan hasta que termina su cooldown
+        self.cooldowns = {url: until for url, until in self.cooldowns.items() if until > start}
+        checked = [url for url in candidates if url not in self.cooldowns]
+        semaphore = asyncio.Semaphore(self.validate_concurrency)
+
+        async def check(url: str) -> bool:
+            async with semaphore:
+                return await self.validate(url)
+
+        results = await asyncio.gather(*(check(url) for url in checked))
+        passing = [url for url, ok in zip(checked, results) if ok]
+        passing.sort(key=lambda url: self.health[url].expected_cost())
+        self._set_pool(passing[:self.pool_size])
+
+        # Olvidar la salud de los proxies que ya no son candidatos
+        keep = set(candidates)
+        self.health = {url: h for url, h in self.health.items() if url in keep}
+
+        self.rounds += 1
+        self.candidates = len(candidates)
+        self.validated_ok = len(passing)
+        self.last_round_seconds = round(time.monotonic() - start, 2)
+        print(f"🌐 Proxy pool: {len(self.pool)} ready ({len(passing)}/{len(checked)} passed, "
+              f"{len(self.cooldowns)} cooling down, {self.last_round_seconds}s)")
+
+    def _set_pool(self, pool: List[str]):
+        self.pool = pool
+        members = set(pool)
+        for key, url in list(self.sticky.items()):
+            if url not in members:
+                self.release(key)
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Proxy validation round failed: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self.enabled and self._refresh_task is None:
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    def acquire(self, key: Optional[str] = None) -> Optional[str]:
+        """
+        Proxy para una operación (None si el pool está vacío). Con key, el mismo
+        job recibe siempre el mismo proxy mientras siga en el pool; los jobs
+        nuevos van al proxy de menor costo, repartidos según los ya asignados.
+        """
+        if key is not None and key in self.sticky:
+            self.sticky.move_to_end(key)
+            return self.sticky[key]
+        if not self.pool:
             return None
-        return random.choice(self.proxies)
-    
-    def test_proxy(self, proxy: str) -> bool:
-        """Prueba si un proxy funciona"""
+
+        url = min(self.pool, key=lambda u: self.health[u].expected_cost() * (1 + self.assigned[u]))
+        if key is not None:
+            self.sticky[key] = url
+            self.assigned[url] += 1
+            while len(self.sticky) > self.sticky_limit:
+                self.release(next(iter(self.sticky)))
+        return url
+
+    def release(self, key: str):
+        """El job terminó: libera su asignación"""
+        url = self.sticky.pop(key, None)
+        if url is not None:
+            self.assigned[url] -= 1
+            if self.assigned[url] <= 0:
+                del self.assigned[url]
+
+    def record_success(self, url: str, latency: Optional[float] = None):
+        health = self.health.get(url)
+        if health is None:
+            return
+        health.requests += 1
+        health.consecutive_failures = 0
+        health.success_ewma = self.alpha + (1 - self.alpha) * health.success_ewma
+        if latency is not None:
+            if health.latency_ewma is None:
+                health.latency_ewma = latency
+            else:
+                health.latency_ewma = self.alpha * latency + (1 - self.alpha) * health.latency_ewma
+
+    def record_failure(self, url: str, error: str):
+        health = self.health.get(url)
+        if health is None:
+            return
+        health.requests += 1
+        health.failures += 1
+        health.consecutive_failures += 1
+        health.last_error = error[:200]
+        health.success_ewma = (1 - self.alpha) * health.success_ewma
+        if url in self.pool and health.consecutive_failures >= self.failure_threshold:
+            print(f"🚫 Proxy ejected: {url} ({health.last_error})")
+            self.ejections += 1
+            self.cooldowns[url] = time.monotonic() + self.eject_cooldown
+            self._set_pool([u for u in self.pool if u != url])
+
+    @contextmanager
+    def track(self, url: Optional[str]):
+        """Registra el resultado del bloque para el proxy (solo cuentan los errores de conexión)"""
         try:
-            response = requests.get(
-                "https://www.google.com",
-                proxies={"http": proxy, "https": proxy},
-                timeout=5
-            )
-            return response.status_code == 200
-        except:
-            return False
+            yield
+        except Exception as e:
+            message = str(e).lower()
+            if url is not None and any(pattern in message for pattern in PROXY_ERRORS):
+                self.record_failure(url, str(e))
+            raise
+        if url is not None:
+            self.record_success(url)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "pool": [{**self.health[url].to_dict(), "assigned": self.assigned[url]} for url in self.pool],
+            "sticky_jobs": len(self.sticky),
+            "rounds": self.rounds,
+            "candidates": self.candidates,
+            "validated_ok": self.validated_ok,
+            "ejections": self.ejections,
+            "cooling_down": len(self.cooldowns),
+            "last_round_seconds": self.last_round_seconds,
+        }
+
 
 # Instancia global
-proxy_manager = ProxyManager()
+proxy_manager = ProxyManager(
+    static_proxies=config.PROXY_POOL,
+    sources=config.PROXY_POOL_SOURCES,
+    test_url=config.PROXY_TEST_URL,
+    validate_concurrency=config.PROXY_VALIDATE_CONCURRENCY,
+    validate_timeout=config.PROXY_VALIDATE_TIMEOUT,
+    refresh_interval=config.PROXY_REFRESH_INTERVAL,
+    max_candidates=config.PROXY_MAX_CANDIDATES,
+    pool_size=config.PROXY_POOL_SIZE,
+    failure_threshold=config.PROXY_FAILURE_THRESHOLD,
+    eject_cooldown=config.PROXY_EJECT_COOLDOWN
+)
@@ -0,0 +1,283 @@
+"""
+Almacenamiento de los contadores del rate limiter
+
+Cada limitador divide su ventana en buckets de tiempo y guarda, por clave
+(IP), cuántas peticiones cayeron en cada bucket. Hay dos backends:
+
+- memory: ring de contadores en memoria del proceso (un solo worker)
+- sqlite: tabla en SQLite con WAL, compartida por todos los workers de la
+  máquina y persistente entre reinicios
+
+acquire() comprueba el límite y registra en una sola operación atómica, así
+dos workers no pueden dejar pasar la misma petición que excede el cupo. En
+SQLite el lock de escritura se pide con un busy timeout de milisegundos: si
+otro worker lo tiene, acquire() cede el event loop y reintenta con backoff
+en lugar de bloquear el worker hasta que se libere.
+"""
+
+import asyncio
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# (peticiones dentro de la ventana, bucket más antiguo con peticiones o None)
+Usage = Tuple[int, Optional[int]]
+
+
+class StoreBusy(Exception):
+    """Otro worker tiene el lock de escritura de la base de datos"""
+
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    message = str(error).lower()
+    return "locked" in message or "busy" in message
+
+
+async def _retry_busy(operation, lock_timeout: float, delay: float = 0.005, max_delay: float = 0.1):
+    """Ejecuta operation() reintentando con backoff exponencial mientras devuelva StoreBusy"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + lock_timeout
+    while True:
+        try:
+            return operation()
+        except StoreBusy:
+            if loop.time() + delay > deadline:
+                raise
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+class _Window:
+    """Contadores por bucket de tiempo en un ring de tamaño fijo (estado compacto por IP)"""
+    __slots__ = ("head", "counts")
+
+    def __init__(self, head: int, buckets: int):
+        self.head = head  # Índice absoluto del bucket más reciente
+        self.counts = bytearray(buckets)
+
+
+class MemoryRateLimitStore:
+    """Contadores en memoria del proceso: O(1) por petición, ~200 bytes por IP"""
+
+    backend = "memory"
+
+    def __init__(self, buckets: int):
+        self.buckets = buckets
+        self.windows: Dict[str, _Window] = {}  # {ip: ring de contadores}
+
+    def _advance(self, window: _Window, bucket: int):
+        """Pone a cero los buckets que salieron de la ventana (como mucho `buckets` pasos)"""
+        if bucket <= window.head:
+            return
+        if bucket - window.head >= self.buckets:
+            window.counts = bytearray(self.buckets)
+        else:
+            counts = window.counts
+            for b in range(window.head + 1, bucket + 1):
+                counts[b % self.buckets] = 0
+        window.head = bucket
+
+    def usage(self, key: str, bucket: int) -> Usage:
+        window = self.windows.get(key)
+        if window is None:
+            return 0, None
+        self._advance(window, bucket)
+        count = sum(window.counts)
+        if not count:
+            return 0, None
+        # Bucket más antiguo con registros: al salir de la ventana se libera un cupo
+        for b in range(bucket - self.buckets + 1, bucket + 1):
+            if window.counts[b % self.buckets]:
+                return count, b
+        return count, None
+
+    def try_acquire(self, key: str, bucket: int, limit: Optional[int] = None) -> Tuple[bool, Usage]:
+        """Registra una petición si no supera `limit` (None = registrar siempre)"""
+        count, oldest = self.usage(key, bucket)
+        if limit is not None and count >= limit:
+            return False, (count, oldest)
+
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = _Window(bucket, self.buckets)
+        index = bucket % self.buckets
+        if window.counts[index] < 255:
+            window.counts[index] += 1
+        return True, (count + 1, oldest if oldest is not None else bucket)
+
+    async def acquire(self, key: str, bucket: int, limit: Optional[int] = None) -> Tuple[bool, Usage]:
+        """try_acquire(): en memoria nunca hay que esperar un lock"""
+        return self.try_acquire(key, bucket, limit)
+
+    async def sweep(self, cutoff: int, batch_size: int = 10000) -> int:
+        """Elimina las claves sin registros posteriores a `cutoff`, por lotes"""
+        keys = list(self.windows.keys())
+        removed = 0
+        for start in range(0, len(keys), batch_size):
+            for key in keys[start:start + batch_size]:
+                window = self.windows.get(key)
+                if window is not None and window.head <= cutoff:
+                    del self.windows[key]
+                    removed += 1
+            await asyncio.sleep(0)
+        return removed
+
+    def stats(self) -> Dict:
+        return {"backend": self.backend, "tracked_keys": len(self.windows)}
+
+
+class SQLiteRateLimitStore:
+    """Contadores en SQLite (WAL) compartidos entre procesos"""
+
+    backend = "sqlite"
+
+    def __init__(
+        self,
+        path: Path,
+        scope: str,
+        buckets: int,
+        busy_timeout: float = 0.01,
+        lock_timeout: float = 5.0,
+    ):
+        """
+        Args:
+            path: Archivo de la base de datos (compartido por todos los limitadores)
+            scope: Nombre del limitador dentro de la tabla
+            buckets: Buckets por ventana
+            busy_timeout: Espera máxima (bloqueante) de SQLite por el lock en cada intento
+            lock_timeout: Espera total por el lock en acquire()/sweep() antes de fallar
+        """
+        self.path = Path(path)
+        self.scope = scope
+        self.buckets = buckets
+        self.busy_timeout = busy_timeout
+        self.lock_timeout = lock_timeout
+        self.busy_retries = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.lock_timeout,  # Solo para crear el esquema
+                isolation_level=None,  # Transacciones explícitas
+                check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_hits ("
+                " scope TEXT NOT NULL, key TEXT NOT NULL, bucket INTEGER NOT NULL,"
+                " count INTEGER NOT NULL, UNIQUE (scope, key, bucket))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS rate_limit_hits_bucket ON rate_limit_hits (scope, bucket)"
+            )
+            # A partir de aquí cada intento espera el lock como mucho busy_timeout;
+            # la espera larga la hace acquire() cediendo el event loop
+            conn.execute(f"PRAGMA busy_timeout = {max(1, int(self.busy_timeout * 1000))}")
+            self._conn = conn
+        return self._conn
+
+    def _usage(self, conn: sqlite3.Connection, key: str, bucket: int) -> Usage:
+        count, oldest = conn.execute(
+            "SELECT COALESCE(SUM(count), 0), MIN(bucket) FROM rate_limit_hits"
+            " WHERE scope = ? AND key = ? AND bucket > ?",
+            (self.scope, key, bucket - self.buckets)
+        ).fetchone()
+        return count, oldest
+
+    def usage(self, key: str, bucket: int) -> Usage:
+        with self._lock:
+            return self._usage(self._connect(), key, bucket)
+
+    def try_acquire(self, key: str, bucket: int, limit: Optional[int] = None) -> Tuple[bool, Usage]:
+        """
+        Registra una petición si no supera `limit` (None = registrar siempre).
+        Lanza StoreBusy si el lock de escritura no se libera en busy_timeout.
+        """
+        with self._lock:
+            conn = self._connect()
+            # BEGIN IMMEDIATE toma el lock de escritura antes de leer: check y
+            # record son atómicos frente a los demás workers
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as e:
+                if _is_busy(e):
+                    self.busy_retries += 1
+                    raise StoreBusy(str(e)) from e
+                raise
+            try:
+                count, oldest = self._usage(conn, key, bucket)
+                if limit is not None and count >= limit:
+                    conn.execute("COMMIT")
+                    return False, (count, oldest)
+                conn.execute(
+                    "INSERT INTO rate_limit_hits (scope, key, bucket, count) VALUES (?, ?, ?, 1)"
+                    " ON CONFLICT (scope, key, bucket) DO UPDATE SET count = count + 1",
+                    (self.scope, key, bucket)
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return True, (count + 1, oldest if oldest is not None else bucket)
+
+    async def acquire(self, key: str, bucket: int, limit: Optional[int] = None) -> Tuple[bool, Usage]:
+        """try_acquire() sin bloquear el event loop mientras otro worker tiene el lock"""
+        return await _retry_busy(lambda: self.try_acquire(key, bucket, limit), self.lock_timeout)
+
+    def _sweep_batch(self, cutoff: int, batch_size: int) -> int:
+        with self._lock:
+            try:
+                cursor = self._connect().execute(
+                    "DELETE FROM rate_limit_hits WHERE rowid IN ("
+                    " SELECT rowid FROM rate_limit_hits WHERE scope = ? AND bucket <= ? LIMIT ?)",
+                    (self.scope, cutoff, batch_size)
+                )
+            except sqlite3.OperationalError as e:
+                if _is_busy(e):
+                    self.busy_retries += 1
+                    raise StoreBusy(str(e)) from e
+                raise
+            return cursor.rowcount
+
+    async def sweep(self, cutoff: int, batch_size: int = 5000) -> int:
+        """Borra los buckets que ya salieron de la ventana, por lotes"""
+        removed = 0
+        while True:
+            deleted = await _retry_busy(lambda: self._sweep_batch(cutoff, batch_size), self.lock_timeout)
+            removed += deleted
+            if deleted < batch_size:
+                return removed
+            await asyncio.sleep(0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT COUNT(*) FROM rate_limit_hits WHERE scope = ?", (self.scope,)
+            ).fetchone()[0]
+        return {
+            "backend": self.backend,
+            "path": str(self.path),
+            "rows": rows,
+            "busy_retries": self.busy_retries,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_store(backend: str, scope: str, buckets: int, path: Optional[Path] = None):
+    """Crea el backend configurado (memory o sqlite)"""
+    if backend == "sqlite":
+        return SQLiteRateLimitStore(path, scope, buckets)
+    if backend != "memory":
+        print(f"⚠️ Unknown rate limit backend '{backend}', using memory")
+    return MemoryRateLimitStore(buckets)
@@ -2,29 +2,47 @@
 Rate Limiter - Sistema de límites por IP
 """
 
-from datetime import datetime, timedelta
+import asyncio
+import time
+from datetime import datetime
 from typing import Dict, Optional
 from fastapi import HTTPException, Request
 
+import config
+from rate_limit_store import MemoryRateLimitStore, create_store
+
+
 class RateLimiter:
-    def __init__(self, max_downloads: int = 5, window_hours: int = 24):
+    def __init__(
+        self,
+        max_downloads: int = 5,
+        window_hours: int = 24,
+        buckets: int = 24,
+        name: str = "downloads",
+        store=None,
+    ):
         """
         Args:
             max_downloads: Máximo de descargas permitidas por IP
             window_hours: Ventana de tiempo en horas
+            buckets: Buckets en los que se divide la ventana (granularidad de la ventana deslizante)
+            name: Nombre del limitador (separa sus contadores en el store compartido)
+            store: Backend de contadores (por defecto en memoria)
         """
         self.max_downloads = max_downloads
         self.window_hours = window_hours
-        self.ip_records: Dict[str, list] = {}  # {ip: [timestamp1, timestamp2, ...]}
-    
-    def _clean_old_records(self, ip: str):
-        """Elimina registros fuera de la ventana de tiempo"""
-        if ip not in self.ip_records:
-            return
-        
-        cutoff = datetime.now() - timedelta(hours=self.window_hours)
-        self.ip_records[ip] = [ts for ts in self.ip_records[ip] if ts > cutoff]
-    
+        self.buckets = buckets
+        self.name = name
+        self.window_seconds = window_hours * 3600
+        self.bucket_seconds = self.window_seconds / buckets
+        self.store = store or MemoryRateLimitStore(buckets)
+        self.clock = time.time
+        self._sweeper_task: Optional[asyncio.Task] = None
+        self.evicted = 0
+
+    def _current_bucket(self) -> int:
+        return int(self.clock() // self.bucket_seconds)
+
     def get_client_ip(self, request: Request) -> str:
         """Obtiene la IP real del cliente (considera proxies)"""
         # Render y otros servicios usan X-Forwarded-For
@@ -35,56 +53,134 @@ class RateLimiter:
         
         # Fallback a la IP directa
         return request.client.host if request.client else "unknown"
-    
-    def check_limit(self, request: Request) -> Dict:
-        """
-        Verifica si el IP puede hacer una descarga.
-        Returns: {allowed: bool, remaining: int, reset_time: str}
-        """
-        ip = self.get_client_ip(request)
-        self._clean_old_records(ip)
-        
-        if ip not in self.ip_records:
-            self.ip_records[ip] = []
-        
-        current_count = len(self.ip_records[ip])
-        remaining = max(0, self.max_downloads - current_count)
-        
+
+    def _status(self, ip: str, allowed: bool, count: int, oldest_bucket: Optional[int]) -> Dict:
+        remaining = max(0, self.max_downloads - count)
+
         # Calcular tiempo de reset
-        if self.ip_records[ip]:
-            oldest = min(self.ip_records[ip])
-            reset_time = oldest + timedelta(hours=self.window_hours)
+        if oldest_bucket is not None:
+            reset_ts = (oldest_bucket + self.buckets) * self.bucket_seconds
         else:
-            reset_time = datetime.now() + timedelta(hours=self.window_hours)
-        
+            reset_ts = self.clock() + self.window_seconds
+
         return {
-            "allowed": current_count < self.max_downloads,
+            "allowed": allowed,
             "remaining": remaining,
             "total": self.max_downloads,
-            "reset_time": reset_time.isoformat(),
+            "reset_time": datetime.fromtimestamp(reset_ts).isoformat(),
             "ip": ip
         }
-    
-    def record_download(self, request: Request):
+
+    def check_key(self, ip: str) -> Dict:
+        """check_limit() para una clave ya resuelta"""
+        count, oldest = self.store.usage(ip, self._current_bucket())
+        return self._status(ip, count < self.max_downloads, count, oldest)
+
+    async def record_key(self, ip: str):
+        """record_download() para una clave ya resuelta"""
+        await self.store.acquire(ip, self._current_bucket())
+
+    async def acquire_key(self, ip: str) -> Dict:
+        """acquire() para una clave ya resuelta"""
+        allowed, (count, oldest) = await self.store.acquire(ip, self._current_bucket(), self.max_downloads)
+        return self._status(ip, allowed, count, oldest)
+
+    def check_limit(self, request: Request) -> Dict:
+        """
+        Verifica si el IP puede hacer una descarga.
+        Returns: {allowed: bool, remaining: int, reset_time: str}
+        """
+        return self.check_key(self.get_client_ip(request))
+
+    async def record_download(self, request: Request):
         """Registra una descarga para el IP"""
-        ip = self.get_client_ip(request)
-        self._clean_old_records(ip)
-        
-        if ip not in self.ip_records:
-            self.ip_records[ip] = []
-        
-        self.ip_records[ip].append(datetime.now())
-    
+        await self.record_key(self.get_client_ip(request))
+
+    async def acquire(self, request: Request) -> Dict:
+        """
+        Verifica y registra la descarga en una sola operación atómica.
+        Si allowed es False no se registra nada.
+        """
+        return await self.acquire_key(self.get_client_ip(request))
+
     def get_status(self, request: Request) -> Dict:
         """Obtiene el estado actual del límite para un IP"""
         return self.check_limit(request)
 
+    async def sweep(self) -> int:
+        """Elimina los registros que ya salieron de la ventana sin bloquear el event loop"""
+        removed = await self.store.sweep(self._current_bucket() - self.buckets)
+        self.evicted += removed
+        return removed
+
+    async def _sweeper_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.sweep()
+            except Exception as e:
+                print(f"⚠️ Rate limiter sweep failed ({self.name}): {e}")
+                continue
+            if removed:
+                print(f"🧹 Rate limiter ({self.name}): {removed} expired records evicted")
+
+    def start_sweeper(self, interval: float = config.RATE_LIMIT_SWEEP_INTERVAL):
+        if self._sweeper_task is None:
+            self._sweeper_task = asyncio.create_task(self._sweeper_loop(interval))
+
+    def stop_sweeper(self):
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            self._sweeper_task = None
+
+    def stats(self) -> Dict:
+        return {
+            **self.store.stats(),
+            "evicted": self.evicted,
+            "max_downloads": self.max_downloads,
+            "window_hours": self.window_hours,
+        }
+
 
 # Instancia global - 10 descargas cada 24 horas
-rate_limiter = RateLimiter(max_downloads=10, window_hours=24)
+rate_limiter = RateLimiter(
+    max_downloads=10,
+    window_hours=24,
+    name="downloads",
+    store=create_store(config.RATE_LIMIT_BACKEND, "downloads", 24, config.RATE_LIMIT_DB)
+)
 
 # Instancia para stems - 3 separaciones cada 24 horas (más restrictivo)
-stems_rate_limiter = RateLimiter(max_downloads=3, window_hours=24)
+stems_rate_limiter = RateLimiter(
+    max_downloads=3,
+    window_hours=24,
+    name="stems",
+    store=create_store(config.RATE_LIMIT_BACKEND, "stems", 24, config.RATE_LIMIT_DB)
+)
+
+
+def _raise_download_limit(status: Dict):
+    raise HTTPException(
+        status_code=429,
+        detail={
+            "error": "Límite de descargas alcanzado",
+            "message": f"Has alcanzado el límite de {status['total']} descargas. Vuelve más tarde.",
+            "remaining": 0,
+            "reset_time": status["reset_time"]
+        }
+    )
+
+
+def _raise_stems_limit(status: Dict):
+    raise HTTPException(
+        status_code=429,
+        detail={
+            "error": "Límite de separación alcanzado",
+            "message": f"Has alcanzado el límite de {status['total']} separaciones de stems por día. Vuelve mañana.",
+            "remaining": 0,
+            "reset_time": status["reset_time"]
+        }
+    )
 
 
 def check_rate_limit(request: Request):
@@ -92,15 +188,7 @@ def check_rate_limit(request: Request):
     status = rate_limiter.check_limit(request)
     
     if not status["allowed"]:
-        raise HTTPException(
-            status_code=429,
-            detail={
-                "error": "Límite de descargas alcanzado",
-                "message": f"Has alcanzado el límite de {status['total']} descargas. Vuelve más tarde.",
-                "remaining": 0,
-                "reset_time": status["reset_time"]
-            }
-        )
+        _raise_download_limit(status)
     
     return status
 
@@ -110,14 +198,22 @@ def check_stems_rate_limit(request: Request):
     status = stems_rate_limiter.check_limit(request)
     
     if not status["allowed"]:
-        raise HTTPException(
-            status_code=429,
-            detail={
-                "error": "Límite de separación alcanzado",
-                "message": f"Has alcanzado el límite de {status['total']} separaciones de stems por día. Vuelve mañana.",
-                "remaining": 0,
-                "reset_time": status["reset_time"]
-            }
-        )
+        _raise_stems_limit(status)
     
     return status
+
+
+async def acquire_rate_limit(request: Request) -> Dict:
+    """Verifica y registra una descarga de forma atómica (429 si ya no queda cupo)"""
+    status = await rate_limiter.acquire(request)
+    if not status["allowed"]:
+        _raise_download_limit(status)
+    return status
+
+
+async def acquire_stems_rate_limit(request: Request) -> Dict:
+    """Verifica y registra una separación de stems de forma atómica (429 si ya no queda cupo)"""
+    status = await stems_rate_limiter.acquire(request)
+    if not status["allowed"]:
+        _raise_stems_limit(status)
+    return status
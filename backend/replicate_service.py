@@ -5,15 +5,260 @@ Uses cloud GPU for processing - much faster and doesn't require local resources
 
 import httpx
 import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
 import os
-from typing import Optional
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from typing import Dict, Optional
 from pathlib import Path
 
+import config
+from download_stream import DownloadTooLargeError, stream_to_file
+from http_clients import http_clients
+from singleflight import SingleFlight
+
+# Estados finales de una predicción
+TERMINAL_STATUSES = ("succeeded", "failed", "canceled")
+
+
 class ReplicateService:
     def __init__(self):
-        self.base_url = "https://api.replicate.com/v1"
+        self.base_url = config.REPLICATE_BASE_URL.rstrip("/")
+        self.webhook_url = config.REPLICATE_WEBHOOK_URL
+        self.webhook_secret = config.REPLICATE_WEBHOOK_SECRET
         # Modelo ryan5453/demucs - más actualizado y estable
         self.model_version = "5a7041cc9b82e5a558fea6b3d7b12dea89625e89da33f0447bd727c2d0ab9e77"
+        self.model_name = "htdemucs"  # Modelo base rápido
+
+        # Audio ya subido a la API de archivos {content_hash: {"url", "expires_at"}} (LRU)
+        self._uploads: "OrderedDict[str, Dict]" = OrderedDict()
+        self._upload_flight = SingleFlight("replicate-uploads")
+        self.uploads = Counter()  # uploaded, reused, failed
+        self.upload_bytes = 0
+
+        # Predicciones esperando resultado {prediction_id: future}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Duraciones observadas por modo, para decidir cuándo consultar
+        self.runtimes = {
+            "2stems": deque(maxlen=50),
+            "4stems": deque(maxlen=50),
+        }
+
+        # Estadísticas
+        self.polls = 0
+        self.webhooks = 0
+        self.resolved_by = {"webhook": 0, "wakeup": 0, "poll": 0}
+
+    def expected_runtime(self, mode: str) -> float:
+        """Mediana de las duraciones observadas (o el valor por defecto)"""
+        samples = sorted(self.runtimes[mode])
+        if not samples:
+            return config.REPLICATE_DEFAULT_RUNTIME
+        return samples[len(samples) // 2]
+
+    def poll_delays(self, mode: str):
+        """
+        Esperas entre consultas: la primera cerca de la duración esperada y
+        luego backoff exponencial. Con webhook el polling es solo un respaldo.
+        """
+        expected = self.expected_runtime(mode)
+        if self.webhook_url:
+            yield expected * 2
+            while True:
+                yield config.REPLICATE_WEBHOOK_POLL_INTERVAL
+        else:
+            yield expected * 0.8
+            delay = config.REPLICATE_POLL_MIN_DELAY
+            max_delay = max(config.REPLICATE_POLL_MIN_DELAY, min(config.REPLICATE_POLL_MAX_DELAY, expected * 0.25))
+            while True:
+                yield delay
+                delay = min(delay * 1.5, max_delay)
+
+    async def _get_prediction(self, prediction_id: str) -> dict:
+        self.polls += 1
+        response = await http_clients.get("replicate").get(
+            f"{self.base_url}/predictions/{prediction_id}",
+            headers={"Authorization": f"Token {self.api_token}"}
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def wait_for_prediction(self, prediction_id: str, mode: str) -> Optional[dict]:
+        """
+        Espera a que la predicción termine: la resuelve el webhook o, si no
+        llega, el polling adaptativo. Devuelve None si se agota el tiempo.
+
+        Un webhook sin firma verificada solo despierta la espera (el futuro
+        se resuelve con None): la predicción se vuelve a pedir a la API y
+        nunca se usa el cuerpo recibido.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._waiters[prediction_id] = future
+        deadline = time.monotonic() + config.REPLICATE_TIMEOUT
+        woken = False
+
+        try:
+            for delay in self.poll_delays(mode):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                try:
+                    prediction = await asyncio.wait_for(asyncio.shield(future), timeout=min(delay, remaining))
+                    if prediction is not None:
+                        self.resolved_by["webhook"] += 1
+                        return prediction
+                    # Aviso sin verificar: consultar ya y seguir esperando con un futuro nuevo
+                    woken = True
+                    future = loop.create_future()
+                    self._waiters[prediction_id] = future
+                except asyncio.TimeoutError:
+                    woken = False
+
+                try:
+                    prediction = await self._get_prediction(prediction_id)
+                except Exception as e:
+                    print(f"⚠️ Replicate poll failed: {e}")
+                    continue
+
+                status = prediction.get("status")
+                print(f"📊 Replicate status: {status} (poll {self.polls})")
+                if status in TERMINAL_STATUSES:
+                    self.resolved_by["wakeup" if woken else "poll"] += 1
+                    return prediction
+        finally:
+            self._waiters.pop(prediction_id, None)
+
+    def verify_webhook(self, headers, body: bytes) -> bool:
+        """
+        Verifica la firma del webhook (webhook-id / webhook-timestamp /
+        webhook-signature, HMAC-SHA256 con el secreto whsec_...).
+        Sin secreto configurado no hay nada que verificar: False.
+        """
+        if not self.webhook_secret:
+            return False
+        webhook_id = headers.get("webhook-id")
+        timestamp = headers.get("webhook-timestamp")
+        signatures = headers.get("webhook-signature", "")
+        if not webhook_id or not timestamp:
+            return False
+        try:
+            if abs(time.time() - int(timestamp)) > 300:
+                return False
+            key = base64.b64decode(self.webhook_secret.split("_", 1)[-1])
+        except (ValueError, binascii.Error):
+            return False
+        signed = f"{webhook_id}.{timestamp}.".encode() + body
+        expected = base64.b64encode(hmac.new(key, signed, hashlib.sha256).digest()).decode()
+        return any(
+            hmac.compare_digest(expected, sig.split(",", 1)[-1])
+            for sig in signatures.split()
+        )
+
+    def handle_webhook(self, prediction: dict, verified: bool) -> bool:
+        """
+        Resuelve la espera de una predicción terminada. True si alguien la esperaba.
+
+        Solo un webhook con firma verificada entrega su cuerpo; sin verificar
+        (no hay secreto) cualquiera puede enviarlo, así que únicamente
+        despierta la espera para que consulte la predicción a la API.
+        """
+        self.webhooks += 1
+        if prediction.get("status") not in TERMINAL_STATUSES:
+            return False
+        future = self._waiters.get(prediction.get("id"))
+        if future is None or future.done():
+            return False
+        future.set_result(prediction if verified else None)
+        return True
+
+    @staticmethod
+    def _parse_expiry(value: Optional[str]) -> float:
+        """expires_at de la API de archivos (ISO 8601); sin dato, 24 h desde ahora"""
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except (AttributeError, ValueError):
+            return time.time() + 24 * 3600
+
+    async def _upload(self, path: Path) -> Dict:
+        """
+        Sube el archivo (multipart, leído por bloques desde disco) y devuelve la
+        respuesta de la API de archivos (urls.get, expires_at...)
+        """
+        client = http_clients.get("replicate")
+        size = path.stat().st_size
+        start = time.monotonic()
+        with open(path, "rb") as f:
+            response = await client.post(
+                f"{self.base_url}/files",
+                headers={"Authorization": f"Token {self.api_token}"},
+                files={"content": (path.name, f, "audio/mpeg")},
+                timeout=config.REPLICATE_UPLOAD_TIMEOUT
+            )
+        response.raise_for_status()
+        uploaded = response.json()
+        self.uploads["uploaded"] += 1
+        self.upload_bytes += size
+        print(f"📤 Uploaded {path.name} to Replicate ({size / (1024 * 1024):.2f} MB, "
+              f"{time.monotonic() - start:.1f}s)")
+        return uploaded
+
+    async def upload_file(self, path: Path, content_hash: Optional[str] = None) -> Optional[str]:
+        """
+        Sube el audio a la API de archivos de Replicate y devuelve la URL para
+        usarla como input de la predicción (None si falla).
+
+        Con content_hash se reutiliza la subida anterior del mismo audio mientras
+        le quede al menos REPLICATE_UPLOAD_MIN_TTL antes de expirar, y las subidas
+        simultáneas del mismo audio se hacen una sola vez.
+        """
+        if content_hash:
+            cached = self._uploads.get(content_hash)
+            if cached and cached["expires_at"] - time.time() > config.REPLICATE_UPLOAD_MIN_TTL:
+                self._uploads.move_to_end(content_hash)
+                self.uploads["reused"] += 1
+                print(f"♻️ Reusing Replicate upload for {path.name}")
+                return cached["url"]
+
+        try:
+            if content_hash:
+                uploaded, _ = await self._upload_flight.do(content_hash, lambda: self._upload(path))
+            else:
+                uploaded = await self._upload(path)
+            url = uploaded["urls"]["get"]
+        except Exception as e:
+            self.uploads["failed"] += 1
+            print(f"⚠️ Replicate upload failed: {e}")
+            return None
+
+        if content_hash:
+            self._uploads[content_hash] = {
+                "url": url,
+                "expires_at": self._parse_expiry(uploaded.get("expires_at")),
+            }
+            self._uploads.move_to_end(content_hash)
+            while len(self._uploads) > config.REPLICATE_UPLOAD_CACHE_SIZE:
+                self._uploads.popitem(last=False)
+        return url
+
+    def stats(self) -> Dict:
+        return {
+            "webhook_enabled": bool(self.webhook_url),
+            "uploads": dict(self.uploads),
+            "upload_bytes": self.upload_bytes,
+            "cached_uploads": len(self._uploads),
+            "waiting": len(self._waiters),
+            "polls": self.polls,
+            "webhooks": self.webhooks,
+            "resolved_by": dict(self.resolved_by),
+            "expected_runtime_s": {
+                mode: round(self.expected_runtime(mode), 1) for mode in self.runtimes
+            },
+        }
         
     @property
     def api_token(self):
@@ -23,6 +268,11 @@ class ReplicateService:
         """Check if Replicate API is configured"""
         return bool(self.api_token)
     
+    @property
+    def model_id(self) -> str:
+        """Identifica versión + modelo (parte de la clave de la caché de stems)"""
+        return f"replicate:{self.model_version[:12]}:{self.model_name}"
+
     async def separate_stems(
         self, 
         audio_url: str, 
@@ -33,7 +283,7 @@ class ReplicateService:
         Separate audio into stems using Replicate's Demucs model
         
         Args:
-            audio_url: Public URL to the audio file
+            audio_url: URL of the audio file (Replicate upload or public URL)
             two_stems: If True, only separate vocals and instrumental
             output_format: Output format (mp3, wav, flac)
             
@@ -47,100 +297,130 @@ class ReplicateService:
         try:
             print(f"🔗 Audio URL: {audio_url}")
             
-            async with httpx.AsyncClient(timeout=600) as client:
-                # Parámetros para ryan5453/demucs
-                input_data = {
-                    "audio": audio_url,
-                    "output_format": output_format,
-                    "model": "htdemucs",  # Modelo base rápido
-                }
-                
-                # Si es two_stems, solo separar vocals
-                if two_stems:
-                    input_data["stems"] = "vocals"
-                else:
-                    input_data["stems"] = "all"  # drums, bass, vocals, other
-                
-                print(f"📤 Sending to Replicate: {input_data}")
-                
-                response = await client.post(
-                    f"{self.base_url}/predictions",
-                    headers={
-                        "Authorization": f"Token {self.api_token}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "version": self.model_version,
-                        "input": input_data
-                    }
-                )
-                
-                if response.status_code != 201:
-                    print(f"❌ Replicate API error: {response.status_code} - {response.text}")
-                    return None
-                
-                prediction = response.json()
-                prediction_id = prediction["id"]
-                print(f"✅ Replicate prediction created: {prediction_id}")
-                
-                # Poll for completion (máximo 10 minutos)
-                max_attempts = 300  # 300 * 2 segundos = 10 minutos
-                attempts = 0
-                
-                while attempts < max_attempts:
-                    await asyncio.sleep(2)
-                    attempts += 1
-                    
-                    status_response = await client.get(
-                        f"{self.base_url}/predictions/{prediction_id}",
-                        headers={"Authorization": f"Token {self.api_token}"}
-                    )
-                    
-                    status_data = status_response.json()
-                    status = status_data["status"]
-                    
-                    if attempts % 5 == 0:  # Log cada 10 segundos
-                        print(f"📊 Replicate status: {status} (attempt {attempts})")
-                    
-                    if status == "succeeded":
-                        output = status_data.get("output")
-                        print(f"✅ Replicate succeeded! Output: {output}")
-                        return output
-                    elif status == "failed":
-                        error = status_data.get('error', 'Unknown error')
-                        print(f"❌ Replicate failed: {error}")
-                        return None
-                    elif status == "canceled":
-                        print("❌ Replicate prediction canceled")
-                        return None
-                
-                print("❌ Replicate timeout (10 minutes)")
+            client = http_clients.get("replicate")
+
+            # Parámetros para ryan5453/demucs
+            input_data = {
+                "audio": audio_url,
+                "output_format": output_format,
+                "model": self.model_name,
+            }
+            
+            # Si es two_stems, solo separar vocals
+            if two_stems:
+                input_data["stems"] = "vocals"
+            else:
+                input_data["stems"] = "all"  # drums, bass, vocals, other
+            
+            print(f"📤 Sending to Replicate: {input_data}")
+            
+            body = {
+                "version": self.model_version,
+                "input": input_data
+            }
+            if self.webhook_url:
+                # Replicate avisa al terminar; el polling queda como respaldo
+                body["webhook"] = self.webhook_url
+                body["webhook_events_filter"] = ["completed"]
+
+            response = await client.post(
+                f"{self.base_url}/predictions",
+                headers={
+                    "Authorization": f"Token {self.api_token}",
+                    "Content-Type": "application/json"
+                },
+                json=body
+            )
+            
+            if response.status_code != 201:
+                print(f"❌ Replicate API error: {response.status_code} - {response.text}")
                 return None
-                        
+            
+            prediction = response.json()
+            prediction_id = prediction["id"]
+            print(f"✅ Replicate prediction created: {prediction_id}")
+
+            mode = "2stems" if two_stems else "4stems"
+            started = time.monotonic()
+            status_data = await self.wait_for_prediction(prediction_id, mode)
+            if status_data is None:
+                print(f"❌ Replicate timeout ({config.REPLICATE_TIMEOUT // 60:.0f} minutes)")
+                return None
+
+            status = status_data["status"]
+            if status == "succeeded":
+                self.runtimes[mode].append(time.monotonic() - started)
+                output = status_data.get("output")
+                print(f"✅ Replicate succeeded! Output: {output}")
+                return output
+            elif status == "failed":
+                error = status_data.get('error', 'Unknown error')
+                print(f"❌ Replicate failed: {error}")
+                return None
+            else:
+                print("❌ Replicate prediction canceled")
+                return None
+                    
         except Exception as e:
             print(f"❌ Replicate error: {e}")
             import traceback
             traceback.print_exc()
             return None
     
+    async def fetch_stem(self, url: str, output_path: Path, retries: int = 0) -> Dict:
+        """
+        Descarga un stem reintentando errores transitorios (red, 5xx, 429)
+
+        Returns:
+            Dict con ok, attempts, seconds, bytes y error
+        """
+        start = time.monotonic()
+        error = None
+        for attempt in range(1, retries + 2):
+            try:
+                print(f"⬇️ Downloading stem from: {url}" + (f" (attempt {attempt})" if attempt > 1 else ""))
+                stats = await stream_to_file(
+                    url,
+                    output_path,
+                    timeout=120,
+                    max_bytes=config.MAX_STEM_DOWNLOAD_BYTES
+                )
+                size_mb = stats["bytes"] / (1024 * 1024)
+                print(f"✅ Downloaded stem to: {output_path} ({size_mb:.2f} MB)")
+                return {
+                    "ok": True,
+                    "attempts": attempt,
+                    "seconds": time.monotonic() - start,
+                    "bytes": stats["bytes"],
+                    "error": None,
+                }
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                error = f"HTTP {status}"
+                print(f"❌ Failed to download stem: {status}")
+                if status < 500 and status != 429:
+                    break
+            except DownloadTooLargeError as e:
+                error = str(e)
+                print(f"❌ Error downloading stem: {e}")
+                break
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"❌ Error downloading stem: {e}")
+
+            if attempt <= retries:
+                await asyncio.sleep(config.STEM_DOWNLOAD_RETRY_DELAY * 2 ** (attempt - 1))
+
+        return {
+            "ok": False,
+            "attempts": attempt,
+            "seconds": time.monotonic() - start,
+            "bytes": 0,
+            "error": error,
+        }
+
     async def download_stem(self, url: str, output_path: Path) -> bool:
         """Download a stem file from URL"""
-        try:
-            print(f"⬇️ Downloading stem from: {url}")
-            async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
-                response = await client.get(url)
-                if response.status_code == 200:
-                    output_path.parent.mkdir(parents=True, exist_ok=True)
-                    output_path.write_bytes(response.content)
-                    size_mb = len(response.content) / (1024 * 1024)
-                    print(f"✅ Downloaded stem to: {output_path} ({size_mb:.2f} MB)")
-                    return True
-                else:
-                    print(f"❌ Failed to download stem: {response.status_code}")
-                    return False
-        except Exception as e:
-            print(f"❌ Error downloading stem: {e}")
-            return False
-
+        return (await self.fetch_stem(url, output_path))["ok"]
 
 replicate_service = ReplicateService()
@@ -0,0 +1,311 @@
+"""
+Backends de separación de stems
+
+Todos exponen la misma interfaz: separate() deja los stems en
+output_dir/{stem}.mp3 y devuelve la lista de stems generados (y fallidos)
+con sus tiempos. Se elige uno por despliegue con SEPARATION_BACKEND:
+
+- replicate: Demucs en GPU de Replicate (de pago, con ida y vuelta por red)
+- local: Demucs en CPU en un pool de procesos que mantiene el modelo cargado
+  entre separaciones (requiere `pip install demucs`)
+"""
+
+import asyncio
+import importlib.util
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional
+
+import config
+import demucs_worker
+from blocking_executor import BlockingExecutor
+from replicate_service import replicate_service
+
+
+class SeparationError(Exception):
+    """La separación falló; el mensaje se puede mostrar al usuario"""
+
+
+class SeparationBackend:
+    name = "base"
+
+    def is_configured(self) -> bool:
+        raise NotImplementedError
+
+    def model_id(self, two_stems: bool) -> str:
+        """Identifica el modelo que produce los stems (parte de la clave de la caché)"""
+        raise NotImplementedError
+
+    async def separate(
+        self,
+        file_id: str,
+        input_file: Path,
+        two_stems: bool,
+        output_dir: Path,
+        content_hash: Optional[str] = None,
+    ) -> Dict:
+        """
+        Args:
+            content_hash: Hash del audio, si ya se conoce (permite reutilizar subidas)
+
+        Returns:
+            {"stems": [...], "failed_stems": [...], "separation_seconds", "download_seconds"}
+        """
+        raise NotImplementedError
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, "configured": self.is_configured()}
+
+
+class ReplicateSeparationBackend(SeparationBackend):
+    name = "replicate"
+
+    def is_configured(self) -> bool:
+        return replicate_service.is_configured()
+
+    def model_id(self, two_stems: bool) -> str:
+        return replicate_service.model_id
+
+    async def download_stems(self, file_id: str, stem_urls: dict, output_dir: Path) -> Dict:
+        """
+        Descarga los stems en paralelo (hasta STEM_DOWNLOAD_CONCURRENCY a la vez)
+        con reintentos por stem. Un stem que falla no tumba a los demás.
+        """
+        semaphore = asyncio.Semaphore(config.STEM_DOWNLOAD_CONCURRENCY)
+
+        async def fetch(stem_name: str, stem_url: str) -> dict:
+            async with semaphore:
+                stats = await replicate_service.fetch_stem(
+                    stem_url,
+                    output_dir / f"{stem_name}.mp3",
+                    retries=config.STEM_DOWNLOAD_RETRIES
+                )
+            return {"name": stem_name, **stats}
+
+        start = time.monotonic()
+        results = await asyncio.gather(*(
+            fetch(stem_name, stem_url)
+            for stem_name, stem_url in stem_urls.items()
+            if stem_url and isinstance(stem_url, str) and stem_url.startswith('http')
+        ))
+
+        stems = []
+        failed = []
+        for r in results:
+            timing = {"seconds": round(r["seconds"], 2), "attempts": r["attempts"]}
+            if r["ok"]:
+                stems.append({
+                    "name": r["name"],
+                    "file_id": f"{file_id}/{r['name']}.mp3",
+                    "bytes": r["bytes"],
+                    **timing
+                })
+            else:
+                failed.append({"name": r["name"], "error": r["error"], **timing})
+
+        return {
+            "stems": stems,
+            "failed_stems": failed,
+            "download_seconds": round(time.monotonic() - start, 2),
+        }
+
+    async def separate(
+        self,
+        file_id: str,
+        input_file: Path,
+        two_stems: bool,
+        output_dir: Path,
+        content_hash: Optional[str] = None,
+    ) -> Dict:
+        print("☁️ Separando con Replicate API (Cloud GPU)...")
+
+        # Subir el audio desde este worker (sin que Replicate tenga que volver a pedirlo)
+        audio_url = None
+        if config.REPLICATE_INPUT_MODE == "upload":
+            audio_url = await replicate_service.upload_file(input_file, content_hash)
+
+        if audio_url is None:
+            # URL pública del archivo de audio
+            backend_url = os.getenv('BACKEND_URL', 'https://youtube-steams-backend.onrender.com')
+            audio_url = f"{backend_url}/api/download-file/{file_id}"
+        print(f"📎 Audio URL: {audio_url}")
+
+        start = time.monotonic()
+        result = await replicate_service.separate_stems(
+            audio_url=audio_url,
+            two_stems=two_stems
+        )
+
+        if not result:
+            raise SeparationError("Error en la separación de stems. Intenta de nuevo.")
+
+        print(f"✅ Replicate returned: {result}")
+        separation_seconds = time.monotonic() - start
+
+        # Descargar los stems del resultado
+        separation = await self.download_stems(file_id, result, output_dir)
+
+        if not separation["stems"]:
+            raise SeparationError("No se pudieron descargar los stems generados.")
+
+        separation["separation_seconds"] = round(separation_seconds, 2)
+        return separation
+
+
+class LocalDemucsBackend(SeparationBackend):
+    name = "local"
+
+    def __init__(
+        self,
+        workers: int = 1,
+        jobs: int = 0,
+        segment: float = 7,
+        bitrate: int = 320,
+        model_fast: str = "htdemucs",
+        model_full: str = "htdemucs_ft",
+    ):
+        """
+        Args:
+            workers: Procesos del pool (separaciones simultáneas)
+            jobs: Workers de Demucs por separación (como `demucs -j`); con 0,
+                los cores se reparten entre los procesos del pool vía torch
+            segment: Segundos por segmento (memoria vs velocidad)
+            bitrate: kbps de los mp3 generados
+            model_fast / model_full: Modelos para 2 y 4 stems
+        """
+        self.workers = workers
+        self.jobs = jobs
+        self.segment = segment
+        self.bitrate = bitrate
+        self.model_fast = model_fast
+        self.model_full = model_full
+        threads = jobs or max(1, (os.cpu_count() or 1) // workers)
+        # "spawn": torch no es seguro tras fork y el worker no necesita el estado del servidor
+        self.executor = BlockingExecutor(
+            kind="process",
+            max_workers=workers,
+            initializer=demucs_worker.init_worker,
+            initargs=((model_fast,), threads),
+            start_method="spawn"
+        )
+        self._warm_task = None
+
+        # Estadísticas
+        self.separations = 0
+        self.failures = 0
+        self.total_seconds = 0.0
+
+    def is_configured(self) -> bool:
+        return all(importlib.util.find_spec(m) is not None for m in ("torch", "demucs"))
+
+    def model_name(self, two_stems: bool) -> str:
+        return self.model_fast if two_stems else self.model_full
+
+    def model_id(self, two_stems: bool) -> str:
+        return f"local:{self.model_name(two_stems)}"
+
+    async def _warm(self):
+        """Arranca todos los workers (cada uno carga el modelo rápido en su initializer)"""
+        try:
+            start = time.monotonic()
+            await asyncio.gather(*(self.executor.run(demucs_worker.ready) for _ in range(self.workers)))
+            print(f"✅ Demucs pool warm ({self.workers} workers, {time.monotonic() - start:.1f}s)")
+        except Exception as e:
+            print(f"⚠️ Demucs pool warm-up failed: {e}")
+
+    def start(self):
+        if self.is_configured() and self._warm_task is None:
+            self._warm_task = asyncio.create_task(self._warm())
+        elif not self.is_configured():
+            print("⚠️ SEPARATION_BACKEND=local pero demucs/torch no están instalados")
+
+    def stop(self):
+        if self._warm_task is not None:
+            self._warm_task.cancel()
+            self._warm_task = None
+        self.executor.shutdown()
+
+    async def separate(
+        self,
+        file_id: str,
+        input_file: Path,
+        two_stems: bool,
+        output_dir: Path,
+        content_hash: Optional[str] = None,
+    ) -> Dict:
+        model_name = self.model_name(two_stems)
+        print(f"🖥️ Separando localmente con Demucs ({model_name}, CPU)...")
+
+        try:
+            result = await self.executor.run(
+                demucs_worker.separate,
+                str(input_file),
+                str(output_dir),
+                model_name,
+                two_stems,
+                self.segment,
+                self.jobs,
+                self.bitrate
+            )
+        except BrokenProcessPool:
+            self.failures += 1
+            raise SeparationError("El proceso de separación se detuvo (¿sin memoria?). Intenta de nuevo.")
+        except Exception as e:
+            self.failures += 1
+            print(f"❌ Local Demucs error: {e}")
+            raise SeparationError("Error en la separación de stems. Intenta de nuevo.")
+
+        self.separations += 1
+        self.total_seconds += result["seconds"]
+        return {
+            "stems": [
+                {
+                    "name": name,
+                    "file_id": f"{file_id}/{name}.mp3",
+                    "bytes": (output_dir / f"{name}.mp3").stat().st_size,
+                }
+                for name in result["stems"]
+            ],
+            "failed_stems": [],
+            "separation_seconds": round(result["seconds"], 2),
+            "download_seconds": 0.0,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            **super().stats(),
+            "workers": self.workers,
+            "segment": self.segment,
+            "jobs": self.jobs,
+            "separations": self.separations,
+            "failures": self.failures,
+            "avg_seconds": round(self.total_seconds / self.separations, 1) if self.separations else 0.0,
+            "executor": self.executor.stats(),
+        }
+
+
+def create_backend(name: str) -> SeparationBackend:
+    if name == "local":
+        return LocalDemucsBackend(
+            workers=config.DEMUCS_WORKERS,
+            jobs=config.DEMUCS_JOBS,
+            segment=config.DEMUCS_SEGMENT,
+            bitrate=int(config.DEMUCS_BITRATE),
+            model_fast=config.DEMUCS_MODEL_FAST,
+            model_full=config.DEMUCS_MODEL_FULL
+        )
+    if name == "replicate":
+        return ReplicateSeparationBackend()
+    raise ValueError(f"Backend de separación no soportado: {name}")
+
+
+# Instancia global
+separation_backend = create_backend(config.SEPARATION_BACKEND)
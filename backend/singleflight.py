@@ -0,0 +1,76 @@
+"""
+Single-flight: agrupa operaciones idénticas concurrentes
+
+Si llegan varias peticiones con la misma clave mientras la primera sigue
+en curso, todas esperan esa misma operación y comparten su resultado
+(o su error) en lugar de repetir la descarga / separación.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+        # Estadísticas
+        self.leaders = 0  # Operaciones realmente ejecutadas
+        self.shared = 0  # Llamadas que reutilizaron una operación en curso
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def join(self, key: Hashable) -> Optional[Awaitable[Any]]:
+        """
+        Resultado de la operación en curso para key (None si no hay ninguna).
+        A diferencia de do(), nunca arranca una operación nueva.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            return None
+        self.shared += 1
+        print(f"🔗 {self.name}: reutilizando operación en curso para {key}")
+        return asyncio.shield(task)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta func() una sola vez por clave entre llamadas concurrentes.
+
+        Returns:
+            (resultado, shared) - shared=True si se reutilizó una operación en curso
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.shared += 1
+            print(f"🔗 {self.name}: reutilizando operación en curso para {key}")
+            # shield: si este llamador se cancela, la operación compartida sigue
+            return await asyncio.shield(task), True
+
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        self.leaders += 1
+
+        def _done(t: asyncio.Task):
+            if self._inflight.get(key) is t:
+                del self._inflight[key]
+            # Marcar la excepción como recuperada aunque nadie quede esperando
+            if not t.cancelled():
+                t.exception()
+
+        task.add_done_callback(_done)
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "shared": self.shared,
+        }
+
+
+# Instancias globales
+download_flight = SingleFlight("downloads")
+stems_flight = SingleFlight("stems")
+video_info_flight = SingleFlight("video-info")
@@ -0,0 +1,70 @@
+"""
+Manifest de stems por file_id
+
+El manifest ({stem: {path, bytes, mtime_ns, crc32}}) se guarda en
+file_store al terminar una separación: /api/download-stem resuelve el
+archivo con una sola búsqueda por clave, sin recorrer directorios.
+
+El CRC32 y el tamaño de cada stem permiten armar el ZIP de todos los stems
+(zip_stream.StoredZip) con las cabeceras y el Content-Length conocidos antes
+de leer los datos.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+import config
+from zip_stream import crc32_file
+
+
+def _is_current(entry: Dict, stat_result) -> bool:
+    return (
+        "crc32" in entry
+        and entry.get("bytes") == stat_result.st_size
+        and entry.get("mtime_ns") == stat_result.st_mtime_ns
+    )
+
+
+def build_manifest(file_id: str, names: Iterable[str], previous: Optional[Dict] = None) -> Dict[str, Dict]:
+    """
+    Manifest de los stems de file_id (bloqueante: lee los archivos para el CRC).
+    Las entradas de `previous` que siguen coincidiendo con el disco se reutilizan.
+    """
+    previous = previous or {}
+    manifest = {}
+    for name in names:
+        relative = f"{file_id}/{name}.mp3"
+        path = config.STEMS_DIR / relative
+        try:
+            stat_result = path.stat()
+        except FileNotFoundError:
+            continue
+        entry = previous.get(name, {})
+        if not _is_current(entry, stat_result):
+            entry = {
+                "path": relative,
+                "bytes": stat_result.st_size,
+                "mtime_ns": stat_result.st_mtime_ns,
+                "crc32": crc32_file(path),
+            }
+        manifest[name] = entry
+    return manifest
+
+
+def manifest_is_current(manifest: Dict[str, Dict]) -> bool:
+    """El manifest coincide con los archivos en disco (tamaño y mtime)"""
+    for entry in manifest.values():
+        try:
+            if not _is_current(entry, (config.STEMS_DIR / entry["path"]).stat()):
+                return False
+        except (KeyError, FileNotFoundError):
+            return False
+    return bool(manifest)
+
+
+def stem_path(file_id: str, stem_name: str, manifest: Dict[str, Dict]) -> Path:
+    """Ruta del stem según el manifest (o la ruta estándar si no hay manifest)"""
+    entry = manifest.get(stem_name)
+    if entry and entry.get("path"):
+        return config.STEMS_DIR / entry["path"]
+    return config.STEMS_DIR / file_id / f"{stem_name}.mp3"
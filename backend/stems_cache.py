@@ -0,0 +1,215 @@
+"""
+Caché de separaciones de stems
+
+Guarda los stems generados en STEMS_DIR/.cache/{key}/, con la clave
+calculada a partir del hash del contenido del audio de entrada, el modo
+(2 o 4 stems) y el modelo. Si otro file_id (u otra descarga del mismo video)
+pide la misma separación, los stems se enlazan (hardlink) a
+STEMS_DIR/{file_id}/ al instante, sin llamar a Replicate ni gastar GPU.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import config
+
+MANIFEST = "manifest.json"
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 del contenido del archivo (bloqueante: llamar desde un executor)"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_or_copy(source: Path, target: Path):
+    """Hardlink (mismo disco) o copia si el enlace no es posible"""
+    target.unlink(missing_ok=True)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+class StemsCache:
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        """
+        Args:
+            root: Directorio de la caché (dentro de STEMS_DIR)
+            max_bytes: Tamaño máximo; se expulsan las separaciones menos usadas
+            enabled: Si es False, get() siempre falla y put() no hace nada
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        # {key: manifest} en orden LRU
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.total_bytes = 0
+        self._loaded = False
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.gpu_seconds_saved = 0.0
+
+    @staticmethod
+    def make_key(content_hash: str, two_stems: bool, model: str) -> str:
+        mode = "2stems" if two_stems else "4stems"
+        return hashlib.sha256(f"{content_hash}:{mode}:{model}".encode()).hexdigest()[:32]
+
+    def _load(self):
+        """Reconstruye el índice desde los manifest en disco (una vez)"""
+        if self._loaded or not self.enabled:
+            return
+        self._loaded = True
+        if not self.root.exists():
+            return
+        manifests = []
+        for entry_dir in self.root.iterdir():
+            if entry_dir.name.startswith("."):
+                # put() interrumpido
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            try:
+                manifest = json.loads((entry_dir / MANIFEST).read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                # Entrada a medio escribir o corrupta
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            manifests.append((entry_dir.name, manifest))
+        for key, manifest in sorted(manifests, key=lambda kv: kv[1].get("last_access", 0)):
+            self.entries[key] = manifest
+            self.total_bytes += manifest.get("bytes", 0)
+        if self.entries:
+            print(f"✅ Stems cache loaded ({len(self.entries)} separations)")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Manifest de la separación cacheada (y la marca como usada) o None"""
+        if not self.enabled:
+            return None
+        self._load()
+
+        manifest = self.entries.get(key)
+        if manifest is not None and not all(
+            (self.root / key / f"{stem}.mp3").exists() for stem in manifest["stems"]
+        ):
+            self._remove(key)
+            manifest = None
+
+        if manifest is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.gpu_seconds_saved += manifest.get("separation_seconds", 0.0)
+        manifest["last_access"] = time.time()
+        self.entries.move_to_end(key)
+        self._write_manifest(key, manifest)
+        return manifest
+
+    def materialize(self, key: str, output_dir: Path) -> List[str]:
+        """Enlaza los stems cacheados en output_dir; devuelve sus nombres"""
+        manifest = self.entries[key]
+        output_dir.mkdir(parents=True, exist_ok=True)
+        for stem in manifest["stems"]:
+            _link_or_copy(self.root / key / f"{stem}.mp3", output_dir / f"{stem}.mp3")
+        return list(manifest["stems"])
+
+    def put(self, key: str, source_dir: Path, stems: List[str], separation_seconds: float = 0.0, **info):
+        """Guarda una separación completa (los archivos se enlazan, no se copian)"""
+        if not self.enabled or not stems:
+            return
+        self._load()
+
+        entry_dir = self.root / key
+        temp_dir = self.root / f".{key}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        temp_dir.mkdir(parents=True)
+        try:
+            size = 0
+            for stem in stems:
+                source = source_dir / f"{stem}.mp3"
+                _link_or_copy(source, temp_dir / f"{stem}.mp3")
+                size += source.stat().st_size
+            now = time.time()
+            manifest = {
+                "stems": list(stems),
+                "bytes": size,
+                "separation_seconds": separation_seconds,
+                "created": now,
+                "last_access": now,
+                **info,
+            }
+            (temp_dir / MANIFEST).write_text(json.dumps(manifest), encoding='utf-8')
+            if key in self.entries:
+                self._remove(key)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(temp_dir, entry_dir)
+        except Exception as e:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            print(f"⚠️ Could not cache stems {key}: {e}")
+            return
+
+        self.entries[key] = manifest
+        self.total_bytes += size
+        self.enforce()
+
+    def _write_manifest(self, key: str, manifest: Dict):
+        try:
+            path = self.root / key / MANIFEST
+            temp_path = path.with_suffix('.tmp')
+            temp_path.write_text(json.dumps(manifest), encoding='utf-8')
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    def _remove(self, key: str):
+        manifest = self.entries.pop(key, None)
+        if manifest is not None:
+            self.total_bytes -= manifest.get("bytes", 0)
+        shutil.rmtree(self.root / key, ignore_errors=True)
+
+    def enforce(self) -> int:
+        """Expulsa las separaciones menos usadas hasta quedar bajo max_bytes"""
+        self._load()
+        evicted = 0
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            print(f"🧹 Evicting cached stems: {key}")
+            self._remove(key)
+            self.evictions += 1
+            evicted += 1
+        return evicted
+
+    def stats(self) -> Dict:
+        self._load()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "gpu_seconds_saved": round(self.gpu_seconds_saved, 1),
+        }
+
+
+# Instancia global
+stems_cache = StemsCache(
+    root=config.STEMS_DIR / ".cache",
+    max_bytes=config.STEMS_CACHE_MAX_BYTES,
+    enabled=config.STEMS_CACHE_ENABLED
+)
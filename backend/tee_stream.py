@@ -0,0 +1,220 @@
+"""
+Tee-streaming de descargas en curso
+
+Mientras Cobalt escribe el archivo (stream_to_file), los bytes ya escritos
+se pueden enviar al cliente: cada lector abre el archivo temporal y lo va
+siguiendo (tail) a medida que crece. Un cliente que llega tarde al mismo
+file_id empieza a leer desde el principio del archivo parcial.
+
+Fallos a mitad de stream:
+- Si el intento que se estaba sirviendo se abandona (Cobalt falla o pierde
+  el hedge) después de enviar la respuesta, la conexión se corta: el cliente
+  ve una descarga incompleta y puede reintentar con /api/download-file/{file_id}
+  (con Range), que tendrá el archivo del backend que haya ganado.
+- Si el intento se abandona antes de empezar a servir, el lector espera al
+  siguiente intento (o al archivo final de yt-dlp).
+"""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import AsyncIterator, Dict, Hashable, Optional
+
+TEE_PENDING = "pending"  # Todavía no hay bytes
+TEE_STREAMING = "streaming"  # Escribiendo el archivo temporal
+TEE_DONE = "done"  # Archivo final completo
+TEE_FAILED = "failed"
+
+
+class TeeStreamError(Exception):
+    """La descarga que se estaba sirviendo se interrumpió"""
+
+
+class TeeDownload:
+    def __init__(self, file_id: str, kind: str, key: Optional[Hashable] = None):
+        self.file_id = file_id
+        self.kind = kind  # audio / video
+        self.key = key
+        self.state = TEE_PENDING
+        self.path: Optional[Path] = None
+        self.written = 0
+        self.total: Optional[int] = None
+        self.error: Optional[str] = None
+        self.attempt = 0  # Cambia con cada archivo distinto: los lectores detectan el cambio
+        self._inode: Optional[int] = None
+        self.readers = 0
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    # --- Escritor ---
+
+    def start(self, path: Path, total: Optional[int]):
+        """Empieza un intento de escritura en `path` (archivo temporal)"""
+        self.attempt += 1
+        self.state = TEE_STREAMING
+        self.path = Path(path)
+        self._inode = os.stat(path).st_ino
+        self.total = total
+        self.written = 0
+        self._notify()
+
+    def advance(self, written: int):
+        """Bytes ya escritos y visibles en disco (después de flush)"""
+        self.written = written
+        self._notify()
+
+    def abort_attempt(self, error: str):
+        """El intento actual falló; puede haber otro (fallback / hedge)"""
+        if self.state == TEE_STREAMING:
+            self.state = TEE_PENDING
+            self.path = None
+            self.error = error
+            self._notify()
+
+    def finish(self, path: Path):
+        """Archivo final completo"""
+        stat_result = os.stat(path)
+        # El intento servido terminó renombrado a `path` (mismo inode): los lectores siguen
+        if self.state != TEE_STREAMING or stat_result.st_ino != self._inode:
+            self.attempt += 1
+        self.state = TEE_DONE
+        self.path = Path(path)
+        self.written = stat_result.st_size
+        self.total = self.written
+        self._notify()
+
+    def fail(self, error: str):
+        self.state = TEE_FAILED
+        self.error = error
+        self._notify()
+
+    # --- Lectores ---
+
+    async def wait_ready(self):
+        """Espera a que haya algo que servir (o a que falle)"""
+        while self.state == TEE_PENDING:
+            await self._changed.wait()
+
+    async def open_reader(self) -> "TeeReader":
+        """
+        Espera a que haya algo que servir y abre el intento actual. El lector
+        guarda el intento y su total juntos: lo que se anuncie como
+        Content-Length es el tamaño de lo que va a leer.
+        """
+        await self.wait_ready()
+        if self.state == TEE_FAILED:
+            raise TeeStreamError(self.error or "Download failed")
+        # Abrir y capturar el intento en el mismo paso (sin await en medio)
+        return TeeReader(self)
+
+    async def iter_bytes(self, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        """Sigue el archivo desde el principio hasta que termina de escribirse"""
+        reader = await self.open_reader()
+        async for chunk in reader.iter_bytes(chunk_size):
+            yield chunk
+
+    def to_dict(self) -> Dict:
+        return {
+            "file_id": self.file_id,
+            "kind": self.kind,
+            "state": self.state,
+            "written": self.written,
+            "total": self.total,
+            "readers": self.readers,
+        }
+
+
+class TeeReader:
+    """Un cliente siguiendo un intento concreto de una descarga"""
+
+    def __init__(self, tee: TeeDownload):
+        self.tee = tee
+        self.attempt = tee.attempt
+        self.total = tee.total  # Tamaño anunciado por este intento (None si no se conoce)
+        self.sent = 0
+        self._file = open(tee.path, "rb")
+        self._closed = False
+        tee.readers += 1
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self.tee.readers -= 1
+            self._file.close()
+
+    async def iter_bytes(self, chunk_size: int = 256 * 1024) -> AsyncIterator[bytes]:
+        """Bytes del intento a medida que se escriben; TeeStreamError si el intento se abandona"""
+        tee = self.tee
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if tee.attempt != self.attempt or tee.state in (TEE_FAILED, TEE_PENDING):
+                    raise TeeStreamError(tee.error or "Download interrupted")
+
+                available = tee.written
+                while self.sent < available:
+                    chunk = await loop.run_in_executor(
+                        None, self._file.read, min(chunk_size, available - self.sent)
+                    )
+                    if not chunk:
+                        break
+                    self.sent += len(chunk)
+                    yield chunk
+
+                if tee.state == TEE_DONE and self.sent >= tee.written:
+                    return
+
+                changed = tee._changed
+                if tee.written == available and tee.attempt == self.attempt and tee.state == TEE_STREAMING:
+                    await changed.wait()
+        finally:
+            self.close()
+
+
+class TeeRegistry:
+    """Descargas en curso que se pueden seguir, por file_id y por clave de descarga"""
+
+    def __init__(self):
+        self.downloads: Dict[str, TeeDownload] = {}
+        self.by_key: Dict[Hashable, TeeDownload] = {}
+
+        # Estadísticas
+        self.streams = 0
+        self.late_joins = 0
+        self.interrupted = 0
+
+    def open(self, file_id: str, kind: str, key: Optional[Hashable] = None) -> TeeDownload:
+        tee = TeeDownload(file_id, kind, key)
+        self.downloads[file_id] = tee
+        if key is not None:
+            self.by_key[key] = tee
+        return tee
+
+    def get(self, file_id: str) -> Optional[TeeDownload]:
+        return self.downloads.get(file_id)
+
+    def for_key(self, key: Hashable) -> Optional[TeeDownload]:
+        return self.by_key.get(key)
+
+    def close(self, tee: TeeDownload):
+        """Deja de publicar la descarga (los lectores ya conectados siguen leyendo)"""
+        if self.downloads.get(tee.file_id) is tee:
+            del self.downloads[tee.file_id]
+        if tee.key is not None and self.by_key.get(tee.key) is tee:
+            del self.by_key[tee.key]
+
+    def stats(self) -> Dict:
+        return {
+            "active": len(self.downloads),
+            "readers": sum(t.readers for t in self.downloads.values()),
+            "streams": self.streams,
+            "late_joins": self.late_joins,
+            "interrupted": self.interrupted,
+        }
+
+
+# Instancia global
+tee_streams = TeeRegistry()
@@ -0,0 +1,26 @@
+"""
+Configuración común de los tests
+
+El backend guarda estado en backend/*.db y en downloads/: los tests apuntan
+todo a un directorio temporal antes de importar main.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_state_dir = tempfile.mkdtemp(prefix="youtube-steams-tests-")
+os.environ.setdefault("METADATA_DB", os.path.join(_state_dir, "metadata.db"))
+os.environ.setdefault("RATE_LIMIT_DB", os.path.join(_state_dir, "rate_limits.db"))
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
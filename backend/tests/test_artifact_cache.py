@@ -0,0 +1,73 @@
+"""
+Caché de artefactos sobre file_store: búsqueda por video_id, visible entre
+workers (misma base SQLite) y sin borrar archivos por su cuenta
+"""
+
+import uuid
+
+import pytest
+
+import config
+from artifact_cache import ArtifactCache
+from file_store import FileMetadataStore, file_store
+
+
+@pytest.fixture
+def cache():
+    return ArtifactCache()
+
+
+def downloaded(tmp_path, video_id, kind="audio", quality="320", store=file_store):
+    file_id = str(uuid.uuid4())
+    path = tmp_path / f"{file_id}.mp3"
+    path.write_bytes(b"audio")
+    store.put(file_id, title="t", filename="t.mp3", type=kind, size=5, path=str(path), video_id=video_id)
+    return file_id, path
+
+
+def test_hit_requires_quality_mark(cache, tmp_path):
+    video_id = uuid.uuid4().hex[:11]
+    file_id, _ = downloaded(tmp_path, video_id)
+    # Sin quality (p. ej. una descarga que falló a medias) no se reutiliza
+    assert cache.get(video_id, "audio", "320") is None
+
+    cache.put(file_id, "320")
+    entry = cache.get(video_id, "audio", "320")
+    assert entry["file_id"] == file_id and entry["filename"] == "t.mp3"
+    assert cache.get(video_id, "video", "320") is None
+    assert cache.get(video_id, "audio", "128") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_missing_file_drops_row(cache, tmp_path):
+    video_id = uuid.uuid4().hex[:11]
+    file_id, path = downloaded(tmp_path, video_id)
+    cache.put(file_id, "320")
+    path.unlink()
+
+    assert cache.get(video_id, "audio", "320") is None
+    assert file_store.get(file_id) is None
+    assert cache.stats()["stale"] == 1
+
+
+def test_entries_from_other_workers_are_visible(cache, tmp_path):
+    video_id = uuid.uuid4().hex[:11]
+    other_worker = FileMetadataStore(config.METADATA_DB)
+    file_id, _ = downloaded(tmp_path, video_id, store=other_worker)
+    other_worker.put(file_id, quality="320")
+    other_worker.flush()
+
+    assert cache.get(video_id, "audio", "320")["file_id"] == file_id
+
+
+def test_newest_download_wins_and_nothing_is_deleted(cache, tmp_path):
+    video_id = uuid.uuid4().hex[:11]
+    paths = []
+    for _ in range(3):
+        file_id, path = downloaded(tmp_path, video_id)
+        cache.put(file_id, "320")
+        file_store.flush()
+        paths.append(path)
+
+    assert cache.get(video_id, "audio", "320")["path"] == str(paths[-1])
+    assert all(path.exists() for path in paths)
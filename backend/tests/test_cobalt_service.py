@@ -0,0 +1,78 @@
+"""
+CobaltService: solo los fallos de la instancia (5xx, 429, red) abren su
+circuito; los 4xx por el link pedido vuelven al llamador
+"""
+
+import httpx
+import pytest
+
+import cobalt_service
+from cobalt_health import CIRCUIT_CLOSED, CIRCUIT_OPEN
+from cobalt_service import CobaltService
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def service(monkeypatch):
+    def use(handler):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(cobalt_service.http_clients, "get", lambda name="default": client)
+        service = CobaltService()
+        return service
+    return use
+
+
+def states(service):
+    return {h.state for h in service.health.instances.values()}
+
+
+async def test_bad_links_do_not_open_circuits(service):
+    calls = []
+
+    def handler(request):
+        calls.append(str(request.url))
+        return httpx.Response(400, json={"status": "error", "error": {"code": "error.api.link.invalid"}})
+
+    cobalt = service(handler)
+    for _ in range(cobalt.health.failure_threshold + 2):
+        result = await cobalt.get_download_url("https://youtube.com/watch?v=bad")
+        assert result["status"] == "error"
+        assert result["error"]["code"] == "error.api.link.invalid"
+        assert result["error"]["message"] == "error.api.link.invalid"
+
+    assert states(cobalt) == {CIRCUIT_CLOSED}
+    assert all(h.failures == 0 for h in cobalt.health.instances.values())
+    # El error del link se devuelve sin probar el resto de instancias
+    assert len(calls) == cobalt.health.failure_threshold + 2
+
+
+async def test_auth_errors_try_next_instance_without_failure(service):
+    def handler(request):
+        if request.url.host == "api.cobalt.best":
+            return httpx.Response(200, json={"status": "tunnel", "url": "https://x/y", "filename": "a.mp3"})
+        return httpx.Response(401, json={"status": "error", "error": {"code": "error.api.auth.jwt.missing"}})
+
+    cobalt = service(handler)
+    result = await cobalt.get_download_url("https://youtube.com/watch?v=ok")
+    assert result["status"] == "tunnel"
+    assert all(h.failures == 0 for h in cobalt.health.instances.values())
+
+
+@pytest.mark.parametrize("status", [500, 502, 429])
+async def test_server_errors_open_circuits(service, status):
+    cobalt = service(lambda request: httpx.Response(status, text="down"))
+    for _ in range(cobalt.health.failure_threshold):
+        result = await cobalt.get_download_url("https://youtube.com/watch?v=x")
+        assert result["error"]["code"] == "service.unavailable"
+    assert states(cobalt) == {CIRCUIT_OPEN}
+
+
+async def test_connect_errors_open_circuits(service):
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    cobalt = service(handler)
+    for _ in range(cobalt.health.failure_threshold):
+        await cobalt.get_download_url("https://youtube.com/watch?v=x")
+    assert states(cobalt) == {CIRCUIT_OPEN}
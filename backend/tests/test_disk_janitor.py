@@ -0,0 +1,89 @@
+"""
+disk_janitor: lo fijado con pin() no se borra, ni sus archivos de trabajo
+"""
+
+import os
+import time
+import uuid
+
+import pytest
+
+from disk_janitor import DiskJanitor
+
+pytestmark = pytest.mark.anyio
+
+
+def write_old(path, age: float = 7200):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * 100)
+    past = time.time() - age
+    os.utime(path, (past, past))
+    return path
+
+
+@pytest.fixture
+def janitor(tmp_path):
+    return DiskJanitor([tmp_path], max_bytes=10 ** 9, max_age_hours=1, grace_seconds=3600)
+
+
+async def test_expired_files_are_removed(janitor, tmp_path):
+    file_id = str(uuid.uuid4())
+    final = write_old(tmp_path / f"{file_id}.mp3")
+    stray = write_old(tmp_path / f"{uuid.uuid4()}-ytdlp.webm.part")
+
+    await janitor.run_once()
+    assert not final.exists()
+    assert not stray.exists()
+
+
+async def test_pinned_download_keeps_working_files(janitor, tmp_path):
+    file_id = str(uuid.uuid4())
+    working = [
+        write_old(tmp_path / f"{file_id}-ytdlp.webm.part"),
+        write_old(tmp_path / f".{file_id}-cobalt.mp3.abc123.part"),
+        write_old(tmp_path / f"{file_id}.mp3"),
+    ]
+
+    with janitor.pin(file_id):
+        await janitor.run_once()
+        assert all(path.exists() for path in working)
+
+    await janitor.run_once()
+    assert not any(path.exists() for path in working)
+
+
+async def test_recent_access_in_store_protects_old_files(janitor, tmp_path):
+    from file_store import file_store
+
+    file_ids = [str(uuid.uuid4()) for _ in range(3)]
+    paths = [write_old(tmp_path / f"{file_id}.mp3") for file_id in file_ids]
+    now = time.time()
+    for file_id, path in zip(file_ids, paths):
+        # Mismo last_access en todas: la paginación no debe saltarse ninguna
+        file_store.put(file_id, path=str(path), last_access=now)
+    janitor.batch_size = 1
+
+    await janitor.run_once()
+    assert all(path.exists() for path in paths)
+
+    file_store.delete(file_ids)
+    await janitor.run_once()
+    assert not any(path.exists() for path in paths)
+
+
+def test_least_recently_used_pages_through_ties(tmp_path):
+    from file_store import FileMetadataStore
+
+    store = FileMetadataStore(tmp_path / "metadata.db")
+    for i in range(5):
+        store.put(f"f{i}", last_access=100.0 if i < 4 else 50.0)
+
+    seen = []
+    after, after_id = 0.0, ""
+    while True:
+        rows = store.least_recently_used(limit=2, after=after, after_id=after_id)
+        if not rows:
+            break
+        seen += [row["file_id"] for row in rows]
+        after, after_id = rows[-1]["last_access"], rows[-1]["file_id"]
+    assert seen == ["f4", "f0", "f1", "f2", "f3"]
@@ -0,0 +1,216 @@
+"""
+Range y GET condicional en las rutas de descarga (RangeFileResponse)
+
+Se usa httpx.AsyncClient con ASGITransport: el TestClient de Starlette
+0.27 no funciona con httpx 0.28.
+"""
+
+import email.utils
+import uuid
+
+import httpx
+import pytest
+
+import main
+
+pytestmark = pytest.mark.anyio
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes, cada offset es reconocible
+SIZE = len(CONTENT)
+
+
+@pytest.fixture
+def file_id(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "DOWNLOADS_DIR", tmp_path)
+    file_id = uuid.uuid4().hex
+    (tmp_path / f"{file_id}.mp3").write_bytes(CONTENT)
+    return file_id
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+def parse_multipart(response: httpx.Response):
+    """[(Content-Range, cuerpo)] de una respuesta multipart/byteranges"""
+    content_type = response.headers["content-type"]
+    assert content_type.startswith("multipart/byteranges; boundary=")
+    boundary = content_type.split("boundary=", 1)[1].encode()
+    body = response.content
+    assert body.endswith(b"\r\n--" + boundary + b"--\r\n")
+
+    parts = []
+    for chunk in body.split(b"\r\n--" + boundary)[1:-1]:
+        head, _, data = chunk.partition(b"\r\n\r\n")
+        headers = dict(
+            line.split(": ", 1) for line in head.decode().strip().split("\r\n")
+        )
+        assert headers["Content-Type"] == "audio/mpeg"
+        parts.append((headers["Content-Range"], data))
+    return parts
+
+
+async def test_full_download(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}")
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(SIZE)
+    assert response.headers["etag"].startswith('"')
+
+
+async def test_single_range(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{SIZE}"
+    assert response.headers["content-length"] == "100"
+    assert response.content == CONTENT[100:200]
+
+
+async def test_suffix_range(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": "bytes=-500"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes {SIZE - 500}-{SIZE - 1}/{SIZE}"
+    assert response.content == CONTENT[-500:]
+
+
+async def test_suffix_longer_than_file(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": f"bytes=-{SIZE * 2}"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-{SIZE - 1}/{SIZE}"
+    assert response.content == CONTENT
+
+
+async def test_open_ended_range(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": "bytes=10000-"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10000-{SIZE - 1}/{SIZE}"
+    assert response.content == CONTENT[10000:]
+
+
+async def test_range_end_clamped_to_size(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": f"bytes=10000-{SIZE + 999}"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 10000-{SIZE - 1}/{SIZE}"
+    assert response.content == CONTENT[10000:]
+
+
+async def test_multi_range(client, file_id):
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-9, 5000-5009, -10"}
+    )
+    assert response.status_code == 206
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert parse_multipart(response) == [
+        ("bytes 0-9/%d" % SIZE, CONTENT[0:10]),
+        ("bytes 5000-5009/%d" % SIZE, CONTENT[5000:5010]),
+        ("bytes %d-%d/%d" % (SIZE - 10, SIZE - 1, SIZE), CONTENT[-10:]),
+    ]
+
+
+async def test_overlapping_ranges_are_merged(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99,50-149,150-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-199/{SIZE}"
+    assert response.content == CONTENT[:200]
+
+
+async def test_unsatisfiable_range(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": f"bytes={SIZE}-"})
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{SIZE}"
+    assert response.content == b""
+
+
+async def test_invalid_range_is_ignored(client, file_id):
+    response = await client.get(f"/api/download-file/{file_id}", headers={"Range": "bytes=200-100"})
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+async def test_head(client, file_id):
+    response = await client.head(f"/api/download-file/{file_id}")
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(SIZE)
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.content == b""
+
+
+async def test_head_with_range(client, file_id):
+    response = await client.head(f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-99/{SIZE}"
+    assert response.headers["content-length"] == "100"
+    assert response.content == b""
+
+
+async def test_if_none_match(client, file_id):
+    etag = (await client.head(f"/api/download-file/{file_id}")).headers["etag"]
+
+    response = await client.get(f"/api/download-file/{file_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert "content-length" not in response.headers
+
+    weak = await client.get(f"/api/download-file/{file_id}", headers={"If-None-Match": f'"other", W/{etag}'})
+    assert weak.status_code == 304
+
+    stale = await client.get(f"/api/download-file/{file_id}", headers={"If-None-Match": '"other"'})
+    assert stale.status_code == 200
+    assert stale.content == CONTENT
+
+
+async def test_if_range_matching_etag(client, file_id):
+    etag = (await client.head(f"/api/download-file/{file_id}")).headers["etag"]
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99", "If-Range": etag}
+    )
+    assert response.status_code == 206
+    assert response.content == CONTENT[:100]
+
+
+async def test_if_range_stale_etag(client, file_id):
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99", "If-Range": '"stale"'}
+    )
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+async def test_if_range_dates(client, file_id):
+    last_modified = (await client.head(f"/api/download-file/{file_id}")).headers["last-modified"]
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99", "If-Range": last_modified}
+    )
+    assert response.status_code == 206
+    assert response.content == CONTENT[:100]
+
+    modified = email.utils.parsedate_to_datetime(last_modified).timestamp()
+    stale = email.utils.formatdate(modified - 3600, usegmt=True)
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99", "If-Range": stale}
+    )
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+async def test_replaced_file_changes_etag(client, file_id, tmp_path):
+    etag = (await client.head(f"/api/download-file/{file_id}")).headers["etag"]
+    replacement = tmp_path / "replacement.mp3"
+    replacement.write_bytes(CONTENT[::-1])
+    replacement.replace(tmp_path / f"{file_id}.mp3")
+
+    response = await client.get(
+        f"/api/download-file/{file_id}", headers={"Range": "bytes=0-99", "If-Range": etag}
+    )
+    assert response.status_code == 200
+    assert response.content == CONTENT[::-1]
+
+
+async def test_missing_file(client, file_id):
+    response = await client.get(f"/api/download-file/{uuid.uuid4().hex}")
+    assert response.status_code == 404
@@ -0,0 +1,99 @@
+"""
+Hedger y BlockingExecutor: el percentil no ignora al primario que pierde,
+y el trabajo abandonado en el executor se limpia cuando termina de verdad
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from blocking_executor import BlockingExecutor
+from hedging import PRIMARY, SECONDARY, HedgeError, Hedger
+
+pytestmark = pytest.mark.anyio
+
+
+def no_cleanup():
+    pass
+
+
+async def test_primary_first_byte_is_sampled():
+    hedger = Hedger(enabled=True, default_delay=1.0)
+
+    async def primary(ctx):
+        await asyncio.sleep(0.01)
+        ctx.first_byte()
+        await asyncio.sleep(0.01)
+        return "primary"
+
+    async def secondary(ctx):
+        return "secondary"
+
+    assert await hedger.race(primary, secondary, no_cleanup, no_cleanup) == ("primary", PRIMARY)
+    assert len(hedger.samples) == 1 and hedger.censored == 0
+    assert hedger.samples[0] < 0.5
+
+
+async def test_losing_primary_is_censored_at_race_duration():
+    hedger = Hedger(enabled=True, default_delay=0.05, min_delay=0.0)
+    cleaned = []
+
+    async def primary(ctx):
+        await asyncio.sleep(10)
+
+    async def secondary(ctx):
+        await asyncio.sleep(0.05)
+        return "secondary"
+
+    result = await hedger.race(primary, secondary, lambda: cleaned.append(PRIMARY), no_cleanup)
+    assert result == ("secondary", SECONDARY)
+    assert hedger.censored == 1
+    assert list(hedger.samples) == [pytest.approx(0.1, abs=0.08)]
+    await asyncio.sleep(0.01)  # La limpieza corre cuando el primario termina de cancelarse
+    assert cleaned == [PRIMARY]
+
+
+async def test_failed_race_is_censored():
+    hedger = Hedger(enabled=False)
+
+    async def primary(ctx):
+        raise RuntimeError("cobalt")
+
+    async def secondary(ctx):
+        raise RuntimeError("yt-dlp")
+
+    with pytest.raises(HedgeError):
+        await hedger.race(primary, secondary, no_cleanup, no_cleanup)
+    assert hedger.fallbacks == 1
+    assert hedger.censored == 1 and len(hedger.samples) == 1
+
+
+async def test_abandoned_work_is_cleaned_after_it_finishes():
+    executor = BlockingExecutor(kind="thread", max_workers=1)
+    release = threading.Event()
+    finished = threading.Event()
+    cleaned = threading.Event()
+
+    def work():
+        release.wait(5)
+        finished.set()
+
+    def on_abandoned():
+        assert finished.is_set(), "la limpieza no debe correr antes de que el worker termine"
+        cleaned.set()
+
+    task = asyncio.create_task(executor.run(work, on_abandoned=on_abandoned))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert not cleaned.is_set()
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while not cleaned.is_set() and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert cleaned.is_set()
+    executor.shutdown()
@@ -0,0 +1,156 @@
+"""
+/api/jobs: crear un job, consultar su estado y seguirlo por SSE
+(/api/jobs/{id}/events) con download_media reemplazada por una descarga
+simulada, como en benchmarks/bench_batch.py
+"""
+
+import asyncio
+import json
+import uuid
+
+import httpx
+import pytest
+
+import config
+import main
+from jobs import JobManager
+from rate_limit_store import MemoryRateLimitStore
+from rate_limiter import rate_limiter
+
+pytestmark = pytest.mark.anyio
+
+PAYLOAD = b"ID3" + bytes(2048)
+
+
+@pytest.fixture
+async def downloads(tmp_path, monkeypatch):
+    """main.app con un JobManager propio, cupo limpio y descargas simuladas"""
+    manager = JobManager(workers=2)
+    monkeypatch.setattr(main, "job_manager", manager)
+    monkeypatch.setattr(main, "DOWNLOADS_DIR", tmp_path)
+    monkeypatch.setattr(rate_limiter, "store", MemoryRateLimitStore(rate_limiter.buckets))
+    monkeypatch.setattr(config, "JOB_SSE_HEARTBEAT", 0.05)
+
+    downloads = {"delay": 0.0, "error": None}
+
+    async def fake_download_media(job, video_url, stream_key=None, file_id=None):
+        file_id = file_id or str(uuid.uuid4())
+        job.progress("downloading", downloaded=0, total=len(PAYLOAD))
+        await asyncio.sleep(downloads["delay"])
+        if downloads["error"]:
+            raise RuntimeError(downloads["error"])
+        (tmp_path / f"{file_id}.mp3").write_bytes(PAYLOAD)
+        job.progress("downloading", downloaded=len(PAYLOAD), total=len(PAYLOAD))
+        return {"file_id": file_id, "filename": "song.mp3", "type": job.kind}
+
+    monkeypatch.setattr(main, "download_media", fake_download_media)
+    yield downloads
+    await manager.stop()
+
+
+@pytest.fixture
+async def client():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        yield client
+
+
+def video_url() -> str:
+    return f"https://www.youtube.com/watch?v={uuid.uuid4().hex[:11]}"
+
+
+def parse_sse(text: str):
+    """[(id, event, data)] de un stream SSE; los comentarios de heartbeat como (None, "ping", None)"""
+    assert text.endswith("\n\n")
+    messages = []
+    for block in text[:-2].split("\n\n"):
+        if block == ": ping":
+            messages.append((None, "ping", None))
+            continue
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        assert set(fields) == {"id", "event", "data"}
+        messages.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return messages
+
+
+async def create_job(client, kind: str = "audio") -> dict:
+    response = await client.post("/api/jobs", json={"url": video_url(), "type": kind})
+    assert response.status_code == 202
+    return response.json()
+
+
+async def test_create_job_and_poll_until_completed(downloads, client):
+    created = await create_job(client)
+    job_id = created["job_id"]
+    assert created["events_url"] == f"/api/jobs/{job_id}/events"
+    assert created["status"] == "queued"
+    assert created["rate_limit"]["remaining"] == rate_limiter.max_downloads - 1
+
+    for _ in range(100):
+        status = (await client.get(f"/api/jobs/{job_id}")).json()
+        if status["status"] == "completed":
+            break
+        await asyncio.sleep(0.01)
+
+    assert status["status"] == "completed"
+    assert status["job_id"] == job_id and status["kind"] == "audio"
+    assert status["result"]["filename"] == "song.mp3"
+    assert status["last_event"]["event"] == "completed"
+    assert (main.DOWNLOADS_DIR / f"{status['result']['file_id']}.mp3").read_bytes() == PAYLOAD
+
+
+async def test_invalid_type_and_unknown_job(downloads, client):
+    response = await client.post("/api/jobs", json={"url": video_url(), "type": "flac"})
+    assert response.status_code == 400
+
+    unknown = uuid.uuid4()
+    assert (await client.get(f"/api/jobs/{unknown}")).status_code == 404
+    assert (await client.get(f"/api/jobs/{unknown}/events")).status_code == 404
+
+
+async def test_events_stream_frames_heartbeats_and_closes_on_completion(downloads, client):
+    downloads["delay"] = 0.3  # Varios heartbeats (cada 0.05 s) sin eventos
+    created = await create_job(client)
+
+    response = await asyncio.wait_for(client.get(created["events_url"]), timeout=5)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    messages = parse_sse(response.text)
+    events = [m for m in messages if m[1] != "ping"]
+
+    assert any(m[1] == "ping" for m in messages)
+    # id = seq del evento, data = el evento completo en JSON
+    assert [seq for seq, _, _ in events] == list(range(len(events)))
+    assert all(data["event"] == name and data["seq"] == seq for seq, name, data in events)
+    assert [name for _, name, _ in events[:2]] == ["queued", "started"]
+    assert "progress" in [name for _, name, _ in events]
+    # El evento terminal es el último y cierra el stream
+    assert messages[-1][1] == "completed"
+    assert messages[-1][2]["result"]["filename"] == "song.mp3"
+
+
+async def test_events_stream_ends_with_failed_event(downloads, client):
+    downloads["error"] = "Cobalt and yt-dlp failed"
+    created = await create_job(client)
+
+    response = await asyncio.wait_for(client.get(created["events_url"]), timeout=5)
+    _, name, data = parse_sse(response.text)[-1]
+
+    assert name == "failed"
+    assert data["error"] == "Cobalt and yt-dlp failed"
+    status = (await client.get(f"/api/jobs/{created['job_id']}")).json()
+    assert status["status"] == "failed" and status["error"] == "Cobalt and yt-dlp failed"
+
+
+async def test_late_subscriber_replays_history_and_closes(downloads, client):
+    created = await create_job(client)
+    await main.job_manager.get(created["job_id"]).wait()
+
+    response = await asyncio.wait_for(client.get(created["events_url"]), timeout=5)
+    messages = parse_sse(response.text)
+
+    # Todo el historial de una vez, sin heartbeats, terminando en el evento final
+    assert all(name != "ping" for _, name, _ in messages)
+    assert messages[0][1] == "queued" and messages[-1][1] == "completed"
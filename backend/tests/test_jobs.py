@@ -0,0 +1,91 @@
+"""
+JobManager: un job que se suma a una operación en curso (Detached) no ocupa
+un worker mientras espera
+"""
+
+import asyncio
+
+import pytest
+
+from jobs import JOB_COMPLETED, JOB_FAILED, Detached, JobManager
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manager():
+    manager = JobManager(workers=2)
+    yield manager
+    await manager.stop()
+
+
+async def test_follower_releases_its_worker(manager):
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+    runs = []
+
+    async def download():
+        runs.append("download")
+        await release.wait()
+        return {"file_id": "abc"}
+
+    async def runner(job):
+        leader = flight.join("key")
+        if leader is not None:
+            return Detached(leader)
+        result, _ = await flight.do("key", download)
+        return result
+
+    async def quick(job):
+        return {"quick": True}
+
+    leader = manager.submit("audio", runner)
+    await asyncio.sleep(0)
+    followers = [manager.submit("audio", runner) for _ in range(3)]
+    # Con dos workers y el líder ocupando uno, este job solo corre si los seguidores soltaron el suyo
+    other = manager.submit("audio", quick)
+    await asyncio.wait_for(other.wait(), timeout=1)
+    assert other.result == {"quick": True}
+    assert manager.stats()["detached_running"] == 3
+
+    release.set()
+    for job in [leader, *followers]:
+        await asyncio.wait_for(job.wait(), timeout=1)
+        assert job.status == JOB_COMPLETED
+        assert job.result == {"file_id": "abc"}
+    assert runs == ["download"]
+    assert flight.stats()["shared"] == 3
+    assert any(event["event"] == "detached" for event in followers[0].events)
+
+
+async def test_follower_gets_leader_error(manager):
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def download():
+        await release.wait()
+        raise RuntimeError("no se pudo descargar")
+
+    async def runner(job):
+        leader = flight.join("key")
+        if leader is not None:
+            return Detached(leader)
+        result, _ = await flight.do("key", download)
+        return result
+
+    leader = manager.submit("audio", runner)
+    await asyncio.sleep(0)
+    follower = manager.submit("audio", runner)
+    await asyncio.sleep(0.01)
+    release.set()
+    await asyncio.wait_for(follower.wait(), timeout=1)
+    await asyncio.wait_for(leader.wait(), timeout=1)
+    assert follower.status == JOB_FAILED and follower.error == "no se pudo descargar"
+    assert leader.status == JOB_FAILED
+
+
+async def test_join_never_starts_an_operation():
+    flight = SingleFlight("test")
+    assert flight.join("key") is None
+    assert flight.stats() == {"in_flight": 0, "leaders": 0, "shared": 0}
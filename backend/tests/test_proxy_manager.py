@@ -0,0 +1,147 @@
+"""
+proxy_manager contra proxies locales (benchmarks/fake_proxies.py): solo los
+errores de conexión expulsan, el cooldown retrasa la re-admisión y cada job
+libera su asignación
+"""
+
+import asyncio
+
+import pytest
+
+from benchmarks import fake_proxies
+from benchmarks.fake_proxies import address, closed_port, start_proxy
+from proxy_manager import ProxyManager
+
+pytestmark = pytest.mark.anyio
+
+CONNECT_ERROR = "Unable to connect to proxy: Connection refused"
+
+
+@pytest.fixture
+async def proxies():
+    """Arranca proxies falsos: await proxies(comportamiento, latencia) -> "http://ip:puerto" """
+    servers = []
+
+    async def start(behavior: str = "good", latency: float = 0.0) -> str:
+        server = await start_proxy(behavior, latency)
+        servers.append(server)
+        return f"http://{address(server)}"
+
+    yield start
+    for server in servers:
+        server.close()
+    for task in list(fake_proxies.handlers):
+        task.cancel()
+    await asyncio.gather(*fake_proxies.handlers, return_exceptions=True)
+
+
+def make_manager(urls, **kwargs) -> ProxyManager:
+    return ProxyManager(static_proxies=urls, test_url=fake_proxies.TEST_URL, validate_timeout=1.0, **kwargs)
+
+
+def fail(manager: ProxyManager, url: str, message: str, times: int = 1):
+    for _ in range(times):
+        with pytest.raises(OSError):
+            with manager.track(url):
+                raise OSError(message)
+
+
+async def test_only_healthy_proxies_enter_the_pool(proxies):
+    good = await proxies("good")
+    broken = await proxies("broken")
+    blocked = await proxies("blocked")
+    manager = make_manager([good, broken, blocked, f"127.0.0.1:{closed_port()}"])
+
+    await manager.refresh()
+
+    assert manager.pool == [good]
+
+
+async def test_connection_errors_eject_after_threshold(proxies):
+    first, second = await proxies("good"), await proxies("good")
+    manager = make_manager([first, second], failure_threshold=2)
+    await manager.refresh()
+    victim = manager.acquire("job-1")
+
+    fail(manager, victim, CONNECT_ERROR)
+    assert victim in manager.pool
+
+    fail(manager, victim, "Tunnel connection failed: 407 Proxy Authentication Required")
+    assert victim not in manager.pool
+    assert manager.ejections == 1
+    # El job que lo tenía asignado pasa a otro proxy
+    assert manager.acquire("job-1") not in (victim, None)
+
+
+@pytest.mark.parametrize("message", [
+    "ERROR: [youtube] abc: HTTP Error 403: Forbidden",
+    "ERROR: [youtube] abc: HTTP Error 429: Too Many Requests",
+    "ERROR: [youtube] abc: Sign in to confirm you're not a bot",
+    "ERROR: [youtube] abc: Video unavailable",
+])
+async def test_video_errors_do_not_count_against_the_proxy(proxies, message):
+    url = await proxies("good")
+    manager = make_manager([url], failure_threshold=1)
+    await manager.refresh()
+
+    fail(manager, url, message, times=3)
+
+    assert manager.pool == [url]
+    assert manager.health[url].failures == 0
+
+
+async def test_success_resets_consecutive_failures(proxies):
+    url = await proxies("good")
+    manager = make_manager([url], failure_threshold=2)
+    await manager.refresh()
+
+    for _ in range(3):
+        fail(manager, url, "Read timed out")
+        with manager.track(url):
+            pass
+
+    assert manager.pool == [url]
+    assert manager.health[url].failures == 3
+
+
+async def test_ejected_proxy_waits_for_cooldown_before_readmission(proxies):
+    url = await proxies("good")
+    manager = make_manager([url], failure_threshold=1, eject_cooldown=0.3)
+    await manager.refresh()
+
+    fail(manager, url, CONNECT_ERROR)
+    assert manager.pool == []
+
+    # El proxy vuelve a responder, pero sigue en cooldown: no se valida
+    validated_at = manager.health[url].validated_at
+    await manager.refresh()
+    assert manager.pool == []
+    assert manager.health[url].validated_at == validated_at
+    assert manager.stats()["cooling_down"] == 1
+
+    await asyncio.sleep(0.35)
+    await manager.refresh()
+    assert manager.pool == [url]
+    assert manager.stats()["cooling_down"] == 0
+
+
+async def test_jobs_are_sticky_and_release_their_proxy(proxies):
+    urls = [await proxies("good", latency=0.01 * i) for i in range(2)]
+    manager = make_manager(urls)
+    await manager.refresh()
+
+    assigned = {job: manager.acquire(job) for job in ("a", "b", "c", "d")}
+    assert all(manager.acquire(job) == url for job, url in assigned.items())
+    # Los jobs se reparten entre los proxies del pool
+    assert set(assigned.values()) == set(urls)
+    assert sum(manager.assigned.values()) == 4
+
+    for job in ("a", "b", "c", "d"):
+        manager.release(job)
+    manager.release("a")  # Liberar dos veces no descuenta de más
+
+    assert manager.sticky == {}
+    assert not manager.assigned
+    # Un job sin clave no queda registrado
+    assert manager.acquire() in urls
+    assert not manager.assigned
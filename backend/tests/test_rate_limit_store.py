@@ -0,0 +1,80 @@
+"""
+rate_limit_store: esperar el lock de SQLite no bloquea el event loop
+"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+from rate_limit_store import SQLiteRateLimitStore, StoreBusy
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteRateLimitStore(tmp_path / "rate_limits.db", "downloads", 24, lock_timeout=2.0)
+    store.usage("warmup", 0)  # Crea el esquema antes de tomar el lock desde fuera
+    yield store
+    store.close()
+
+
+def hold_write_lock(store: SQLiteRateLimitStore) -> sqlite3.Connection:
+    """Otro 'worker' con el lock de escritura tomado"""
+    other = sqlite3.connect(store.path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    return other
+
+
+async def ticker(ticks: list):
+    while True:
+        await asyncio.sleep(0.005)
+        ticks.append(1)
+
+
+async def test_acquire_yields_while_another_worker_holds_the_lock(store):
+    other = hold_write_lock(store)
+    ticks = []
+    tick_task = asyncio.create_task(ticker(ticks))
+    acquire = asyncio.create_task(store.acquire("1.2.3.4", 100, limit=1))
+
+    await asyncio.sleep(0.2)
+    assert not acquire.done()
+    # El loop siguió atendiendo otras tareas mientras acquire esperaba
+    assert len(ticks) >= 10
+
+    other.execute("COMMIT")
+    other.close()
+    allowed, (count, _) = await asyncio.wait_for(acquire, 1.0)
+    tick_task.cancel()
+
+    assert allowed and count == 1
+    assert store.stats()["busy_retries"] > 0
+    assert (await store.acquire("1.2.3.4", 100, limit=1))[0] is False
+
+
+async def test_acquire_gives_up_after_lock_timeout(store):
+    store.lock_timeout = 0.1
+    other = hold_write_lock(store)
+    try:
+        with pytest.raises(StoreBusy):
+            await store.acquire("1.2.3.4", 100, limit=1)
+    finally:
+        other.execute("ROLLBACK")
+        other.close()
+
+    # El intento fallido no dejó nada registrado
+    assert store.usage("1.2.3.4", 100) == (0, None)
+
+
+async def test_sweep_waits_for_the_lock(store):
+    await store.acquire("1.2.3.4", 10)
+    other = hold_write_lock(store)
+    sweep = asyncio.create_task(store.sweep(cutoff=50))
+    await asyncio.sleep(0.05)
+    assert not sweep.done()
+
+    other.execute("COMMIT")
+    other.close()
+    assert await asyncio.wait_for(sweep, 1.0) == 1
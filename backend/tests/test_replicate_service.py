@@ -0,0 +1,196 @@
+"""
+ReplicateService contra el Replicate falso (benchmarks/fake_replicate.py):
+espera de predicciones (webhook y polling) y reutilización de subidas
+
+El servicio habla con el falso por un ASGITransport y el falso entrega los
+webhooks a la app (main.app) por otro: sin red ni puertos.
+"""
+
+import asyncio
+import base64
+import json
+import os
+from collections import Counter, OrderedDict, deque
+
+import httpx
+import pytest
+
+import config
+import main
+import replicate_service as replicate_module
+from benchmarks.fake_replicate import FakeReplicate
+from replicate_service import replicate_service
+from stems_cache import hash_file
+
+pytestmark = pytest.mark.anyio
+
+SECRET = "whsec_" + base64.b64encode(b"test-replicate-secret").decode()
+OTHER_SECRET = "whsec_" + base64.b64encode(b"someone-else").decode()
+RUNTIME = 0.2
+WEBHOOK_URL = "http://testserver/api/replicate/webhook"
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """El servicio global (el que usa el endpoint del webhook) con estado limpio"""
+    monkeypatch.setenv("REPLICATE_API_TOKEN", "test-token")
+    monkeypatch.setattr(config, "REPLICATE_DEFAULT_RUNTIME", RUNTIME)
+    monkeypatch.setattr(config, "REPLICATE_POLL_MIN_DELAY", 0.05)
+    monkeypatch.setattr(config, "REPLICATE_WEBHOOK_POLL_INTERVAL", 0.1)
+    monkeypatch.setattr(config, "REPLICATE_TIMEOUT", 5)
+    monkeypatch.setattr(replicate_service, "base_url", "http://replicate.test/v1")
+    monkeypatch.setattr(replicate_service, "webhook_url", None)
+    monkeypatch.setattr(replicate_service, "webhook_secret", None)
+    monkeypatch.setattr(replicate_service, "resolved_by", {"webhook": 0, "wakeup": 0, "poll": 0})
+    monkeypatch.setattr(replicate_service, "runtimes", {"2stems": deque(maxlen=50), "4stems": deque(maxlen=50)})
+    return replicate_service
+
+
+@pytest.fixture
+async def use_fake(monkeypatch):
+    """Dirige las llamadas del servicio a un FakeReplicate"""
+    clients = []
+
+    def install(fake: FakeReplicate):
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=fake.app))
+        clients.append(client)
+        monkeypatch.setattr(replicate_module.http_clients, "get", lambda name: client)
+        return fake
+
+    yield install
+    for client in clients:
+        await client.aclose()
+
+
+def app_transport():
+    return httpx.ASGITransport(app=main.app)
+
+
+async def test_signed_webhook_resolves_the_wait(service, use_fake):
+    fake = use_fake(FakeReplicate(RUNTIME, 0, secret=SECRET, webhook_transport=app_transport()))
+    service.webhook_url = WEBHOOK_URL
+    service.webhook_secret = SECRET
+
+    output = await service.separate_stems("http://example.invalid/audio.mp3")
+
+    assert output == {"vocals": "http://example.invalid/vocals.mp3"}
+    assert fake.deliveries == [200]
+    assert service.resolved_by == {"webhook": 1, "wakeup": 0, "poll": 0}
+    # El cuerpo firmado basta: no hizo falta consultar la predicción
+    assert fake.gets == 0
+
+
+async def test_unsigned_webhook_only_wakes_the_poller(service, use_fake):
+    fake = use_fake(FakeReplicate(RUNTIME, 0, webhook_transport=app_transport()))
+    service.webhook_url = WEBHOOK_URL
+
+    output = await service.separate_stems("http://example.invalid/audio.mp3")
+
+    assert output == {"vocals": "http://example.invalid/vocals.mp3"}
+    assert fake.deliveries == [200]
+    assert service.resolved_by == {"webhook": 0, "wakeup": 1, "poll": 0}
+    assert fake.gets == 1
+
+
+async def test_forged_unsigned_webhook_body_is_never_used(service, use_fake):
+    fake = use_fake(FakeReplicate(RUNTIME, 0, webhook_transport=app_transport()))
+    service.webhook_url = WEBHOOK_URL
+    task = asyncio.create_task(service.separate_stems("http://example.invalid/audio.mp3"))
+    while not fake.predictions:
+        await asyncio.sleep(0.01)
+    prediction_id = next(iter(fake.predictions))
+
+    # Cualquiera puede llamar al endpoint sin firma: solo despierta la espera
+    async with httpx.AsyncClient(transport=app_transport(), base_url="http://testserver") as client:
+        response = await client.post("/api/replicate/webhook", content=json.dumps({
+            "id": prediction_id, "status": "succeeded", "output": {"vocals": "http://evil.invalid/x.mp3"},
+        }))
+    assert response.status_code == 200 and response.json()["resolved"] is True
+
+    output = await task
+    assert output == {"vocals": "http://example.invalid/vocals.mp3"}
+    # El aviso falso provocó una consulta (aún processing) en lugar de entregar su cuerpo
+    assert fake.gets >= 2
+    assert service.resolved_by["webhook"] == 0
+
+
+async def test_bad_signature_is_rejected(service, use_fake):
+    fake = use_fake(FakeReplicate(RUNTIME, 0, secret=OTHER_SECRET, webhook_transport=app_transport()))
+    service.webhook_url = WEBHOOK_URL
+    service.webhook_secret = SECRET
+
+    output = await service.separate_stems("http://example.invalid/audio.mp3")
+
+    # El webhook se rechaza y la predicción llega por el polling de respaldo
+    assert fake.deliveries == [401]
+    assert output == {"vocals": "http://example.invalid/vocals.mp3"}
+    assert service.resolved_by == {"webhook": 0, "wakeup": 0, "poll": 1}
+    assert fake.gets >= 1
+
+
+async def test_polling_fallback_without_webhook(service, use_fake):
+    fake = use_fake(FakeReplicate(RUNTIME, 0))
+
+    output = await service.separate_stems("http://example.invalid/audio.mp3")
+
+    assert output == {"vocals": "http://example.invalid/vocals.mp3"}
+    assert fake.deliveries == []
+    assert service.resolved_by == {"webhook": 0, "wakeup": 0, "poll": 1}
+    # Primera consulta cerca de la duración esperada y unas pocas más con backoff
+    assert 1 <= fake.gets <= 5
+    assert service.stats()["waiting"] == 0
+
+
+@pytest.fixture
+def audio(tmp_path, monkeypatch):
+    monkeypatch.setattr(replicate_service, "_uploads", OrderedDict())
+    monkeypatch.setattr(replicate_service, "uploads", Counter())
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(os.urandom(64 * 1024))
+    return path
+
+
+async def test_same_content_hash_is_uploaded_once(service, use_fake, audio):
+    fake = use_fake(FakeReplicate(RUNTIME, 0))
+    content_hash = hash_file(audio)
+
+    first = await service.upload_file(audio, content_hash)
+    again = await asyncio.gather(*(service.upload_file(audio, content_hash) for _ in range(3)))
+
+    assert first is not None and all(url == first for url in again)
+    assert len(fake.files) == 1
+    assert service.uploads == Counter(uploaded=1, reused=3)
+
+
+async def test_concurrent_uploads_of_the_same_audio_share_one_request(service, use_fake, audio):
+    fake = use_fake(FakeReplicate(RUNTIME, 0))
+    content_hash = hash_file(audio)
+
+    urls = await asyncio.gather(*(service.upload_file(audio, content_hash) for _ in range(4)))
+
+    assert len(set(urls)) == 1
+    assert len(fake.files) == 1
+
+
+async def test_expired_upload_is_sent_again(service, use_fake, audio):
+    # Archivos que expiran antes de REPLICATE_UPLOAD_MIN_TTL: no se pueden reutilizar
+    fake = use_fake(FakeReplicate(RUNTIME, 0, upload_ttl=config.REPLICATE_UPLOAD_MIN_TTL / 2))
+    content_hash = hash_file(audio)
+
+    first = await service.upload_file(audio, content_hash)
+    second = await service.upload_file(audio, content_hash)
+
+    assert first != second
+    assert len(fake.files) == 2
+    assert service.uploads == Counter(uploaded=2)
+
+
+async def test_different_audio_is_not_reused(service, use_fake, audio, tmp_path):
+    fake = use_fake(FakeReplicate(RUNTIME, 0))
+    other = tmp_path / "other.mp3"
+    other.write_bytes(os.urandom(64 * 1024))
+
+    await service.upload_file(audio, hash_file(audio))
+    await service.upload_file(other, hash_file(other))
+
+    assert len(fake.files) == 2
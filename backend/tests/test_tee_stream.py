@@ -0,0 +1,195 @@
+"""
+tee_stream: lectores que siguen una descarga en curso (replay desde disco,
+cambio de intento y cortes a mitad de stream) y el Content-Length de
+tee_response
+"""
+
+import asyncio
+import os
+import uuid
+
+import httpx
+import pytest
+
+import main
+from tee_stream import TeeDownload, TeeStreamError, tee_streams
+
+pytestmark = pytest.mark.anyio
+
+COBALT = os.urandom(300 * 1024)
+YTDLP = os.urandom(420 * 1024)
+
+
+class Writer:
+    """Simula stream_to_file: escribe por bloques en un temporal y avisa al tee"""
+
+    def __init__(self, tee: TeeDownload, path, total=None):
+        self.tee = tee
+        self.path = path
+        self.f = open(path, "wb")
+        self.written = 0
+        tee.start(path, total)
+
+    def write(self, data: bytes):
+        self.f.write(data)
+        self.f.flush()
+        self.written += len(data)
+        self.tee.advance(self.written)
+
+    def close(self):
+        self.f.close()
+
+
+async def collect(iterator, chunks: list):
+    async for chunk in iterator:
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def settle():
+    """Deja que los lectores consuman lo que ya está en disco"""
+    for _ in range(5):
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def tee():
+    return TeeDownload(uuid.uuid4().hex, "audio")
+
+
+async def test_late_joiner_replays_from_disk(tee, tmp_path):
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    early = asyncio.create_task(collect(tee.iter_bytes(chunk_size=64 * 1024), []))
+    writer.write(COBALT[:200 * 1024])
+    await settle()
+
+    # Llega tarde: empieza desde el byte 0 del archivo parcial
+    late_chunks = []
+    late = asyncio.create_task(collect(tee.iter_bytes(chunk_size=64 * 1024), late_chunks))
+    await settle()
+    assert sum(map(len, late_chunks)) == 200 * 1024
+    assert tee.readers == 2
+
+    writer.write(COBALT[200 * 1024:])
+    writer.close()
+    final = tmp_path / "final.mp3"
+    os.rename(writer.path, final)
+    tee.finish(final)
+
+    assert await early == COBALT
+    assert await late == COBALT
+    assert tee.readers == 0
+
+
+async def test_reader_switches_to_ytdlp_after_cobalt_is_aborted(tee, tmp_path):
+    # Cobalt se abandona antes de que el lector empiece: espera el siguiente intento
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    tee.abort_attempt("cobalt lost the hedge")
+    writer.close()
+
+    reader = asyncio.create_task(tee.open_reader())
+    await settle()
+    assert not reader.done()
+
+    final = tmp_path / "ytdlp.mp3"
+    final.write_bytes(YTDLP)
+    tee.finish(final)
+
+    reader = await reader
+    assert reader.total == len(YTDLP)
+    assert await collect(reader.iter_bytes(), []) == YTDLP
+
+
+async def test_abort_mid_stream_raises(tee, tmp_path):
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    writer.write(COBALT[:100 * 1024])
+    chunks = []
+    reading = asyncio.create_task(collect(tee.iter_bytes(), chunks))
+    await settle()
+
+    tee.abort_attempt("cobalt connection reset")
+    writer.close()
+
+    with pytest.raises(TeeStreamError, match="connection reset"):
+        await reading
+    assert b"".join(chunks) == COBALT[:100 * 1024]
+    assert tee.readers == 0
+
+
+async def test_failure_mid_stream_raises(tee, tmp_path):
+    writer = Writer(tee, tmp_path / "cobalt.part")
+    writer.write(COBALT[:1024])
+    reading = asyncio.create_task(collect(tee.iter_bytes(), []))
+    await settle()
+
+    tee.fail("all backends failed")
+    writer.close()
+
+    with pytest.raises(TeeStreamError, match="all backends failed"):
+        await reading
+
+
+async def test_failed_download_cannot_be_opened(tee):
+    tee.fail("all backends failed")
+    with pytest.raises(TeeStreamError):
+        await tee.open_reader()
+
+
+async def test_tee_response_length_matches_the_attempt_it_streams(tee, tmp_path):
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    writer.write(COBALT[:1024])
+    response = await main.tee_response(tee, {})
+    assert response.headers["content-length"] == str(len(COBALT))
+
+    # Otro intento con otro tamaño gana antes de que el body empiece: el body
+    # no sirve ese archivo bajo el Content-Length de Cobalt, se corta
+    tee.abort_attempt("cobalt lost the hedge")
+    writer.close()
+    final = tmp_path / "ytdlp.mp3"
+    final.write_bytes(YTDLP)
+    tee.finish(final)
+
+    with pytest.raises(TeeStreamError):
+        await collect(response.body_iterator, [])
+
+
+async def test_tee_response_waits_for_the_attempt_before_declaring_length(tee, tmp_path):
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    tee.abort_attempt("cobalt failed")
+    writer.close()
+
+    response = asyncio.create_task(main.tee_response(tee, {}))
+    await settle()
+    final = tmp_path / "ytdlp.mp3"
+    final.write_bytes(YTDLP)
+    tee.finish(final)
+
+    response = await response
+    assert response.headers["content-length"] == str(len(YTDLP))
+    assert await collect(response.body_iterator, []) == YTDLP
+
+
+async def test_stream_file_endpoint_serves_a_download_in_progress(tmp_path):
+    file_id = uuid.uuid4().hex
+    tee = tee_streams.open(file_id, "audio")
+    writer = Writer(tee, tmp_path / "cobalt.part", total=len(COBALT))
+    writer.write(COBALT[:100 * 1024])
+
+    async def finish_later():
+        await settle()
+        writer.write(COBALT[100 * 1024:])
+        writer.close()
+        tee.finish(writer.path)
+
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            finishing = asyncio.create_task(finish_later())
+            response = await client.get(f"/api/stream-file/{file_id}")
+            await finishing
+    finally:
+        tee_streams.close(tee)
+
+    assert response.status_code == 200
+    assert response.headers["content-length"] == str(len(COBALT))
+    assert response.content == COBALT
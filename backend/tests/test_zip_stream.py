@@ -0,0 +1,126 @@
+"""
+ZIP en streaming (zip_stream): lo que se genera debe leerse con zipfile,
+también cuando hace falta ZIP64. Para no escribir 4 GB, los tests de ZIP64
+bajan ZIP64_LIMIT: el formato resultante es el mismo.
+"""
+
+import io
+import os
+import zipfile
+
+import pytest
+
+import zip_stream
+from zip_stream import StoredZip, ZipWriter, crc32_file
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i, size in enumerate((5, 3000, 0, 1200)):
+        path = tmp_path / f"file{i}.mp3"
+        path.write_bytes(os.urandom(size))
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def small_zip64_limit(monkeypatch):
+    monkeypatch.setattr(zip_stream, "ZIP64_LIMIT", 1024)
+
+
+async def build_with_writer(paths, names=None) -> bytes:
+    writer = ZipWriter()
+    out = bytearray()
+    for i, path in enumerate(paths):
+        name = writer.unique_name(names[i] if names else path.name)
+        async for chunk in writer.add_file(name, path):
+            out += chunk
+    out += writer.finish()
+    return bytes(out)
+
+
+def stored_members(paths):
+    members = []
+    for path in paths:
+        stat_result = path.stat()
+        entry = {"bytes": stat_result.st_size, "crc32": crc32_file(path), "mtime_ns": stat_result.st_mtime_ns}
+        members.append((path.name, path, entry))
+    return members
+
+
+async def build_stored(paths):
+    bundle = StoredZip(stored_members(paths))
+    out = b"".join([chunk async for chunk in bundle.iter_bytes()])
+    return bundle, out
+
+
+def assert_readable(data: bytes, paths, names=None):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == (names or [path.name for path in paths])
+        for name, path in zip(archive.namelist(), paths):
+            assert archive.read(name) == path.read_bytes()
+            assert archive.getinfo(name).compress_type == zipfile.ZIP_STORED
+
+
+async def test_writer(files):
+    assert_readable(await build_with_writer(files), files)
+
+
+async def test_writer_unique_names(files):
+    data = await build_with_writer(files[:3], names=["a.mp3", "a.mp3", "a"])
+    assert_readable(data, files[:3], names=["a.mp3", "a (2).mp3", "a"])
+
+
+async def test_stored_zip_content_length(files):
+    bundle, data = await build_stored(files)
+    assert bundle.content_length == len(data)
+    assert_readable(data, files)
+
+
+async def test_small_zip_has_no_zip64_records(files):
+    data = await build_with_writer(files)
+    assert b"PK\x06\x06" not in data and b"PK\x06\x07" not in data
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert all(info.extract_version == 20 for info in archive.infolist())
+
+
+async def test_writer_zip64(files, small_zip64_limit):
+    data = await build_with_writer(files)
+    assert b"PK\x06\x06" in data and b"PK\x06\x07" in data
+    assert_readable(data, files)
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        big = archive.getinfo("file1.mp3")
+        after = archive.getinfo("file3.mp3")
+        assert big.extract_version == 45 and big.file_size == 3000
+        assert after.header_offset > 1024
+
+
+async def test_stored_zip64_content_length(files, small_zip64_limit):
+    bundle, data = await build_stored(files)
+    assert bundle.content_length == len(data)
+    assert_readable(data, files)
+
+
+async def test_zip64_entry_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(zip_stream, "ZIP64_COUNT_LIMIT", 3)
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"{i}.txt"
+        path.write_bytes(str(i).encode())
+        paths.append(path)
+    bundle, data = await build_stored(paths)
+    assert bundle.content_length == len(data)
+    assert_readable(data, paths)
+
+
+async def test_truncated_file_fails(tmp_path):
+    path = tmp_path / "short.mp3"
+    path.write_bytes(b"1234")
+    writer = ZipWriter()
+    with pytest.raises(RuntimeError):
+        async for _ in writer.add_file("short.mp3", path, size=10, crc32=0):
+            pass
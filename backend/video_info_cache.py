@@ -0,0 +1,260 @@
+"""
+Caché de metadata de videos para /api/video-info
+
+LRU en memoria (y opcionalmente en disco, con un máximo de archivos) del
+dict video_info por video_id. Los campos estables (título, artista,
+duración...) y los volátiles (view_count) tienen TTL y marca de tiempo
+propios: si solo vencieron los volátiles se refrescan solo esos, sin volver
+a pedir todo. Una entrada vencida dentro de la ventana stale se sigue
+sirviendo mientras se revalida en segundo plano.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+
+CACHE_FRESH = "fresh"
+CACHE_STALE = "stale"
+CACHE_MISS = "miss"
+
+# Campos que cambian seguido; el resto se considera estable
+VOLATILE_FIELDS = ("view_count",)
+
+
+class VideoInfoCache:
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        stable_ttl: float = 86400,
+        volatile_ttl: float = 600,
+        stale_ttl: float = 86400,
+        disk_dir: Optional[Path] = None,
+        max_disk_entries: int = 10000,
+    ):
+        """
+        Args:
+            max_entries: Entradas máximas en memoria
+            stable_ttl: Segundos que los campos estables se consideran frescos
+            volatile_ttl: Segundos que los campos volátiles (view_count) se consideran frescos
+            stale_ttl: Segundos extra en los que se sirve una entrada vencida mientras se revalida
+            disk_dir: Directorio para persistir entradas (None = solo memoria)
+            max_disk_entries: Archivos máximos en disk_dir (se borran los menos usados)
+        """
+        self.max_entries = max_entries
+        self.stable_ttl = stable_ttl
+        self.volatile_ttl = volatile_ttl
+        self.stale_ttl = stale_ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_entries = max_disk_entries
+
+        # {video_id: {"info": dict, "fetched_at": ts, "volatile_fetched_at": ts, "stable_ttl": s}} en orden LRU
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        # Archivos en disk_dir en orden LRU (se lista el directorio en el primer uso)
+        self._disk_index: "Optional[OrderedDict[str, None]]" = None
+        self._revalidating = set()
+        self._tasks = set()
+
+        # Estadísticas
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.volatile_revalidations = 0
+        self.disk_evictions = 0
+
+    def _disk_path(self, video_id: str) -> Path:
+        return self.disk_dir / f"{video_id}.json"
+
+    def _disk_entries(self) -> "OrderedDict[str, None]":
+        if self._disk_index is None:
+            self._disk_index = OrderedDict()
+            if self.disk_dir and self.disk_dir.exists():
+                files = []
+                for path in self.disk_dir.glob("*.json"):
+                    try:
+                        files.append((path.stat().st_mtime, path.stem))
+                    except OSError:
+                        pass
+                for _, video_id in sorted(files):
+                    self._disk_index[video_id] = None
+        return self._disk_index
+
+    def _load_from_disk(self, video_id: str) -> Optional[Dict]:
+        if not self.disk_dir or video_id not in self._disk_entries():
+            return None
+        try:
+            entry = json.loads(self._disk_path(video_id).read_text(encoding='utf-8'))
+        except Exception:
+            self._remove_from_disk(video_id)
+            return None
+        self._disk_entries().move_to_end(video_id)
+        return entry
+
+    def _save_to_disk(self, video_id: str, entry: Dict):
+        if not self.disk_dir:
+            return
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            path = self._disk_path(video_id)
+            temp_path = path.with_suffix('.tmp')
+            temp_path.write_text(json.dumps(entry), encoding='utf-8')
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"⚠️ Could not persist video info for {video_id}: {e}")
+            return
+
+        index = self._disk_entries()
+        index[video_id] = None
+        index.move_to_end(video_id)
+        while len(index) > self.max_disk_entries:
+            self._remove_from_disk(next(iter(index)))
+            self.disk_evictions += 1
+
+    def _remove_from_disk(self, video_id: str):
+        self._disk_entries().pop(video_id, None)
+        try:
+            self._disk_path(video_id).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def _stable_expired(self, entry: Dict, now: float) -> bool:
+        return now - entry["fetched_at"] > entry["stable_ttl"]
+
+    def _state(self, entry: Dict, now: float) -> str:
+        age = now - entry["fetched_at"]
+        if age > entry["stable_ttl"] + self.stale_ttl:
+            return CACHE_MISS
+        volatile_age = now - entry.get("volatile_fetched_at", entry["fetched_at"])
+        if age > entry["stable_ttl"] or volatile_age > self.volatile_ttl:
+            return CACHE_STALE
+        return CACHE_FRESH
+
+    def get(self, video_id: str) -> Tuple[Optional[Dict], str]:
+        """
+        Returns:
+            (video_info o None, estado) con estado fresh / stale / miss
+        """
+        now = time.time()
+        entry = self.entries.get(video_id)
+        if entry is None:
+            entry = self._load_from_disk(video_id)
+            if entry is not None:
+                self._store(video_id, entry)
+
+        state = self._state(entry, now) if entry is not None else CACHE_MISS
+        if state == CACHE_MISS:
+            if entry is not None:
+                # Vencida del todo: ya no sirve ni como stale
+                self.entries.pop(video_id, None)
+                if self.disk_dir:
+                    self._remove_from_disk(video_id)
+            self.misses += 1
+            return None, CACHE_MISS
+
+        self.entries.move_to_end(video_id)
+        if state == CACHE_STALE:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        return entry["info"], state
+
+    def put(self, video_id: str, info: Dict):
+        """Guarda la metadata recién obtenida"""
+        # Sin duración la extracción fue parcial: que todo venza como volátil
+        stable_ttl = self.stable_ttl if info.get("duration") else self.volatile_ttl
+        now = time.time()
+        entry = {"info": info, "fetched_at": now, "volatile_fetched_at": now, "stable_ttl": stable_ttl}
+        self._store(video_id, entry)
+        self._save_to_disk(video_id, entry)
+
+    def put_volatile(self, video_id: str, fields: Dict):
+        """Actualiza solo los campos volátiles de una entrada (los estables conservan su edad)"""
+        entry = self.entries.get(video_id)
+        if entry is None:
+            return
+        updates = {key: fields[key] for key in VOLATILE_FIELDS if fields.get(key) is not None}
+        entry = {**entry, "info": {**entry["info"], **updates}, "volatile_fetched_at": time.time()}
+        self._store(video_id, entry)
+        self._save_to_disk(video_id, entry)
+
+    def _store(self, video_id: str, entry: Dict):
+        self.entries[video_id] = entry
+        self.entries.move_to_end(video_id)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def revalidate(
+        self,
+        video_id: str,
+        fetcher: Callable[[], Awaitable[Dict]],
+        volatile_fetcher: Optional[Callable[[], Awaitable[Dict]]] = None,
+    ):
+        """
+        Refresca una entrada en segundo plano (una sola revalidación por video).
+
+        Args:
+            fetcher: Obtiene la metadata completa
+            volatile_fetcher: Obtiene solo los campos volátiles; se usa si los
+                estables siguen frescos
+        """
+        if video_id in self._revalidating:
+            return
+        entry = self.entries.get(video_id)
+        volatile_only = (
+            volatile_fetcher is not None and entry is not None
+            and not self._stable_expired(entry, time.time())
+        )
+        self._revalidating.add(video_id)
+        if volatile_only:
+            self.volatile_revalidations += 1
+        else:
+            self.revalidations += 1
+
+        async def _run():
+            try:
+                if volatile_only:
+                    self.put_volatile(video_id, await volatile_fetcher())
+                else:
+                    self.put(video_id, await fetcher())
+            except Exception as e:
+                print(f"⚠️ Video info revalidation failed for {video_id}: {e}")
+            finally:
+                self._revalidating.discard(video_id)
+
+        # Guardar la referencia: el loop solo mantiene referencias débiles a los tasks
+        task = asyncio.create_task(_run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 3) if lookups else 0.0,
+            "revalidations": self.revalidations,
+            "volatile_revalidations": self.volatile_revalidations,
+            "disk_entries": len(self._disk_index) if self._disk_index is not None else None,
+            "max_disk_entries": self.max_disk_entries if self.disk_dir else None,
+            "disk_evictions": self.disk_evictions,
+        }
+
+
+# Instancia global
+video_info_cache = VideoInfoCache(
+    max_entries=config.VIDEO_INFO_CACHE_SIZE,
+    stable_ttl=config.VIDEO_INFO_STABLE_TTL,
+    volatile_ttl=config.VIDEO_INFO_VOLATILE_TTL,
+    stale_ttl=config.VIDEO_INFO_STALE_TTL,
+    disk_dir=config.VIDEO_INFO_CACHE_DIR,
+    max_disk_entries=config.VIDEO_INFO_CACHE_DISK_ENTRIES
+)
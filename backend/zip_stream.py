@@ -0,0 +1,221 @@
+"""
+ZIP "stored" (sin compresión) generado en streaming
+
+Los archivos que servimos ya son mp3/mp4 comprimidos: recomprimirlos no
+ahorra nada y cuesta CPU. Dos variantes:
+
+- Con CRC32 y tamaño conocidos de antemano (StoredZip): las cabeceras se
+  arman antes de leer los datos y el Content-Length total se conoce.
+- Sin CRC previo (ZipWriter): cada entrada lleva un data descriptor con el
+  CRC calculado mientras se envía, así que los archivos se pueden ir
+  agregando a medida que están listos.
+
+Los archivos, offsets o directorios que pasan de 4 GB (o más de 65535
+entradas) usan las extensiones ZIP64: campo extra en las cabeceras, data
+descriptor de 8 bytes y registro + localizador ZIP64 antes del fin de
+directorio. Un ZIP pequeño queda igual que sin ZIP64.
+"""
+
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+
+CHUNK_SIZE = 256 * 1024
+# Desde este tamaño u offset hace falta ZIP64 (el campo de 32 bits queda en 0xFFFFFFFF)
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_DATA_DESCRIPTOR = struct.Struct("<IIII")
+_DATA_DESCRIPTOR64 = struct.Struct("<IIQQ")
+_END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+_END_OF_CENTRAL_DIR64 = struct.Struct("<IQHHIIQQQQ")
+_END_OF_CENTRAL_DIR64_LOCATOR = struct.Struct("<IIQI")
+_UTF8_FLAG = 0x0800  # Nombres de archivo en UTF-8
+_DESCRIPTOR_FLAG = 0x0008  # CRC y tamaños van después de los datos
+_VERSION = 20
+_VERSION_ZIP64 = 45
+
+
+def crc32_file(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    t = time.localtime(max(timestamp, 315532800))  # El formato DOS empieza en 1980
+    return (
+        (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+        ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday,
+    )
+
+
+def _field32(value: int) -> int:
+    """Valor para un campo de 32 bits: 0xFFFFFFFF indica que el real está en los registros ZIP64"""
+    return value if value < ZIP64_LIMIT else 0xFFFFFFFF
+
+
+def _zip64_extra(*values: int) -> bytes:
+    """Campo extra ZIP64 (id 0x0001) con los valores que no caben en 32 bits"""
+    if not values:
+        return b""
+    return struct.pack(f"<HH{len(values)}Q", 0x0001, 8 * len(values), *values)
+
+
+def _local_zip64_extra(size: int, known: bool) -> bytes:
+    """En la cabecera local van ambos tamaños (en 0 si se conocen recién en el data descriptor)"""
+    if size < ZIP64_LIMIT:
+        return b""
+    return _zip64_extra(size if known else 0, size if known else 0)
+
+
+def _central_zip64_extra(size: int, offset: int) -> bytes:
+    """En el directorio central solo van los campos desbordados, en este orden"""
+    values = [size, size] if size >= ZIP64_LIMIT else []
+    if offset >= ZIP64_LIMIT:
+        values.append(offset)
+    return _zip64_extra(*values)
+
+
+def _end_records(count: int, directory_size: int, directory_offset: int) -> bytes:
+    """Fin de directorio, precedido por el registro y el localizador ZIP64 si hacen falta"""
+    records = b""
+    if count >= ZIP64_COUNT_LIMIT or directory_size >= ZIP64_LIMIT or directory_offset >= ZIP64_LIMIT:
+        zip64_offset = directory_offset + directory_size
+        records = _END_OF_CENTRAL_DIR64.pack(
+            0x06064B50, _END_OF_CENTRAL_DIR64.size - 12, _VERSION_ZIP64, _VERSION_ZIP64,
+            0, 0, count, count, directory_size, directory_offset
+        ) + _END_OF_CENTRAL_DIR64_LOCATOR.pack(0x07064B50, 0, zip64_offset, 1)
+        count = count if count < ZIP64_COUNT_LIMIT else 0xFFFF
+        directory_size = _field32(directory_size)
+        directory_offset = _field32(directory_offset)
+    return records + _END_OF_CENTRAL_DIR.pack(
+        0x06054B50, 0, 0, count, count, directory_size, directory_offset, 0
+    )
+
+
+class ZipWriter:
+    """Arma el ZIP entrada por entrada; add_file() produce los bytes de cada una"""
+
+    def __init__(self):
+        self.offset = 0
+        self._central: List[bytes] = []
+        self._names = set()
+
+    def unique_name(self, arcname: str) -> str:
+        """Evita nombres repetidos dentro del ZIP ("x.mp3" -> "x (2).mp3")"""
+        stem, dot, ext = arcname.rpartition(".")
+        if not dot:
+            stem, ext = arcname, ""
+        candidate, n = arcname, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{stem} ({n}).{ext}" if dot else f"{stem} ({n})"
+        self._names.add(candidate)
+        return candidate
+
+    async def add_file(
+        self,
+        arcname: str,
+        path: Path,
+        size: Optional[int] = None,
+        crc32: Optional[int] = None,
+        mtime: Optional[float] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        Bytes de una entrada. Con size y crc32 se escribe la cabecera completa;
+        sin ellos, un data descriptor al final con lo calculado al leer.
+        """
+        if size is None or mtime is None:
+            stat_result = os.stat(path)
+            size = stat_result.st_size if size is None else size
+            mtime = stat_result.st_mtime if mtime is None else mtime
+
+        name = arcname.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(mtime)
+        known = crc32 is not None
+        flags = _UTF8_FLAG | (0 if known else _DESCRIPTOR_FLAG)
+        header_offset = self.offset
+        zip64 = size >= ZIP64_LIMIT
+        version = _VERSION_ZIP64 if zip64 else _VERSION
+
+        local_extra = _local_zip64_extra(size, known)
+        local_size = _field32(size) if known or zip64 else 0
+        local = _LOCAL_HEADER.pack(
+            0x04034B50, version, flags, 0, dos_time, dos_date,
+            crc32 if known else 0, local_size, local_size, len(name), len(local_extra)
+        ) + name + local_extra
+        self.offset += len(local)
+        yield local
+
+        crc = 0
+        remaining = size
+        async with await anyio.open_file(path, mode="rb") as f:
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    # El archivo cambió después de armar las cabeceras: el ZIP quedaría corrupto
+                    raise RuntimeError(f"File truncated while streaming: {path.name}")
+                if not known:
+                    crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                self.offset += len(chunk)
+                yield chunk
+
+        if not known:
+            crc32 = crc
+            descriptor = (_DATA_DESCRIPTOR64 if zip64 else _DATA_DESCRIPTOR).pack(0x08074B50, crc32, size, size)
+            self.offset += len(descriptor)
+            yield descriptor
+
+        central_extra = _central_zip64_extra(size, header_offset)
+        if central_extra:
+            version = _VERSION_ZIP64
+        self._central.append(_CENTRAL_HEADER.pack(
+            0x02014B50, version, version, flags, 0, dos_time, dos_date,
+            crc32, _field32(size), _field32(size), len(name), len(central_extra),
+            0, 0, 0, 0o100644 << 16, _field32(header_offset)
+        ) + name + central_extra)
+
+    def finish(self) -> bytes:
+        """Directorio central + fin de directorio (con los registros ZIP64 si hacen falta)"""
+        directory = b"".join(self._central)
+        return directory + _end_records(len(self._central), len(directory), self.offset)
+
+
+class StoredZip:
+    """ZIP de archivos con CRC32 y tamaño conocidos: Content-Length exacto antes de enviar"""
+
+    def __init__(self, members: List[Tuple[str, Path, Dict]]):
+        """
+        Args:
+            members: (nombre dentro del ZIP, ruta, {"bytes", "crc32", "mtime_ns"}) por archivo
+        """
+        self.members = members
+        # Tamaño total sin leer nada: cabecera local + datos + entrada central por archivo
+        offset = 0
+        central = 0
+        for arcname, _, entry in members:
+            name_length = len(arcname.encode("utf-8"))
+            size = entry["bytes"]
+            central += _CENTRAL_HEADER.size + name_length + len(_central_zip64_extra(size, offset))
+            offset += _LOCAL_HEADER.size + name_length + len(_local_zip64_extra(size, True)) + size
+        self.content_length = offset + central + len(_end_records(len(members), central, offset))
+
+    async def iter_bytes(self) -> AsyncIterator[bytes]:
+        writer = ZipWriter()
+        for arcname, path, entry in self.members:
+            async for chunk in writer.add_file(
+                arcname, path, size=entry["bytes"], crc32=entry["crc32"], mtime=entry["mtime_ns"] / 1e9
+            ):
+                yield chunk
+        yield writer.finish()